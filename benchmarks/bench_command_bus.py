@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+วัด latency ของ command bus: ตั้งแต่ webapp ส่งคำสั่งจนถึงบอทได้รับ (ก่อนเข้า dispatcher)
+
+Usage: python benchmarks/bench_command_bus.py [count]
+
+Firestore is only measured when FIREBASE_CREDENTIALS_PATH is set. It measures
+the send (document add) alone, which is a lower bound. The bot still has to
+receive the document through a snapshot listener or poll.
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.command_bus import LocalCommandBus, LocalCommandServer, MemoryCommandBus  # noqa: E402
+
+
+class BotLoop:
+    """event loop ของ "บอท" บน thread แยก เหมือนตอนรันจริงสอง process"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.received = {}
+        self.done = threading.Condition()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def handler(self, guild_id, command):
+        with self.done:
+            self.received[command.to_dict()['seq']] = time.perf_counter()
+            self.done.notify_all()
+
+    def wait_for(self, seq):
+        with self.done:
+            self.done.wait_for(lambda: seq in self.received, timeout=5)
+        return self.received.pop(seq)
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def measure(label, bus, bot, count, wait=True):
+    samples = []
+    for seq in range(count):
+        start = time.perf_counter()
+        bus.send('1', {'action': 'skip', 'seq': seq})
+        end = bot.wait_for(seq) if wait else time.perf_counter()
+        samples.append((end - start) * 1000)
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"  {label:<28} p50 {statistics.median(samples):8.3f} ms   p99 {p99:8.3f} ms   "
+          f"mean {statistics.fmean(samples):8.3f} ms")
+
+
+def main(count: int):
+    print(f"commands = {count}")
+    bot = BotLoop()
+    try:
+        measure("memory", MemoryCommandBus(bot.handler, bot.loop), bot, count)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            for address in (f"unix:{os.path.join(tmp, 'bench.sock')}", "http://127.0.0.1:18765"):
+                server = LocalCommandServer(bot.handler, address, secret='bench')
+                try:
+                    bot.run(server.start())
+                except (OSError, NotImplementedError) as e:
+                    print(f"  {address:<28} skipped ({e})")
+                    continue
+                bus = LocalCommandBus(address, secret='bench')
+                measure(f"local {address.split(':')[0]}", bus, bot, count)
+                bus.close()
+                bot.run(server.stop())
+
+        credentials = os.getenv("FIREBASE_CREDENTIALS_PATH")
+        if credentials and os.path.exists(credentials):
+            import firebase_admin
+            from firebase_admin import credentials as fb_credentials, firestore
+            from services.command_bus import FirestoreCommandBus
+
+            app = firebase_admin.initialize_app(fb_credentials.Certificate(credentials), name='bench')
+            bus = FirestoreCommandBus(firestore.client(app=app))
+            measure("firestore (add only)", bus, bot, min(count, 50), wait=False)
+        else:
+            print("  firestore                    skipped (set FIREBASE_CREDENTIALS_PATH to measure)")
+    finally:
+        bot.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
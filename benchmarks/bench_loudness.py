@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+วัดเวลาต่อ frame (20 ms) ของการปรับเสียงในเส้นทาง PCM
+
+Usage: python benchmarks/bench_loudness.py [frames]
+
+- audioop: PCMVolumeTransformer เดิม (audioop.mul ด้วย volume คงที่)
+- numpy gain: NormalizedVolume (ตาราง gain + limiter) ที่ gain คงที่
+- numpy limiting: gain สูงจนเพลงเข้าช่วง limiter ตลอด (ต้นทุนเท่ากันเพราะเป็นตารางเดียวกัน)
+- gain change: frame ที่ gain เปลี่ยน (สร้างตารางใหม่ + crossfade) เกิดเมื่อผลวัดมาถึงหรือเปลี่ยน volume
+"""
+import os
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+import discord  # noqa: E402
+import numpy as np  # noqa: E402
+
+from services.loudness import NormalizedVolume  # noqa: E402
+
+
+class MusicSource(discord.AudioSource):
+    """เพลงจำลอง (สุ่มระดับประมาณ -15 dBFS RMS) สร้างไว้ก่อนเพื่อวัดแต่การปรับเสียง"""
+
+    def __init__(self, frames=50, level=6000):
+        rng = np.random.default_rng(0)
+        self._frames = [np.clip(rng.standard_normal(1920) * level, -32768, 32767).astype(np.int16).tobytes()
+                        for _ in range(frames)]
+        self._index = 0
+
+    def read(self):
+        self._index += 1
+        return self._frames[self._index % len(self._frames)]
+
+
+def per_frame(source, frames: int) -> float:
+    read = source.read
+    for _ in range(100):
+        read()
+    start = time.perf_counter()
+    for _ in range(frames):
+        read()
+    return (time.perf_counter() - start) / frames * 1e6
+
+
+def main(frames: int):
+    print(f"frames = {frames}")
+    baseline = per_frame(discord.PCMVolumeTransformer(MusicSource(), 0.5), frames)
+    print(f"  {'audioop (PCMVolumeTransformer)':<32} {baseline:6.1f} us/frame")
+
+    cases = {
+        'numpy gain': NormalizedVolume(MusicSource(), 0.5, track_gain=1.4),
+        'numpy limiting': NormalizedVolume(MusicSource(level=20000), 0.5, track_gain=4.0),
+    }
+    for name, source in cases.items():
+        cost = per_frame(source, frames)
+        print(f"  {name:<32} {cost:6.1f} us/frame   {cost / baseline:4.2f}x audioop   "
+              f"{cost / 20000 * 100:.3f}% of real time")
+
+    changing = NormalizedVolume(MusicSource(), 0.5)
+    changing.read()
+    start = time.perf_counter()
+    for i in range(200):
+        changing.track_gain = 1.0 + (i % 2) * 0.5
+        changing.read()
+    cost = (time.perf_counter() - start) / 200 * 1e6
+    print(f"  {'gain change (once per change)':<32} {cost:6.1f} us/frame")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
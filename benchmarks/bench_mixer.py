@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+วัด CPU ต่อ frame (20 ms) ของ Mixer ในสถานการณ์ต่างๆ
+
+Usage: python benchmarks/bench_mixer.py [frames]
+
+- passthrough: เพลงอย่างเดียว (ส่ง bytes ต่อไปตรงๆ ไม่ผ่าน NumPy)
+- duck: เพลง + TTS ระหว่างที่เพลงถูกลดเสียงคงที่
+- duck ramp: เพลง + TTS ระหว่างที่ gain กำลังเปลี่ยน (ต่อ sample)
+- crossfade + speech: เพลงเก่า fade out + เพลงใหม่ fade in + TTS
+- audioop: การรวม 2 ชั้นด้วย audioop.mul/add เพื่อเปรียบเทียบ
+"""
+import audioop
+import os
+import random
+import sys
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+from services.mixer import FRAME_SIZE, Mixer  # noqa: E402
+
+
+class NoiseSource:
+    """frame สุ่มที่สร้างไว้ก่อน เพื่อวัดแต่เวลาของ mixer"""
+
+    def __init__(self, frames=50):
+        rng = random.Random(0)
+        self._frames = [bytes(rng.getrandbits(8) for _ in range(FRAME_SIZE)) for _ in range(frames)]
+        self._index = 0
+
+    def read(self):
+        self._index += 1
+        return self._frames[self._index % len(self._frames)]
+
+    def cleanup(self):
+        pass
+
+
+def per_frame(fn, frames):
+    start = time.process_time()
+    for _ in range(frames):
+        fn()
+    return (time.process_time() - start) / frames * 1e6
+
+
+def scenario(name, setup, frames):
+    mixer = setup()
+    us = per_frame(mixer.read, frames)
+    print(f"  {name:<22} {us:8.1f} us/frame   {us / 20000 * 100:6.3f}% of one core per guild")
+
+
+def main(frames: int):
+    print(f"frames = {frames} (20 ms each)")
+
+    def passthrough():
+        mixer = Mixer()
+        mixer.play_music(NoiseSource())
+        return mixer
+
+    def duck():
+        mixer = Mixer(duck_ramp=0)
+        mixer.play_music(NoiseSource())
+        mixer.play_speech(NoiseSource())
+        return mixer
+
+    class Ramping(Mixer):
+        """บังคับให้ gain เปลี่ยนทุก frame"""
+
+        def read(self):
+            self._duck.set(0.3 if self._duck.target == 1.0 else 1.0, 10 ** 9)
+            return super().read()
+
+    def duck_ramp():
+        mixer = Ramping()
+        mixer.play_music(NoiseSource())
+        mixer.play_speech(NoiseSource())
+        return mixer
+
+    def crossfade():
+        mixer = Mixer(crossfade=10 ** 6)
+        mixer.play_music(NoiseSource())
+        mixer.play_music(NoiseSource())
+        mixer.play_speech(NoiseSource())
+        return mixer
+
+    scenario("passthrough", passthrough, frames)
+    scenario("duck", duck, frames)
+    scenario("duck ramp", duck_ramp, frames)
+    scenario("crossfade + speech", crossfade, frames)
+
+    music, speech = NoiseSource(), NoiseSource()
+    us = per_frame(lambda: audioop.add(audioop.mul(music.read(), 2, 0.3), speech.read(), 2), frames)
+    print(f"  {'audioop (2 layers)':<22} {us:8.1f} us/frame   {us / 20000 * 100:6.3f}% of one core per guild")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
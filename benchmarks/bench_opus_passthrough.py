@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+เทียบ CPU ของการเล่นเพลงแบบ PCM (เดิม) กับ Opus output ที่ N stream พร้อมกัน
+
+Usage: python benchmarks/bench_opus_passthrough.py [streams] [seconds]
+
+Every stream plays the same generated WebM/Opus file, which is what yt-dlp
+picks for YouTube (itag 251). All streams are read round robin, one 20 ms
+frame each, the way N guilds' voice threads would read them. CPU is taken
+from getrusage for this process plus its ffmpeg children. It is reported
+as the cores needed to play the N streams in real time.
+
+- pcm: FFmpegPCMAudio -> PCMVolumeTransformer(0.5) -> libopus encode in-process
+- opus+volume: ffmpeg applies the volume and encodes Opus itself (not used
+  by the bot: it costs as much as the pcm path)
+- opus copy: OpusTrack, ffmpeg copies the Opus packets (PLAYBACK_VOLUME=1.0)
+
+Set FFMPEG to the ffmpeg binary if it is not on PATH. When libopus cannot be
+loaded into this process, the in-process encode cost of the pcm path is
+measured by encoding the same PCM with ffmpeg's libopus instead.
+"""
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+warnings.filterwarnings('ignore', category=DeprecationWarning)
+
+import discord  # noqa: E402
+
+from services.audio_source import OpusTrack  # noqa: E402
+
+FFMPEG = os.getenv("FFMPEG") or shutil.which("ffmpeg") or "ffmpeg"
+FRAME_SECONDS = 0.02
+
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def make_track(directory: str, seconds: float) -> str:
+    """สร้างไฟล์ WebM/Opus 128 kbps (เสียงรบกวนสีชมพู + sine ให้ encoder ทำงานจริง)"""
+    path = os.path.join(directory, 'track.webm')
+    subprocess.run([
+        FFMPEG, '-loglevel', 'error', '-y',
+        '-f', 'lavfi', '-i', f'anoisesrc=color=pink:amplitude=0.2:duration={seconds}:sample_rate=48000',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={seconds}:sample_rate=48000',
+        '-filter_complex', 'amix=inputs=2,aformat=channel_layouts=stereo',
+        '-c:a', 'libopus', '-b:a', '128k', path,
+    ], check=True)
+    return path
+
+
+def encoder():
+    if not discord.opus.is_loaded():
+        try:
+            discord.opus._load_default()
+        except Exception:
+            pass
+    return discord.opus.Encoder() if discord.opus.is_loaded() else None
+
+
+def run(name, factory, streams: int, frames: int, encode=None):
+    start_cpu = cpu_seconds()
+    start = time.perf_counter()
+    sources = [factory() for _ in range(streams)]
+    for _ in range(frames):
+        for source in sources:
+            data = source.read()
+            if encode is not None:
+                encode(data)
+    for source in sources:
+        source.cleanup()
+    cpu = cpu_seconds() - start_cpu
+    audio = frames * FRAME_SECONDS
+    print(f"  {name:<26} {cpu:7.2f} s cpu   {cpu / audio:5.2f} cores for {streams} streams   "
+          f"{cpu / audio / streams * 100:6.2f}% of a core per guild   (wall {time.perf_counter() - start:.1f} s)")
+    return cpu
+
+
+def ffmpeg_encode_estimate(track: str, seconds: float) -> float:
+    """CPU ของ libopus encode สำหรับเสียง ``seconds`` วินาที (วัดผ่าน ffmpeg แทน encoder ใน process)"""
+    pcm = subprocess.run([FFMPEG, '-loglevel', 'error', '-i', track, '-t', str(seconds),
+                          '-f', 's16le', '-ar', '48000', '-ac', '2', 'pipe:1'], capture_output=True, check=True).stdout
+    before = cpu_seconds()
+    subprocess.run([FFMPEG, '-loglevel', 'error', '-f', 's16le', '-ar', '48000', '-ac', '2', '-i', 'pipe:0',
+                    '-c:a', 'libopus', '-b:a', '128k', '-fec', 'true', '-packet_loss', '15',
+                    '-f', 'null', '-'], input=pcm, check=True)
+    return cpu_seconds() - before
+
+
+def main(streams: int, seconds: float):
+    frames = int(seconds / FRAME_SECONDS)
+    data = {'acodec': 'opus', 'title': 'bench'}
+    with tempfile.TemporaryDirectory() as directory:
+        track = make_track(directory, seconds + 5)
+        print(f"streams = {streams}, audio = {seconds:.0f} s each, ffmpeg = {FFMPEG}")
+
+        opus_encoder = encoder()
+        pcm_cpu = run(
+            "pcm" + ("" if opus_encoder else " (decode + volume)"),
+            lambda: discord.PCMVolumeTransformer(
+                discord.FFmpegPCMAudio(track, executable=FFMPEG, options='-vn -loglevel error'),
+                0.5),
+            streams, frames, encode=(lambda pcm: opus_encoder.encode(pcm, opus_encoder.SAMPLES_PER_FRAME))
+            if opus_encoder else None,
+        )
+        if opus_encoder is None:
+            estimate = ffmpeg_encode_estimate(track, seconds) * streams
+            total = pcm_cpu + estimate
+            print(f"  {'pcm (+ libopus encode)':<26} {total:7.2f} s cpu   {total / seconds:5.2f} cores for {streams} streams   "
+                  f"{total / seconds / streams * 100:6.2f}% of a core per guild   (encode measured via ffmpeg)")
+
+        run("opus+volume (ffmpeg)", lambda: discord.FFmpegOpusAudio(
+                track, executable=FFMPEG, options='-vn -loglevel error -af volume=0.5'),
+            streams, frames)
+        run("opus copy (passthrough)", lambda: OpusTrack(
+                track, data=data, executable=FFMPEG, options='-vn -loglevel error'),
+            streams, frames)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+         float(sys.argv[2]) if len(sys.argv) > 2 else 10)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark ของ TrackQueue เทียบกับ list
+
+Usage: python benchmarks/bench_queue.py [size]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.track_queue import TrackQueue  # noqa: E402
+
+
+def timed(label, fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<22} {elapsed / repeat * 1e6:10.2f} us/op")
+
+
+def bench(size: int, repeat: int = 2000):
+    rng = random.Random(0)
+    print(f"queue size = {size}")
+    for name, factory in (("TrackQueue", lambda: TrackQueue(range(size))), ("list", lambda: list(range(size)))):
+        queue = factory()
+        print(name)
+        is_list = isinstance(queue, list)
+
+        def push():
+            queue.append(0)
+
+        def pop_front():
+            if is_list:
+                queue.pop(0)
+            else:
+                queue.popleft()
+            queue.append(0)
+
+        def remove_at():
+            i = rng.randrange(len(queue))
+            queue.pop(i)
+            queue.append(0)
+
+        def move():
+            src, dst = rng.randrange(len(queue)), rng.randrange(len(queue))
+            if is_list:
+                queue.insert(dst, queue.pop(src))
+            else:
+                queue.move(src, dst)
+
+        def page():
+            start = rng.randrange(len(queue))
+            if is_list:
+                queue[start:start + 10]
+            else:
+                queue.slice(start, start + 10)
+
+        def shuffle():
+            if is_list:
+                rng.shuffle(queue)
+            else:
+                queue.shuffle()
+
+        timed("push", push, repeat)
+        timed("pop front", pop_front, repeat)
+        timed("remove at random", remove_at, repeat)
+        timed("move random", move, repeat)
+        timed("page of 10", page, repeat)
+        timed("shuffle", shuffle, 20)
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
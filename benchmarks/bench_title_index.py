@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Latency และหน่วยความจำของ TitleIndex (autocomplete ของ /play) ที่จำนวนชื่อเพลงต่างๆ
+
+ชื่อเพลงสุ่มจากคำภาษาอังกฤษ/ไทย คำค้นมีทั้ง prefix สั้น ต้นชื่อเพลง คำกลางชื่อ และคำที่พิมพ์ผิด
+
+Usage: python benchmarks/bench_title_index.py [titles ...]
+"""
+import gc
+import os
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.title_index import MAX_CHOICES, TitleIndex  # noqa: E402
+
+THAI_WORDS = ["รัก", "เธอ", "คิดถึง", "ลาลาลอย", "ทะเล", "ฝน", "ใจ", "คืนนี้", "เพลง", "ดาว", "ฟ้า", "เหงา"]
+SUFFIXES = ["(Official Video)", "(Lyrics)", "[Live]", "(Official Audio)", "- Topic", "(Cover)", ""]
+
+
+def make_titles(count: int, rng: random.Random):
+    vocabulary = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+                  for _ in range(20_000)] + THAI_WORDS * 50
+    titles = []
+    for i in range(count):
+        artist = ' '.join(rng.choice(vocabulary).title() for _ in range(rng.randint(1, 2)))
+        song = ' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 5)))
+        titles.append((f"{i:011d}", f"{artist} - {song} {rng.choice(SUFFIXES)}".strip(), rng.randint(60, 600)))
+    return titles
+
+
+def typo(text: str, rng: random.Random) -> str:
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 1)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def make_queries(titles, rng: random.Random, count: int = 2000):
+    queries = []
+    for _ in range(count):
+        video_id, title, _ = rng.choice(titles)
+        words = title.split()
+        kind = rng.randrange(4)
+        if kind == 0:
+            queries.append((title[:rng.randint(1, 2)], video_id))  # เพิ่งเริ่มพิมพ์
+        elif kind == 1:
+            queries.append((title[:rng.randint(4, 20)], video_id))  # ต้นชื่อ
+        elif kind == 2:
+            queries.append((' '.join(words[-3:-1]), video_id))  # คำกลางชื่อ
+        else:
+            queries.append((typo(title[:rng.randint(6, 24)], rng), video_id))
+    return queries
+
+
+def build(titles) -> TitleIndex:
+    index = TitleIndex()
+    for video_id, title, duration in titles:
+        index.add(video_id, title, duration)
+    return index
+
+
+def bench(count: int):
+    rng = random.Random(count)
+    titles = make_titles(count, rng)
+    gc.collect()
+    tracemalloc.start()
+    index = build(titles)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del index
+    gc.collect()
+    start = time.perf_counter()
+    index = build(titles)
+    elapsed = time.perf_counter() - start
+
+    queries = make_queries(titles, rng)
+    latencies = []
+    found = typed = 0
+    for query, video_id in queries:
+        start = time.perf_counter()
+        choices = index.suggest(query)
+        latencies.append(time.perf_counter() - start)
+        if len(query) >= 3:  # 1-2 ตัวอักษรยังระบุเพลงไม่ได้
+            typed += 1
+            found += any(url.endswith(video_id) for _, url in choices)
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    worst = latencies[-1] * 1000
+    print(f"{count:>8} titles  build {elapsed:5.2f} s ({elapsed / count * 1e6:4.1f} us/title)  "
+          f"memory {memory / 2**20:6.1f} MiB ({memory / count:4.0f} B/title)  "
+          f"suggest p50 {p50:4.2f} ms  p99 {p99:4.2f} ms  max {worst:5.2f} ms  "
+          f"target in top {MAX_CHOICES} {found / typed:4.0%}")
+
+
+if __name__ == "__main__":
+    for size in [int(arg) for arg in sys.argv[1:]] or [1_000, 10_000, 100_000]:
+        bench(size)
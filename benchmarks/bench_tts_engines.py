@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+เทียบ latency และ CPU ของ TTS engine แต่ละตัว
+
+Usage: python benchmarks/bench_tts_engines.py [phrases]
+
+For each engine that is usable here (gtts needs network, espeak needs
+espeak-ng), synthesize the same phrases without the cache and report:
+- wall-clock latency per phrase (p50 / max)
+- CPU time per phrase, split into this process and child processes
+  (espeak-ng itself)
+- CPU to decode one second of output for playback. gtts mp3 goes through
+  ffmpeg; espeak PCM is read as-is.
+"""
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.tts_engines import ENGINES, PCM_CHANNELS, PCM_RATE  # noqa: E402
+
+PHRASES = [
+    "สวัสดีครับ ยินดีต้อนรับเข้าสู่ห้องเสียง",
+    "เพลงถัดไปกำลังจะเริ่มในอีกไม่กี่วินาที",
+    "วันนี้อากาศดีมากเหมาะกับการออกไปเดินเล่น",
+    "อย่าลืมดื่มน้ำและพักสายตาบ้างนะ",
+    "ขอบคุณที่ใช้งานบอทของเรา",
+]
+
+
+def cpu_times():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime, children.ru_utime + children.ru_stime
+
+
+def playback_cpu(path: str) -> float:
+    """CPU (วินาที) ต่อเสียง 1 วินาที ที่ต้องใช้เตรียม PCM สำหรับเล่น"""
+    if path.endswith('.pcm'):
+        seconds = os.path.getsize(path) / (PCM_RATE * PCM_CHANNELS * 2)
+        start = time.process_time()
+        with open(path, 'rb') as f:
+            while f.read(3840):
+                pass
+        return (time.process_time() - start) / max(seconds, 1e-9)
+    if not shutil.which('ffmpeg'):
+        return float('nan')
+    before = cpu_times()[1]
+    pcm = subprocess.run(['ffmpeg', '-loglevel', 'quiet', '-i', path, '-f', 's16le', '-ar', str(PCM_RATE),
+                          '-ac', str(PCM_CHANNELS), 'pipe:1'], capture_output=True, check=True).stdout
+    seconds = len(pcm) / (PCM_RATE * PCM_CHANNELS * 2)
+    return (cpu_times()[1] - before) / max(seconds, 1e-9)
+
+
+def bench(engine, phrases, directory):
+    latencies = []
+    own_start, child_start = cpu_times()
+    paths = []
+    for n, text in enumerate(phrases):
+        path = os.path.join(directory, f"{engine.name}-{n}{engine.suffix}")
+        start = time.perf_counter()
+        engine.synthesize(text, 'th', False, path)
+        latencies.append(time.perf_counter() - start)
+        paths.append(path)
+    own_end, child_end = cpu_times()
+    count = len(phrases)
+    decode = statistics.mean(playback_cpu(path) for path in paths)
+    print(f"  {engine.name:<7} p50 {statistics.median(latencies) * 1000:7.1f} ms   max {max(latencies) * 1000:7.1f} ms   "
+          f"cpu {((own_end - own_start) / count) * 1000:6.1f} ms self + {((child_end - child_start) / count) * 1000:6.1f} ms child"
+          f"   playback {decode * 1000:6.2f} ms cpu / audio-s")
+
+
+def main(count: int):
+    phrases = [PHRASES[n % len(PHRASES)] + f" {n}" for n in range(count)]
+    print(f"phrases = {count}")
+    with tempfile.TemporaryDirectory() as directory:
+        for engine in ENGINES.values():
+            if not engine.available():
+                print(f"  {engine.name:<7} skipped (not installed)")
+                continue
+            try:
+                bench(engine, phrases, directory)
+            except Exception as e:
+                print(f"  {engine.name:<7} skipped ({type(e).__name__}: {e})")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+วัด time-to-first-audio ของ /speak เทียบกับความยาวข้อความ
+
+Usage: python benchmarks/bench_tts_stream.py [request_ms]
+
+gTTS is replaced by a stand-in that, like gTTS, sends one request per 100
+characters, one after another, and each request takes ``request_ms``
+(default 300).
+
+- whole: synthesize the entire text, then start playing (the old behaviour)
+- chunked: split_sentences + synthesize_chunks; playback starts when the
+  first chunk is ready
+"""
+import asyncio
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.tts_cache import TTSCache  # noqa: E402
+from services.tts_stream import split_sentences, synthesize_chunks  # noqa: E402
+
+SENTENCE = "วันนี้อากาศดีมากเหมาะกับการออกไปเดินเล่นที่สวนสาธารณะ {}. "
+
+
+def make_synthesizer(request_ms: float):
+    def synthesize(text, lang, slow, path):
+        time.sleep(math.ceil(len(text) / 100) * request_ms / 1000)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 1024)
+    return synthesize
+
+
+async def measure(length: int, request_ms: float):
+    # ทุกประโยคไม่ซ้ำกัน ไม่งั้น cache จะรวม chunk ที่เหมือนกันเป็นงานเดียว
+    text = ''.join(SENTENCE.format(n) for n in range(length // 40 + 1))[:length]
+    synthesize = make_synthesizer(request_ms)
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TTSCache(directory, synthesize=synthesize)
+        start = time.perf_counter()
+        await cache.get(text)
+        whole = time.perf_counter() - start
+        cache.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TTSCache(directory, synthesize=synthesize)
+        chunks = split_sentences(text)
+        start = time.perf_counter()
+        futures = synthesize_chunks(cache, chunks)
+        await asyncio.wrap_future(futures[0])
+        first = time.perf_counter() - start
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        total = time.perf_counter() - start
+        cache.close()
+    return whole, first, total, len(chunks)
+
+
+async def main(request_ms: float):
+    print(f"request = {request_ms:.0f} ms per 100 chars")
+    print(f"  {'chars':>6} {'chunks':>7} {'whole: first audio':>20} {'chunked: first audio':>22} {'chunked: all ready':>20}")
+    for length in (100, 200, 500, 1000, 1500):
+        whole, first, total, count = await measure(length, request_ms)
+        print(f"  {length:>6} {count:>7} {whole * 1000:>17.0f} ms {first * 1000:>19.0f} ms {total * 1000:>17.0f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(float(sys.argv[1]) if len(sys.argv) > 1 else 300))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+วัด requests/sec และ p99 latency ของ `/` กับ `/api/command` เทียบ serving mode
+
+Usage: python benchmarks/bench_webapp.py [requests] [concurrency]
+
+Discord and Firestore are replaced by stand-ins with fixed latency
+(DISCORD_LATENCY_MS, FIRESTORE_LATENCY_MS). The Discord cache is disabled
+so every `/` really reaches the upstream.
+
+- before: werkzeug threaded server, Discord calls one after another, and a
+  Firestore write on the request path
+- after: uvicorn + DashboardASGI, Discord calls in parallel, and the Firestore
+  write in the background
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DISCORD_LATENCY = float(os.getenv("DISCORD_LATENCY_MS", "40")) / 1000
+FIRESTORE_LATENCY = float(os.getenv("FIRESTORE_LATENCY_MS", "80")) / 1000
+GUILD_ID = "123456789012345678"
+
+
+class FakeDocument:
+    counter = 0
+
+    def __init__(self):
+        FakeDocument.counter += 1
+        self.id = f"cmd{FakeDocument.counter}"
+
+    def set(self, data):
+        time.sleep(FIRESTORE_LATENCY)
+
+    def collection(self, name):
+        return FakeCollection()
+
+    def document(self, *args):
+        return FakeDocument()
+
+
+class FakeCollection:
+    def document(self, *args):
+        return FakeDocument()
+
+
+class FakeDB:
+    """Firestore stand-in: every write takes FIRESTORE_LATENCY"""
+
+    def collection(self, name):
+        return FakeCollection()
+
+
+class InlineExecutor:
+    """เรียกงานทันทีใน thread เดิม (พฤติกรรมเดิม: เรียก Discord ทีละตัว)"""
+
+    def submit(self, fn, *args):
+        from concurrent.futures import Future
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def run_discord_standin(port_queue):
+    """Discord API stand-in (process แยก ไม่แย่ง GIL กับ webapp)"""
+    from aiohttp import web
+
+    guilds = [{'id': GUILD_ID, 'name': 'Bench', 'icon': None}] + \
+             [{'id': str(10 ** 17 + n), 'name': f'Guild {n}', 'icon': None} for n in range(49)]
+    user = {'id': '42', 'username': 'bench', 'avatar': None, 'discriminator': '0'}
+
+    async def handle(request):
+        await asyncio.sleep(DISCORD_LATENCY)
+        return web.json_response(user if request.path.endswith('/@me') else guilds)
+
+    async def serve():
+        app = web.Application()
+        app.router.add_get('/users/@me', handle)
+        app.router.add_get('/users/@me/guilds', handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port_queue.put(site._server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def import_webapp(workdir, concurrency):
+    os.chdir(workdir)  # webapp.log ไปอยู่ใน temp dir
+    os.environ.update({
+        'FLASK_SECRET_KEY': 'bench', 'DISCORD_CLIENT_ID': 'x', 'DISCORD_CLIENT_SECRET': 'x',
+        'DISCORD_REDIRECT_URI': 'http://localhost/callback', 'DISCORD_TOKEN': 'bench',
+        'FIREBASE_CREDENTIALS_PATH': os.path.join(workdir, 'missing.json'),
+        'GUILD_INDEX_PATH': os.path.join(workdir, 'missing.json'),
+        'COMMAND_BUS': 'firestore', 'WEB_THREADS': str(concurrency),
+    })
+    import logging
+    import webapp
+
+    for name in (None, 'webapp', 'werkzeug', 'services', 'urllib3'):
+        logging.getLogger(name).setLevel(logging.ERROR)
+    return webapp
+
+
+def run_webapp(scenario, workdir, concurrency, discord_url, port_queue):
+    """webapp ใน process แยก ตั้งค่าตาม scenario (before / after)"""
+    webapp = import_webapp(workdir, concurrency)
+    from services.command_bus import FirestoreCommandBus
+
+    webapp.discord_api.api_endpoint = discord_url
+    webapp.discord_api.ttl = 0  # ทุก request ต้องไปถึง upstream
+    webapp.BOT_GUILDS_TTL = 0
+    if scenario == 'before':
+        webapp.upstream_pool = InlineExecutor()
+        webapp.command_bus = FirestoreCommandBus(FakeDB())
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, webapp.app, threaded=True)
+        port_queue.put(server.server_port)
+        server.serve_forever()
+    else:
+        import socket
+        import uvicorn
+        webapp.command_bus = FirestoreCommandBus(FakeDB(), background=True, max_pending=100000)
+        # ระบุ IPPROTO_TCP ไม่งั้น asyncio ไม่เปิด TCP_NODELAY ให้ และทุก response จะติด delayed ACK 40 ms
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+        sock.bind(('127.0.0.1', 0))
+        port_queue.put(sock.getsockname()[1])
+        uvicorn.Server(uvicorn.Config(webapp.asgi_app, lifespan='off', log_level='warning')).run(sockets=[sock])
+
+
+def start_process(target, *args):
+    import multiprocessing
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=target, args=args + (port_queue,), daemon=True)
+    process.start()
+    return process, f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+
+
+async def load(base_url, method, path, cookie, total, concurrency, json_body=None):
+    import aiohttp
+
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, cookies={'session': cookie}) as client:
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                start = time.perf_counter()
+                async with client.request(method, base_url + path, json=json_body, allow_redirects=False) as r:
+                    await r.read()
+                    if r.status != 200:
+                        errors += 1
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'rps': total / elapsed,
+        'p50': statistics.median(latencies) * 1000,
+        'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'errors': errors,
+    }
+
+
+def main(total: int, concurrency: int):
+    workdir = tempfile.mkdtemp(prefix='bench-webapp-')
+    webapp = import_webapp(workdir, concurrency)
+    cookie = webapp.app.session_interface.get_signing_serializer(webapp.app).dumps({
+        'discord_token': 'bench-token',
+        'discord_user': {'id': '42', 'username': 'bench', 'avatar': None, 'discriminator': '0'},
+    })
+    discord, discord_url = start_process(run_discord_standin)
+
+    print(f"requests = {total}, concurrency = {concurrency}, "
+          f"discord = {DISCORD_LATENCY * 1000:.0f} ms, firestore = {FIRESTORE_LATENCY * 1000:.0f} ms")
+    try:
+        for scenario, server_kind in (('before', 'werkzeug'), ('after', 'asgi')):
+            server, base_url = start_process(run_webapp, scenario, workdir, concurrency, discord_url)
+            time.sleep(0.5)
+            try:
+                for method, path, body in (('GET', '/', None),
+                                           ('POST', '/api/command', {'guild_id': GUILD_ID, 'action': 'skip'})):
+                    result = asyncio.run(load(base_url, method, path, cookie, total, concurrency, body))
+                    print(f"  {scenario:<7} {server_kind:<9} {method:<4} {path:<13} {result['rps']:8.1f} req/s   "
+                          f"p50 {result['p50']:7.1f} ms   p99 {result['p99']:7.1f} ms   errors {result['errors']}")
+            finally:
+                server.terminate()
+                server.join()
+    finally:
+        discord.terminate()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 32)
@@ -45,6 +45,23 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import threading
 
+from services.audio_cache import audio_cache
+from services.loudness import loudness_store
+from services.command_bus import DEFAULT_ADDRESS, LocalCommandServer
+from services.command_dispatcher import GuildDispatcher
+from services.firestore_listener import SnapshotListener, command_created_at
+from services.guild_index import GuildIndex
+from services.metrics import FIRESTORE_OPS, MetricsServer, PlayTimer, discord_http_trace, registry, track_source
+from services.mixer import gap_meter, music_playing, stop_music
+from services.music_player import extraction_pool, music_player
+from services.status_writer import StatusWriter
+from services.playback import QueueEntry
+from services.playlist import is_playlist_url
+from services.title_index import title_index
+from services.track_catalog import track_catalog
+from services.track_cache import track_cache, watch_url
+from services.voice_presence import VOICE_IDLE_GRACE_SECONDS, IdleDisconnect, VoicePresence
+
 # --- การตั้งค่าเริ่มต้น ---
 # Configure console output encoding for Windows
 if sys.platform == 'win32':
@@ -83,105 +100,6 @@ except Exception as e:
     logger.warning(f"Failed to connect to Firebase: {e}")
     db = None
 
-# --- การตั้งค่า YTDL และ FFMPEG ---
-# ใช้ yt-dlp ซึ่งเป็นเวอร์ชันที่พัฒนาต่อจาก youtube-dl
-# Enhanced YTDL configuration with fallback strategies and better error handling
-YTDL_OPTIONS = {
-    'format': 'bestaudio[ext=webm]/bestaudio[ext=m4a]/bestaudio/best',
-    'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
-    'restrictfilenames': True,
-    'noplaylist': True,
-    'nocheckcertificate': True,
-    'ignoreerrors': False,
-    'logtostderr': False,
-    'quiet': True,
-    'no_warnings': True,
-    'default_search': 'ytsearch',
-    'extract_flat': False,
-    'retries': 5,
-    'fragment_retries': 5,
-    'retry_sleep_functions': {'http': lambda n: min(4, 0.5 * (2 ** n))},
-    # Enhanced configuration for latest YouTube API with multiple fallbacks
-    'extractor_args': {
-        'youtube': {
-            'player_client': ['ios', 'android', 'mweb', 'web', 'tv_embedded'],
-            'skip': ['dash', 'hls'],
-            'max_comments': [0],
-            'innertube_host': ['youtubei.googleapis.com'],
-        }
-    },
-    'age_limit': None,
-    'geo_bypass': True,
-    'http_headers': {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'Accept-Language': 'en-us,en;q=0.5',
-        'Sec-Fetch-Mode': 'navigate',
-    }
-}
-FFMPEG_OPTIONS = {
-    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-    'options': '-vn'
-}
-
-ytdl = yt_dlp.YoutubeDL(YTDL_OPTIONS)
-
-class YTDLSource(discord.PCMVolumeTransformer):
-    """
-    คลาสสำหรับจัดการการดึงข้อมูลและสตรีมเสียงจาก YouTube
-    """
-    def __init__(self, source, *, data, volume=0.5):
-        super().__init__(source, volume)
-        self.data = data
-        self.title = data.get('title', 'Unknown Title')
-        self.url = data.get('webpage_url', '')
-        self.duration = data.get('duration', 0)
-
-    @classmethod
-    async def from_url(cls, url, *, loop=None, stream=True):
-        try:
-            loop = loop or asyncio.get_event_loop()
-            logger.info(f"Extracting info for URL: {url}")
-            
-            data = await loop.run_in_executor(
-                None, 
-                lambda: ytdl.extract_info(url, download=not stream)
-            )
-
-            if not data:
-                raise ValueError("Could not extract video information")
-
-            if 'entries' in data:
-                # ถ้าเป็น playlist ให้เลือกวิดีโอแรก
-                if not data['entries']:
-                    raise ValueError("Playlist is empty")
-                data = data['entries'][0]
-
-            if not data.get('url'):
-                raise ValueError("No audio URL found")
-
-            filename = data['url'] if stream else ytdl.prepare_filename(data)
-            source = discord.FFmpegPCMAudio(filename, **FFMPEG_OPTIONS)
-            
-            logger.info(f"Successfully created audio source for: {data.get('title', 'Unknown')}")
-            return cls(source, data=data)
-            
-        except Exception as e:
-            error_msg = str(e)
-            logger.error(f"Error in YTDLSource.from_url: {error_msg}")
-            
-            # Provide more user-friendly error messages
-            if "Failed to extract any player response" in error_msg:
-                raise ValueError("วิดีโอนี้ไม่สามารถเล่นได้ อาจจะถูกลบ ถูกตั้งเป็นส่วนตัว หรือถูกบล็อกในภูมิภาคนี้")
-            elif "Video unavailable" in error_msg:
-                raise ValueError("วิดีโอไม่พร้อมใช้งาน")
-            elif "Private video" in error_msg:
-                raise ValueError("วิดีโอนี้เป็นวิดีโอส่วนตัว")
-            elif "age-restricted" in error_msg.lower():
-                raise ValueError("วิดีโอนี้มีการจำกัดอายุ")
-            else:
-                raise ValueError(f"ไม่สามารถเล่นวิดีโอได้: {error_msg}")
-
 # --- การตั้งค่า Discord Bot ---
 # Force voice dependencies to be available
 try:
@@ -217,55 +135,26 @@ intents = discord.Intents.default()
 intents.guilds = True
 intents.voice_states = True
 intents.message_content = True  # เพิ่ม message content intent
-bot = commands.Bot(command_prefix="!", intents=intents) # Prefix command ไม่ได้ใช้แล้ว แต่ต้องมีไว้
+# http_trace นับ 429 จาก Discord ลง metrics
+bot = commands.Bot(command_prefix="!", intents=intents, http_trace=discord_http_trace()) # Prefix command ไม่ได้ใช้แล้ว แต่ต้องมีไว้
 
 # --- ตัวแปรสำหรับจัดการเพลง (Global State) ---
-# ใช้ dictionary เพื่อรองรับการทำงานหลายเซิร์ฟเวอร์พร้อมกัน
-queues: Dict[int, List[YTDLSource]] = {}
-current_tracks: Dict[int, Optional[YTDLSource]] = {}
+# คิว/เพลงปัจจุบันของทุก guild และขั้นตอนเล่นเพลงอยู่ใน services/music_player.py (ใช้ร่วมกับ cogs/music.py)
+music_player.bind(bot)
+# สถานะ player สำหรับ web dashboard (ส่งเป็น delta ผ่าน local channel)
+player_state = music_player.state
 
-# --- ฟังก์ชันเล่นเพลงถัดไป ---
-def play_next(guild_id: int, text_channel):
-    """เล่นเพลงถัดไปในคิว"""
-    try:
-        guild = bot.get_guild(guild_id)
-        if not guild or not guild.voice_client:
-            logger.warning(f"No voice client found for guild {guild_id}")
-            return
-            
-        if queues.get(guild_id):
-            player = queues[guild_id].pop(0)
-            current_tracks[guild_id] = player
-            
-            def after_playing(error):
-                if error:
-                    logger.error(f"Player error: {error}")
-                play_next(guild_id, text_channel)
-            
-            guild.voice_client.play(player, after=after_playing)
-            
-            # ส่งข้อความใน channel
-            embed = discord.Embed(
-                title="🎵 กำลังเล่นเพลง", 
-                description=player.title, 
-                color=discord.Color.blue()
-            )
-            asyncio.run_coroutine_threadsafe(
-                text_channel.send(embed=embed), 
-                bot.loop
-            )
-            logger.info(f"Now playing: {player.title} in guild {guild_id}")
-        else:
-            current_tracks[guild_id] = None
-            logger.info(f"Queue is empty for guild {guild_id}")
-    except Exception as e:
-        logger.error(f"Error in play_next: {e}")
-        current_tracks[guild_id] = None
+def find_text_channel(guild):
+    """หาช่องข้อความแรกที่บอทส่งข้อความได้"""
+    for channel in guild.text_channels:
+        if channel.permissions_for(guild.me).send_messages:
+            return channel
+    return None
 
 
 # --- Cogs Loader ---
 async def load_cogs():
-    for filename in os.listdir('./cogs'):
+    for filename in sorted(os.listdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cogs'))):
         if filename.endswith('.py'):
             try:
                 await bot.load_extension(f'cogs.{filename[:-3]}')
@@ -273,34 +162,10 @@ async def load_cogs():
             except Exception as e:
                 logger.error(f"Failed to load cog {filename}: {e}")
 
-# --- Event Listeners ---
 @bot.event
-async def on_ready():
-    logger.info(f'Bot logged in as {bot.user.name} (ID: {bot.user.id})')
-    try:
-        await load_cogs()
-        synced = await bot.tree.sync()
-        logger.info(f'Successfully synced {len(synced)} commands')
-        print(f'[BOT] {bot.user.name} is ready! Synced {len(synced)} commands.')
-        
-        for command in synced:
-            logger.info(f'Synced command: {command.name} - {command.description}')
-        
-        command_names = [cmd.name for cmd in synced]
-        critical_commands = ['play', 'join', 'leave', 'skip', 'stop']
-        missing_commands = [cmd for cmd in critical_commands if cmd not in command_names]
-        if missing_commands:
-            logger.error(f"Missing critical commands: {missing_commands}")
-        else:
-            logger.info("All critical commands synchronized successfully")
-        
-        if db:
-            listen_for_web_commands.start()
-            logger.info("Started Firebase command listener with rate limiting")
-        
-    except Exception as e:
-        logger.error(f'Failed to sync commands: {e}')
-        print(f'[ERROR] Failed to sync commands: {e}')
+async def setup_hook():
+    """โหลด cog ก่อนเชื่อมต่อ gateway (ครั้งเดียว ไม่ซ้ำตอน reconnect) ให้ on_ready sync คำสั่งของ cog ได้"""
+    await load_cogs()
 
 # --- Firebase Command Listener ---
 async def process_web_command(guild_id: str, command_data: dict):
@@ -317,7 +182,8 @@ async def process_web_command(guild_id: str, command_data: dict):
         if action == 'play':
             query = payload.get('query')
             if query:
-                await handle_web_play_command(guild, query)
+                await handle_web_play_command(guild, query, command_data.get('requester_username', ''),
+                                              command_data.get('requester_id'))
         elif action == 'skip':
             await handle_web_skip_command(guild)
         elif action == 'stop':
@@ -326,54 +192,44 @@ async def process_web_command(guild_id: str, command_data: dict):
             await handle_web_pause_command(guild)
         elif action == 'resume':
             await handle_web_resume_command(guild)
+        
+        # 'queue' ขอ snapshot เต็มของ guild นี้ใหม่ (เช่นตอน dashboard เพิ่งเปิด)
+        player_state.notify(guild.id, resync=(action == 'queue'))
             
         logger.info(f"Processed web command {action} for guild {guild_id}")
         
     except Exception as e:
         logger.error(f"Error processing web command: {e}")
 
-async def handle_web_play_command(guild, query):
+async def handle_web_play_command(guild, query, requester='', requester_id=None):
     """จัดการคำสั่ง play จาก web"""
+    timer = PlayTimer('web')
     try:
         voice_client = guild.voice_client
+        # ห้องของผู้สั่ง (หรือห้องที่มีคนมากที่สุด) จากดัชนี ไม่ต้องไล่ดูทุกห้อง
+        channel = requester_channel(guild, requester_id)
         if not voice_client:
-            # หาช่องเสียงแรกที่มีสมาชิก
-            for channel in guild.voice_channels:
-                if len(channel.members) > 0:
-                    voice_client = await channel.connect()
-                    break
+            if channel:
+                voice_client = await channel.connect()
+                timer.phase('connect')
+        elif channel and voice_client.channel != channel and \
+                voice_presence.humans(guild.id, voice_client.channel.id) == 0:
+            # บอทรออยู่ในห้องว่าง: ย้ายไปหาผู้สั่งโดยใช้ connection เดิม
+            await voice_client.move_to(channel)
+            timer.phase('connect')
         
         if not voice_client:
             logger.warning("No voice channel available to connect")
             return
             
-        # สร้าง audio source
-        player = await YTDLSource.from_url(query, loop=bot.loop, stream=True)
-        
         guild_id = guild.id
-        if voice_client.is_playing() or current_tracks.get(guild_id):
-            # เพิ่มเข้าคิว
-            if guild_id not in queues:
-                queues[guild_id] = []
-            queues[guild_id].append(player)
-            logger.info(f"Added {player.title} to queue for guild {guild_id}")
-        else:
-            # เล่นทันที
-            current_tracks[guild_id] = player
-            
-            def after_playing(error):
-                if error:
-                    logger.error(f"Player error: {error}")
-                # หาช่องข้อความที่เหมาะสม
-                text_channel = None
-                for channel in guild.text_channels:
-                    if channel.permissions_for(guild.me).send_messages:
-                        text_channel = channel
-                        break
-                play_next(guild_id, text_channel)
-            
-            voice_client.play(player, after=after_playing)
-            logger.info(f"Now playing {player.title} in guild {guild_id}")
+        if is_playlist_url(query):
+            music_player.add_playlist(guild_id, query, find_text_channel(guild), requester=requester)
+            return
+
+        # เก็บแค่ metadata ไว้ในคิว audio source จะถูกสร้างตอนเล่นจริง
+        entry = QueueEntry(query=query, requester=requester)
+        music_player.enqueue(guild_id, entry, voice_client, find_text_channel(guild), timer=timer)
             
     except Exception as e:
         logger.error(f"Error in web play command: {e}")
@@ -381,35 +237,201 @@ async def handle_web_play_command(guild, query):
 async def handle_web_skip_command(guild):
     """จัดการคำสั่ง skip จาก web"""
     voice_client = guild.voice_client
-    if voice_client and voice_client.is_playing():
-        voice_client.stop()
+    if voice_client and music_playing(voice_client):
+        stop_music(voice_client)
         logger.info(f"Skipped track in guild {guild.id}")
 
 async def handle_web_stop_command(guild):
     """จัดการคำสั่ง stop จาก web"""
     voice_client = guild.voice_client
     if voice_client:
-        guild_id = guild.id
-        if queues.get(guild_id):
-            queues[guild_id].clear()
-        current_tracks[guild_id] = None
+        music_player.clear(guild.id)
         voice_client.stop()
-        logger.info(f"Stopped playback in guild {guild_id}")
+        logger.info(f"Stopped playback in guild {guild.id}")
 
 async def handle_web_pause_command(guild):
     """จัดการคำสั่ง pause จาก web"""
     voice_client = guild.voice_client
+    idle_paused.discard(guild.id)  # ผู้ใช้สั่งเอง ไม่ต้อง resume ให้ตอนมีคนกลับมา
     if voice_client and voice_client.is_playing():
         voice_client.pause()
+        music_player.clock(guild.id).pause()
         logger.info(f"Paused playback in guild {guild.id}")
 
 async def handle_web_resume_command(guild):
     """จัดการคำสั่ง resume จาก web"""
     voice_client = guild.voice_client
+    idle_paused.discard(guild.id)
     if voice_client and voice_client.is_paused():
         voice_client.resume()
+        music_player.clock(guild.id).resume()
         logger.info(f"Resumed playback in guild {guild.id}")
 
+async def run_web_command(guild_id: str, doc):
+    """ประมวลผลเอกสารคำสั่งหนึ่งรายการแล้วอัปเดตสถานะใน Firestore (แบบ batch)"""
+    try:
+        command_data = doc.to_dict()
+        
+        # Add timeout protection for command processing
+        await asyncio.wait_for(
+            process_web_command(guild_id, command_data),
+            timeout=30.0
+        )
+        
+        if doc.reference is None:
+            # คำสั่งจาก local channel ไม่มีเอกสารใน Firestore ให้อัปเดต
+            logger.info(f"[SUCCESS] Processed local command {command_data.get('action')} for guild {guild_id}")
+            return
+        
+        # Mark as completed with timestamp (รวมเป็น WriteBatch โดย status_writer)
+        status_writer.update(doc.reference, {
+            'status': 'completed',
+            'completed_at': firestore.SERVER_TIMESTAMP
+        })
+        logger.info(f"[SUCCESS] Processed web command {command_data.get('action')} for guild {guild_id}")
+        
+    except asyncio.TimeoutError:
+        logger.warning(f"[TIMEOUT] Web command timed out for guild {guild_id}")
+        if doc.reference is not None:
+            status_writer.update(doc.reference, {'status': 'timeout'})
+    except Exception as cmd_error:
+        logger.error(f"[ERROR] Error processing command: {cmd_error}")
+        if doc.reference is not None:
+            status_writer.update(doc.reference, {'status': 'error', 'error': str(cmd_error)})
+
+# --- Web command intake ---
+# query เดียวแบบ collection group ครอบคลุม commands ของทุก guild
+# ต้องเปิด single-field index ของ 'status' แบบ collection group scope ใน Firestore
+WEB_COMMAND_MODE = os.getenv("WEB_COMMAND_MODE", "snapshot")
+WEB_COMMAND_BATCH = int(os.getenv("WEB_COMMAND_BATCH", "100"))
+
+def command_guild_id(doc) -> str:
+    """guilds/{guild_id}/commands/{command_id} -> guild_id"""
+    return doc.reference.parent.parent.id
+
+def pending_commands_query():
+    return db.collection_group('commands').where('status', '==', 'pending')
+
+def enqueue_web_command(doc):
+    """ส่งคำสั่งเข้าคิวของ guild: ทำงานพร้อมกันข้าม guild แต่ตามลำดับภายใน guild"""
+    if status_writer.is_pending(doc.reference.path):
+        return  # ทำเสร็จแล้ว รอ batch เขียนสถานะ
+    command_dispatcher.submit(command_guild_id(doc), doc)
+
+async def on_command_snapshot(key, doc):
+    enqueue_web_command(doc)
+
+command_dispatcher = GuildDispatcher(
+    run_web_command,
+    max_concurrency=int(os.getenv("WEB_COMMAND_CONCURRENCY", "8")),
+    key=lambda doc: doc.reference.path if doc.reference is not None else doc.id,
+)
+command_listener = SnapshotListener(on_command_snapshot)
+status_writer = StatusWriter(
+    db,
+    max_batch=int(os.getenv("STATUS_BATCH_SIZE", "100")),
+    flush_interval=float(os.getenv("STATUS_FLUSH_INTERVAL", "0.5")),
+)
+
+# ช่องทางรับคำสั่งตรงจาก webapp บนเครื่องเดียวกัน (ไม่ผ่าน Firestore)
+COMMAND_BUS = os.getenv("COMMAND_BUS", "auto").lower()
+local_command_server = LocalCommandServer(
+    lambda guild_id, command: command_dispatcher.submit(guild_id, command),
+    os.getenv("COMMAND_BUS_ADDRESS", DEFAULT_ADDRESS),
+    state_hub=player_state,
+)
+
+async def start_local_command_server():
+    if COMMAND_BUS not in ('auto', 'local') or local_command_server.running:
+        return
+    try:
+        await local_command_server.start()
+    except Exception as e:
+        logger.error(f"Failed to start local command channel, dashboard will use Firestore: {e}")
+
+# Prometheus metrics (/metrics) ของ process บอท
+metrics_server = MetricsServer()
+registry.stats('bot_track_gap', 'Silence between queued tracks', gap_meter.stats)
+registry.stats('bot_audio_cache', 'On-disk audio cache', audio_cache.stats)
+registry.stats('bot_loudness', 'Loudness analysis cache', loudness_store.stats)
+registry.stats('bot_track_cache', 'Resolved track cache', track_cache.stats)
+registry.stats('bot_title_index', 'Autocomplete title index', title_index.stats)
+registry.stats('bot_track_catalog', 'Persistent track catalog writes', track_catalog.stats)
+registry.stats('bot_status_writer', 'Batched Firestore status writes', status_writer.stats)
+
+async def start_metrics_server():
+    try:
+        await metrics_server.start()
+    except Exception as e:
+        logger.error(f"Failed to start metrics endpoint: {e}")
+
+# --- ห้องเสียง: นับคนแบบ incremental และรอก่อนออกเมื่อห้องว่าง ---
+voice_presence = VoicePresence()
+idle_paused = set()  # guild ที่บอท pause เพลงไว้ระหว่างรอคนกลับมา
+
+def requester_channel(guild, requester_id=None):
+    """ห้องเสียงที่ผู้สั่งอยู่ ถ้าไม่ได้อยู่ในห้องใช้ห้องที่มีคนมากที่สุด"""
+    channel_id = voice_presence.channel_of(guild.id, int(requester_id)) if requester_id else None
+    if channel_id is None:
+        channel_id = voice_presence.busiest(guild.id)
+    return guild.get_channel(channel_id) if channel_id else None
+
+async def disconnect_idle(guild_id: int):
+    """ห้องว่างครบ grace period แล้ว: ล้างคิวและออกจากห้อง"""
+    idle_paused.discard(guild_id)
+    guild = bot.get_guild(guild_id)
+    voice_client = guild.voice_client if guild else None
+    if not voice_client or not voice_client.channel or voice_presence.humans(guild_id, voice_client.channel.id):
+        return
+    logger.info(f"No users returned to voice channel, disconnecting from {guild.name}")
+
+    # ล้างข้อมูลเพลง
+    music_player.clear(guild_id)
+
+    await voice_client.disconnect()
+    player_state.notify(guild_id)
+
+idle_disconnect = IdleDisconnect(disconnect_idle, VOICE_IDLE_GRACE_SECONDS)
+
+def check_voice_idle(guild):
+    """เริ่ม/ยกเลิกการนับเวลาออกจากห้องตามจำนวนคนในห้องของบอท (O(1) ต่อ event)"""
+    voice_client = guild.voice_client
+    if not voice_client or not voice_client.channel:
+        idle_disconnect.cancel(guild.id)
+        idle_paused.discard(guild.id)
+        return
+    if voice_presence.humans(guild.id, voice_client.channel.id) == 0:
+        if idle_disconnect.schedule(guild.id):
+            logger.info(f"No users left in voice channel in {guild.name}, leaving in {idle_disconnect.grace:g}s")
+            if voice_client.is_playing():
+                # ไม่เล่นให้ห้องว่างฟัง คนที่กลับมาจะฟังต่อจากจุดเดิม
+                voice_client.pause()
+                music_player.clock(guild.id).pause()
+                idle_paused.add(guild.id)
+                player_state.notify(guild.id)
+    elif idle_disconnect.cancel(guild.id):
+        logger.info(f"User returned to voice channel in {guild.name}, keeping the connection")
+        if guild.id in idle_paused:
+            idle_paused.discard(guild.id)
+            if voice_client.is_paused():
+                voice_client.resume()
+                music_player.clock(guild.id).resume()
+                player_state.notify(guild.id)
+
+# รายชื่อ guild ของบอท สำหรับ web dashboard (แทนการเรียก Discord API ด้วย bot token)
+guild_index = GuildIndex()
+
+def start_web_command_listener():
+    if not db:
+        return
+    if WEB_COMMAND_MODE == 'snapshot':
+        command_listener.watch('commands', pending_commands_query())
+        command_listener.start(bot.loop)
+        logger.info("Started Firestore snapshot listener for all guild commands")
+    elif not listen_for_web_commands.is_running():
+        listen_for_web_commands.start()
+        logger.info("Started Firebase command listener with rate limiting")
+
 @tasks.loop(seconds=5)  # Increased to 5 seconds to reduce Firebase quota usage
 async def listen_for_web_commands():
     """Enhanced Firebase listener with better error handling and resource management"""
@@ -422,60 +444,21 @@ async def listen_for_web_commands():
             return  # Skip this iteration due to rate limiting
         
     try:
-        # Process only active guilds to reduce load
-        active_guilds = [guild for guild in bot.guilds if guild.member_count > 1][:3]  # Limit to 3 guilds max
+        # Run Firebase query in executor to prevent blocking
+        loop = asyncio.get_event_loop()
+        pending_commands = await loop.run_in_executor(
+            None, 
+            lambda: pending_commands_query().limit(WEB_COMMAND_BATCH).get()
+        )
+        FIRESTORE_OPS.inc(op='query', status='ok')
         
-        for guild in active_guilds:
-            try:
-                guild_id = str(guild.id)
-                commands_ref = db.collection('guilds').document(guild_id).collection('commands')
-                
-                # Run Firebase query in executor to prevent blocking
-                loop = asyncio.get_event_loop()
-                pending_commands = await loop.run_in_executor(
-                    None, 
-                    lambda: commands_ref.where('status', '==', 'pending').limit(5).get()
-                )
-                
-                for doc in pending_commands:
-                    try:
-                        command_data = doc.to_dict()
-                        
-                        # Add timeout protection for command processing
-                        await asyncio.wait_for(
-                            process_web_command(guild_id, command_data),
-                            timeout=30.0
-                        )
-                        
-                        # Mark as completed with timestamp (run in executor)
-                        await loop.run_in_executor(
-                            None,
-                            lambda: doc.reference.update({
-                                'status': 'completed',
-                                'completed_at': firestore.SERVER_TIMESTAMP
-                            })
-                        )
-                        logger.info(f"[SUCCESS] Processed web command {command_data.get('action')} for guild {guild_id}")
-                        
-                    except asyncio.TimeoutError:
-                        logger.warning(f"[TIMEOUT] Web command timed out for guild {guild_id}")
-                        await loop.run_in_executor(
-                            None,
-                            lambda: doc.reference.update({'status': 'timeout'})
-                        )
-                    except Exception as cmd_error:
-                        logger.error(f"[ERROR] Error processing command: {cmd_error}")
-                        await loop.run_in_executor(
-                            None,
-                            lambda error=str(cmd_error): doc.reference.update({'status': 'error', 'error': error})
-                        )
-                        
-            except Exception as guild_error:
-                logger.error(f"Error processing guild {guild.id}: {guild_error}")
-                continue
+        # คำสั่งที่ยังทำงานอยู่จากรอบก่อนจะไม่ถูกส่งซ้ำ (dispatcher กันไว้)
+        for doc in sorted(pending_commands, key=command_created_at):
+            enqueue_web_command(doc)
                 
     except Exception as e:
         error_msg = str(e)
+        FIRESTORE_OPS.inc(op='query', status='error')
         logger.error(f"Error in Firebase listener: {e}")
         
         # Handle rate limiting specifically
@@ -514,36 +497,40 @@ async def on_ready():
         else:
             logger.info("All critical commands synchronized successfully")
         
-        # เริ่ม Firebase listener ถ้ามี (with rate limiting)
-        if db:
-            listen_for_web_commands.start()
-            logger.info("Started Firebase command listener with rate limiting")
+        # เขียนรายชื่อ guild ให้ web dashboard อ่าน
+        guild_index.publish(guild.id for guild in bot.guilds)
+        for guild in bot.guilds:
+            voice_presence.rebuild(guild)
+        
+        # เริ่ม Firebase listener ถ้ามี (snapshot หรือ polling ตาม WEB_COMMAND_MODE)
+        start_web_command_listener()
+        await start_local_command_server()
+        await start_metrics_server()
         
     except Exception as e:
         logger.error(f'Failed to sync commands: {e}')
         print(f'[ERROR] Failed to sync commands: {e}')
 
+@bot.event
+async def on_guild_join(guild):
+    logger.info(f"Joined guild {guild.name} ({guild.id})")
+    guild_index.add(guild.id)
+    voice_presence.rebuild(guild)
+
+@bot.event
+async def on_guild_remove(guild):
+    logger.info(f"Removed from guild {guild.name} ({guild.id})")
+    guild_index.remove(guild.id)
+    voice_presence.remove_guild(guild.id)
+    idle_disconnect.cancel(guild.id)
+
 @bot.event
 async def on_voice_state_update(member, before, after):
     """จัดการเมื่อมีการเปลี่ยนแปลงใน voice channel"""
     try:
-        voice_client = member.guild.voice_client
-        
-        # ถ้าบอทอยู่ในห้องเสียงและไม่มีคนอื่นเลย ให้ออกจากห้อง
-        if (voice_client and 
-            voice_client.channel and 
-            len([m for m in voice_client.channel.members if not m.bot]) == 0):
-            
-            logger.info(f"No users left in voice channel, disconnecting from {member.guild.name}")
-            
-            # ล้างข้อมูลเพลง
-            guild_id = member.guild.id
-            if guild_id in queues:
-                queues[guild_id].clear()
-            current_tracks[guild_id] = None
-            
-            await voice_client.disconnect()
-            
+        voice_presence.update(member, before, after)
+        # ห้องของบอทว่าง: รอ grace period ก่อนออก (รวมถึงตอนบอทเองย้าย/เข้าห้องว่าง)
+        check_voice_idle(member.guild)
     except Exception as e:
         logger.error(f"Error in on_voice_state_update: {e}")
 
@@ -558,8 +545,27 @@ async def on_error(event, *args, **kwargs):
     logger.error(f"Discord event error in {event}: {args}")
 
 # --- Main Execution ---
+async def warm_start():
+    """โหลดเพลงจาก track catalog เข้า autocomplete และ track cache (ทำไปพร้อมกับการ login)"""
+    try:
+        items = await asyncio.to_thread(track_catalog.load)
+    except Exception as e:
+        logger.error(f"Failed to load track catalog: {e}")
+        return
+    playable = 0
+    for i, item in enumerate(items):
+        if i % 500 == 499:
+            await asyncio.sleep(0)  # ไม่บล็อก event loop ระหว่างสร้าง index
+        title_index.add_info(item)
+        if item.get('url'):
+            # stream URL ที่ยังไม่หมดอายุ: เล่นได้ทันทีโดยไม่ต้องเรียก yt-dlp
+            track_cache.put(watch_url(item['id']), item)
+            playable += 1
+    logger.info(f"Warm start: {len(items)} tracks from catalog ({playable} with a valid stream URL)")
+
 async def main():
     """Main async function"""
+    warm_start_task = asyncio.ensure_future(warm_start())
     try:
         async with bot:
             await bot.start(DISCORD_TOKEN)
@@ -568,6 +574,17 @@ async def main():
     except Exception as e:
         logger.error(f"Bot crashed: {e}")
         raise
+    finally:
+        await local_command_server.stop()
+        await metrics_server.stop()
+        await command_listener.stop()
+        await command_dispatcher.stop()
+        if db:
+            await status_writer.close()
+        warm_start_task.cancel()
+        music_player.close()
+        await track_catalog.close()
+        await extraction_pool.shutdown()
 
 if __name__ == "__main__":
     try:
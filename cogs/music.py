@@ -9,137 +9,34 @@ from gtts import gTTS
 import tempfile
 import os
 import logging
+from typing import Dict, List, Tuple
 
-logger = logging.getLogger(__name__)
-
-# --- การตั้งค่า YTDL และ FFMPEG ---
-YTDL_OPTIONS = {
-    'format': 'bestaudio[ext=webm]/bestaudio[ext=m4a]/bestaudio/best',
-    'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
-    'restrictfilenames': True,
-    'noplaylist': True,
-    'nocheckcertificate': True,
-    'ignoreerrors': False,
-    'logtostderr': False,
-    'quiet': True,
-    'no_warnings': True,
-    'default_search': 'ytsearch',
-    'extract_flat': False,
-    'retries': 5,
-    'fragment_retries': 5,
-    'retry_sleep_functions': {'http': lambda n: min(4, 0.5 * (2 ** n))},
-    'extractor_args': {
-        'youtube': {
-            'player_client': ['ios', 'android', 'mweb', 'web', 'tv_embedded'],
-            'skip': ['dash', 'hls'],
-            'max_comments': [0],
-            'innertube_host': ['youtubei.googleapis.com'],
-        }
-    },
-    'age_limit': None,
-    'geo_bypass': True,
-    'http_headers': {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        'Accept-Language': 'en-us,en;q=0.5',
-        'Sec-Fetch-Mode': 'navigate',
-    }
-}
-FFMPEG_OPTIONS = {
-    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
-    'options': '-vn'
-}
-
-ytdl = yt_dlp.YoutubeDL(YTDL_OPTIONS)
-
-class YTDLSource(discord.PCMVolumeTransformer):
-    def __init__(self, source, *, data, volume=0.5):
-        super().__init__(source, volume)
-        self.data = data
-        self.title = data.get('title', 'Unknown Title')
-        self.url = data.get('webpage_url', '')
-        self.duration = data.get('duration', 0)
-
-    @classmethod
-    async def from_url(cls, url, *, loop=None, stream=True):
-        try:
-            loop = loop or asyncio.get_event_loop()
-            data = await loop.run_in_executor(
-                None, 
-                lambda: ytdl.extract_info(url, download=not stream)
-            )
+from services.metrics import PlayTimer
+from services.mixer import music_playing, stop_music
+from services.music_player import music_player
+from services.playback import QueueEntry
+from services.playlist import is_playlist_url
+from services.title_index import title_index
+from services.track_queue import TrackQueue
 
-            if not data:
-                raise ValueError("Could not extract video information")
-
-            if 'entries' in data:
-                if not data['entries']:
-                    raise ValueError("Playlist is empty")
-                data = data['entries'][0]
+logger = logging.getLogger(__name__)
 
-            if not data.get('url'):
-                raise ValueError("No audio URL found")
-
-            filename = data['url'] if stream else ytdl.prepare_filename(data)
-            source = discord.FFmpegPCMAudio(filename, **FFMPEG_OPTIONS)
-            
-            return cls(source, data=data)
-            
-        except Exception as e:
-            error_msg = str(e)
-            if "Failed to extract any player response" in error_msg:
-                raise ValueError("วิดีโอนี้ไม่สามารถเล่นได้ อาจจะถูกลบ ถูกตั้งเป็นส่วนตัว หรือถูกบล็อกในภูมิภาคนี้")
-            elif "Video unavailable" in error_msg:
-                raise ValueError("วิดีโอไม่พร้อมใช้งาน")
-            elif "Private video" in error_msg:
-                raise ValueError("วิดีโอนี้เป็นวิดีโอส่วนตัว")
-            elif "age-restricted" in error_msg.lower():
-                raise ValueError("วิดีโอนี้มีการจำกัดอายุ")
-            else:
-                raise ValueError(f"ไม่สามารถเล่นวิดีโอได้: {error_msg}")
+LIST_PAGE_SIZE = 10
 
 class Music(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
-        self.queues = {}
-        self.current_tracks = {}
-
-    def play_next(self, guild_id: int, text_channel):
-        try:
-            guild = self.bot.get_guild(guild_id)
-            if not guild or not guild.voice_client:
-                return
-            
-            if self.queues.get(guild_id):
-                player = self.queues[guild_id].pop(0)
-                self.current_tracks[guild_id] = player
-                
-                def after_playing(error):
-                    if error:
-                        logger.error(f"Player error: {error}")
-                    self.play_next(guild_id, text_channel)
-                
-                guild.voice_client.play(player, after=after_playing)
-                
-                embed = discord.Embed(
-                    title="🎵 กำลังเล่นเพลง", 
-                    description=player.title, 
-                    color=discord.Color.blue()
-                )
-                asyncio.run_coroutine_threadsafe(
-                    text_channel.send(embed=embed), 
-                    self.bot.loop
-                )
-            else:
-                self.current_tracks[guild_id] = None
-        except Exception as e:
-            logger.error(f"Error in play_next: {e}")
-            self.current_tracks[guild_id] = None
+        # player ชุดเดียวกับคำสั่งจาก web dashboard (bot.py)
+        self.player = music_player
+        self.player.bind(bot)
+        self._list_pages: Dict[int, Tuple[tuple, Dict[int, Tuple[tuple, discord.Embed]]]] = {}
 
     @app_commands.command(name="play", description="เล่นเพลงจาก YouTube")
     @app_commands.describe(query="ชื่อเพลงหรือลิงก์ YouTube")
     async def play(self, interaction: discord.Interaction, query: str):
+        timer = PlayTimer('slash')
         await interaction.response.defer()
+        timer.phase('defer')
         try:
             if not interaction.user.voice:
                 await interaction.followup.send("คุณต้องอยู่ในห้องเสียงก่อน", ephemeral=True)
@@ -150,41 +47,46 @@ class Music(commands.Cog):
             
             if not voice_client:
                 voice_client = await user_channel.connect()
+                timer.phase('connect')
             elif voice_client.channel != user_channel:
                 await voice_client.move_to(user_channel)
-
-            player = await YTDLSource.from_url(query, loop=self.bot.loop, stream=True)
+                timer.phase('connect')
 
             guild_id = interaction.guild.id
-            
-            if voice_client.is_playing() or self.current_tracks.get(guild_id):
-                if guild_id not in self.queues:
-                    self.queues[guild_id] = []
-                self.queues[guild_id].append(player)
-                
-                embed = discord.Embed(title="📝 เพิ่มเข้าคิว", description=f"**{player.title}**", color=discord.Color.green())
+            if is_playlist_url(query):
+                self.player.add_playlist(guild_id, query, interaction.channel,
+                                         requester=interaction.user.display_name, requester_id=interaction.user.id)
+                embed = discord.Embed(title="📃 กำลังโหลดเพลย์ลิสต์", description="เพลงแรกจะเริ่มเล่นทันทีที่พร้อม", color=discord.Color.green())
+                await interaction.followup.send(embed=embed)
+                return
+
+            # ตอบกลับทันทีที่รับคำขอ การ extract ทำใน background
+            entry = QueueEntry(
+                query=query,
+                requester=interaction.user.display_name,
+                requester_id=interaction.user.id,
+                title=title_index.title_for(query),  # เลือกจาก autocomplete: รู้ชื่อเพลงแล้ว
+            )
+            if not self.player.enqueue(guild_id, entry, voice_client, interaction.channel, timer=timer):
+                embed = discord.Embed(title="📝 เพิ่มเข้าคิว", description=f"**{entry.title}**", color=discord.Color.green())
                 await interaction.followup.send(embed=embed)
             else:
-                self.current_tracks[guild_id] = player
-                
-                def after_playing(error):
-                    if error:
-                        logger.error(f"Player error: {error}")
-                    self.play_next(guild_id, interaction.channel)
-                
-                voice_client.play(player, after=after_playing)
-                
-                embed = discord.Embed(title="🎵 กำลังเล่นเพลง", description=f"**{player.title}**", color=discord.Color.blue())
+                embed = discord.Embed(title="⏳ กำลังเตรียมเล่น", description=f"**{entry.title}**", color=discord.Color.blue())
                 await interaction.followup.send(embed=embed)
                 
         except Exception as e:
             await interaction.followup.send(f"เกิดข้อผิดพลาด: {e}", ephemeral=True)
 
+    @play.autocomplete('query')
+    async def play_autocomplete(self, interaction: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+        # ตอบจาก index ในหน่วยความจำเท่านั้น (ไม่เรียก yt-dlp) ให้ทันเวลาของ Discord
+        return [app_commands.Choice(name=name, value=url) for name, url in title_index.suggest(current)]
+
     @app_commands.command(name="skip", description="ข้ามเพลงปัจจุบัน")
     async def skip(self, interaction: discord.Interaction):
         voice_client = interaction.guild.voice_client
-        if voice_client and voice_client.is_playing():
-            voice_client.stop()
+        if voice_client and music_playing(voice_client):
+            stop_music(voice_client)
             await interaction.response.send_message("ข้ามเพลงแล้ว")
         else:
             await interaction.response.send_message("ไม่มีเพลงที่กำลังเล่นอยู่", ephemeral=True)
@@ -193,34 +95,87 @@ class Music(commands.Cog):
     async def stop(self, interaction: discord.Interaction):
         voice_client = interaction.guild.voice_client
         if voice_client:
-            guild_id = interaction.guild.id
-            if self.queues.get(guild_id):
-                self.queues[guild_id].clear()
-            self.current_tracks[guild_id] = None
+            self.player.clear(interaction.guild.id)
             voice_client.stop()
             await interaction.response.send_message("หยุดเล่นเพลงและล้างคิวแล้ว")
 
+    def build_queue_page(self, guild_id: int, page: int) -> discord.Embed:
+        """สร้าง embed ของหน้า /list (cache ไว้จนกว่าคิวหรือเพลงที่แสดงจะเปลี่ยน)"""
+        queue = self.player.queues.get(guild_id) or TrackQueue()
+        now_playing = self.player.current_tracks.get(guild_id)
+        key = (queue.version, id(queue), id(now_playing), now_playing.revision if now_playing else None)
+        cached_key, pages = self._list_pages.get(guild_id, (None, {}))
+        if cached_key != key:
+            pages = {}
+            self._list_pages[guild_id] = (key, pages)
+        start = (page - 1) * LIST_PAGE_SIZE
+        songs = queue.slice(start, start + LIST_PAGE_SIZE)
+        # ชื่อ/ความยาวถูกเติมในที่ตอน resolve โดยลำดับคิวไม่เปลี่ยน จึงเทียบ revision ของเพลงในหน้านี้ด้วย
+        revisions = tuple(song.revision for song in songs)
+        cached_revisions, embed = pages.get(page, (None, None))
+        if cached_revisions == revisions:
+            return embed
+
+        total_pages = max(1, -(-len(queue) // LIST_PAGE_SIZE))
+        embed = discord.Embed(title="คิวเพลง", color=discord.Color.purple())
+        if now_playing:
+            embed.add_field(name="กำลังเล่น", value=now_playing.title, inline=False)
+        if queue:
+            queue_text = "\n".join(f"{start + i + 1}. {song.title}" for i, song in enumerate(songs))
+            embed.add_field(name="เพลงถัดไป", value=queue_text or "-", inline=False)
+        embed.set_footer(text=f"หน้า {page}/{total_pages} • ทั้งหมด {len(queue)} เพลง")
+        pages[page] = (revisions, embed)
+        return embed
+
     @app_commands.command(name="list", description="แสดงคิวเพลงปัจจุบัน")
-    async def list_queue(self, interaction: discord.Interaction):
+    @app_commands.describe(page="หน้าที่ต้องการดู")
+    async def list_queue(self, interaction: discord.Interaction, page: app_commands.Range[int, 1] = 1):
         guild_id = interaction.guild.id
-        queue = self.queues.get(guild_id, [])
-        now_playing = self.current_tracks.get(guild_id)
+        queue = self.player.queues.get(guild_id)
+        now_playing = self.player.current_tracks.get(guild_id)
 
         if not now_playing and not queue:
             await interaction.response.send_message("ไม่มีเพลงในคิวเลย")
             return
-        
-        embed = discord.Embed(title="คิวเพลง", color=discord.Color.purple())
-        if now_playing:
-            embed.add_field(name="กำลังเล่น", value=now_playing.title, inline=False)
-        if queue:
-            queue_text = "\n".join(f"{i+1}. {song.title}" for i, song in enumerate(queue[:10]))
-            if len(queue) > 10:
-                queue_text += f"\n...และอีก {len(queue) - 10} เพลง"
-            embed.add_field(name="เพลงถัดไป", value=queue_text, inline=False)
-        
+
+        total_pages = max(1, -(-len(queue or ()) // LIST_PAGE_SIZE))
+        embed = self.build_queue_page(guild_id, min(page, total_pages))
         await interaction.response.send_message(embed=embed)
 
+    @app_commands.command(name="remove", description="ลบเพลงออกจากคิว")
+    @app_commands.describe(position="ลำดับเพลงในคิว (ดูจาก /list)")
+    async def remove(self, interaction: discord.Interaction, position: app_commands.Range[int, 1]):
+        queue = self.player.queues.get(interaction.guild.id)
+        if not queue or position > len(queue):
+            await interaction.response.send_message("ไม่มีเพลงลำดับนี้ในคิว", ephemeral=True)
+            return
+        entry = queue.pop(position - 1)
+        self.player.notify(interaction.guild.id)
+        await interaction.response.send_message(f"ลบ **{entry.title}** ออกจากคิวแล้ว")
+
+    @app_commands.command(name="move", description="ย้ายตำแหน่งเพลงในคิว")
+    @app_commands.describe(from_position="ลำดับเพลงที่ต้องการย้าย", to_position="ลำดับใหม่")
+    async def move(self, interaction: discord.Interaction,
+                   from_position: app_commands.Range[int, 1], to_position: app_commands.Range[int, 1]):
+        queue = self.player.queues.get(interaction.guild.id)
+        if not queue or from_position > len(queue) or to_position > len(queue):
+            await interaction.response.send_message("ไม่มีเพลงลำดับนี้ในคิว", ephemeral=True)
+            return
+        queue.move(from_position - 1, to_position - 1)
+        self.player.notify(interaction.guild.id)
+        entry = queue[to_position - 1]
+        await interaction.response.send_message(f"ย้าย **{entry.title}** ไปลำดับที่ {to_position} แล้ว")
+
+    @app_commands.command(name="shuffle", description="สุ่มลำดับเพลงในคิว")
+    async def shuffle(self, interaction: discord.Interaction):
+        queue = self.player.queues.get(interaction.guild.id)
+        if not queue or len(queue) < 2:
+            await interaction.response.send_message("มีเพลงในคิวไม่พอให้สุ่ม", ephemeral=True)
+            return
+        queue.shuffle()
+        self.player.notify(interaction.guild.id)
+        await interaction.response.send_message(f"🔀 สุ่มลำดับ {len(queue)} เพลงแล้ว")
+
     @app_commands.command(name="join", description="ให้บอทเข้าห้องเสียง")
     async def join(self, interaction: discord.Interaction):
         if not interaction.user.voice:
@@ -234,6 +189,7 @@ class Music(commands.Cog):
             await voice_client.move_to(user_channel)
         else:
             await user_channel.connect()
+        self.player.notify(interaction.guild.id)
         
         await interaction.response.send_message(f"เข้าห้อง {user_channel.name} แล้ว")
 
@@ -241,6 +197,7 @@ class Music(commands.Cog):
     async def leave(self, interaction: discord.Interaction):
         if interaction.guild.voice_client:
             await interaction.guild.voice_client.disconnect()
+            self.player.notify(interaction.guild.id)
             await interaction.response.send_message("ออกจากห้องเสียงแล้ว")
         else:
             await interaction.response.send_message("ฉันไม่ได้อยู่ในห้องเสียง", ephemeral=True)
@@ -3,63 +3,73 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from gtts import gTTS
-import tempfile
-import os
+import asyncio
 import logging
+import os
+
+from services.mixer import play_speech
+from services.tts_cache import TTSCache
+from services.tts_engines import engine_for_guild
+from services.tts_stream import SpeechStream, split_sentences, synthesize_chunks
 
 logger = logging.getLogger(__name__)
 
+SPEAK_MAX_CHARS = int(os.getenv("SPEAK_MAX_CHARS", "1500"))
+SPEAK_PREVIEW_CHARS = 200
+
 class Utility(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.tts_cache = TTSCache()
+
+    def cog_unload(self):
+        self.tts_cache.close()
 
     @app_commands.command(name="speak", description="แปลงข้อความเป็นเสียงพูด (ภาษาไทย)")
     @app_commands.describe(text="ข้อความที่ต้องการให้พูด")
     async def speak(self, interaction: discord.Interaction, text: str):
         await interaction.response.defer(ephemeral=True)
         try:
-            if len(text) > 200:
-                await interaction.followup.send("ข้อความยาวเกินไป (สูงสุด 200 ตัวอักษร)", ephemeral=True)
+            if len(text) > SPEAK_MAX_CHARS:
+                await interaction.followup.send(f"ข้อความยาวเกินไป (สูงสุด {SPEAK_MAX_CHARS} ตัวอักษร)", ephemeral=True)
+                return
+            sentences = split_sentences(text)
+            if not sentences:
+                await interaction.followup.send("กรุณาพิมพ์ข้อความที่ต้องการให้พูด", ephemeral=True)
                 return
                 
             voice_client = interaction.guild.voice_client
             if not voice_client:
                 await interaction.followup.send("บอทต้องอยู่ในห้องเสียงก่อนถึงจะพูดได้", ephemeral=True)
                 return
-                
-            if voice_client.is_playing():
-                await interaction.followup.send("กำลังเล่นเพลงอยู่ ไม่สามารถพูดได้", ephemeral=True)
-                return
 
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_file:
-                speech_file = temp_file.name
-                
+            # แบ่งเป็นประโยค สร้างเสียงพร้อมกันแบบจำกัดจำนวน แล้วเริ่มเล่นทันทีที่ chunk แรกพร้อม
+            # chunk ที่อยู่ใน cache เล่นได้เลยไม่ต้องใช้ network
+            engine = engine_for_guild(interaction.guild.id)
+            chunks = synthesize_chunks(self.tts_cache, sentences, lang='th', slow=False, engine=engine)
             try:
-                tts = gTTS(text=text, lang='th', slow=False)
-                tts.save(speech_file)
-                
-                source = discord.FFmpegPCMAudio(speech_file)
-                
-                def cleanup_after_speak(error):
-                    if error:
-                        logger.error(f"TTS playback error: {error}")
-                    try:
-                        os.unlink(speech_file)
-                    except:
-                        pass
-                        
-                voice_client.play(source, after=cleanup_after_speak)
-                
-                await interaction.followup.send(f"🗣️ กำลังพูด: '{text}'", ephemeral=False)
-                
+                await asyncio.wrap_future(chunks[0])
             except Exception as e:
                 logger.error(f"TTS error: {e}")
-                try:
-                    os.unlink(speech_file)
-                except:
-                    pass
+                for chunk in chunks:
+                    chunk.cancel()
                 await interaction.followup.send("ไม่สามารถสร้างเสียงพูดได้", ephemeral=True)
+                return
+
+            if not voice_client.is_connected():
+                for chunk in chunks:
+                    chunk.cancel()
+                await interaction.followup.send("บอทต้องอยู่ในห้องเสียงก่อนถึงจะพูดได้", ephemeral=True)
+                return
+
+            def after_speak(error):
+                if error:
+                    logger.error(f"TTS playback error: {error}")
+
+            # พูดทับเพลงได้ mixer จะลดเสียงเพลงระหว่างพูด (ไฟล์อยู่ใน cache ไม่ต้องลบหลังเล่นจบ)
+            play_speech(voice_client, SpeechStream(chunks), after=after_speak)
+            preview = text if len(text) <= SPEAK_PREVIEW_CHARS else text[:SPEAK_PREVIEW_CHARS] + '…'
+            await interaction.followup.send(f"🗣️ กำลังพูด: '{preview}'", ephemeral=False)
         except Exception as e:
             logger.error(f"Unexpected error in speak command: {e}")
             await interaction.followup.send("ไม่สามารถทำงานได้", ephemeral=True)
@@ -0,0 +1,316 @@
+import json
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import discord
+
+from services.audio_source import OpusTrack
+from services.track_cache import CACHED_FIELDS, YOUTUBE_ID_RE
+
+logger = logging.getLogger(__name__)
+
+# --- Local audio cache ---
+# เพลงที่ถูกเล่นบ่อยถูกเก็บไว้บนดิสก์ตาม video id ครั้งต่อไปเล่นจากไฟล์ในเครื่องโดยไม่ต้องโหลดจาก YouTube
+# ครั้งแรกที่เพลงผ่านเกณฑ์ ffmpeg ตัวเดียวกับที่เล่นเพลงจะ copy เสียงต้นฉบับลงไฟล์ไปพร้อมกัน (ไม่โหลดซ้ำ)
+# ขนาดรวมถูกจำกัดด้วย LRU โดยใช้ mtime ของไฟล์เป็นลำดับการใช้งาน เหมือน TTS cache
+
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "audio_cache")
+AUDIO_CACHE_BYTES = int(float(os.getenv("AUDIO_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+# เล่นครบกี่ครั้งถึงจะเก็บลง cache (ครั้งที่ถึงเกณฑ์จะ tee ครั้งถัดไปเล่นจากไฟล์)
+AUDIO_CACHE_ADMIT_PLAYS = int(os.getenv("AUDIO_CACHE_ADMIT_PLAYS", "2"))
+AUDIO_CACHE_MAX_TRACK_SECONDS = int(os.getenv("AUDIO_CACHE_MAX_TRACK_SECONDS", "1200"))
+
+AUDIO_SUFFIX = '.mka'  # Matroska เก็บ codec เดิม (opus/aac) ได้โดยไม่ต้องแปลง
+INFO_SUFFIX = '.json'
+TMP_SUFFIX = '.tmp'
+TEE_FINISH_TIMEOUT = 5  # วินาทีที่รอ ffmpeg เขียนท้ายไฟล์หลังเพลงจบ
+MAX_TRACKED_PLAYS = 50000
+
+
+class AudioCache:
+    """
+    Size-bounded LRU disk cache of track audio, keyed by YouTube video id
+
+    A track is admitted on its ``admit_after``-th play. That play is a tee:
+    ffmpeg writes the original audio stream to a temp file while it plays.
+    The file is kept only if the track played to the end, and it is renamed
+    into place next to a JSON file holding the track's metadata. Later plays
+    read the local file, and ``info`` can stand in for yt-dlp entirely.
+
+    ``open`` and ``info`` are called from the event loop. ``finish`` is
+    called from the voice thread when a tee source is cleaned up, so the
+    index is guarded by a lock.
+    """
+
+    def __init__(self, directory: str = AUDIO_CACHE_DIR, max_bytes: int = AUDIO_CACHE_BYTES, *,
+                 admit_after: int = AUDIO_CACHE_ADMIT_PLAYS, max_track_seconds: int = AUDIO_CACHE_MAX_TRACK_SECONDS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.admit_after = admit_after
+        self.max_track_seconds = max_track_seconds
+        self._lock = threading.Lock()
+        self._entries: Optional["OrderedDict[str, int]"] = None  # video id -> ขนาดไฟล์เสียง (เก่าสุดอยู่หน้า)
+        self._bytes = 0
+        self._plays: "OrderedDict[str, int]" = OrderedDict()
+        self._filling = set()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0  # ขนาดไฟล์ที่เล่นจาก cache แทนการโหลด
+        self.bytes_written = 0
+        self.admissions = 0
+        self.aborted = 0
+        self.evictions = 0
+
+    @property
+    def entries(self) -> "OrderedDict[str, int]":
+        # สแกน directory ครั้งแรกที่ใช้ ไม่ใช่ตอน import
+        if self._entries is None:
+            self._entries = OrderedDict()
+            self._load()
+        return self._entries
+
+    def _load(self):
+        """สร้าง index จากไฟล์ที่มีอยู่ เรียงตาม mtime (ใช้ล่าสุดอยู่ท้าย)"""
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(TMP_SUFFIX):
+                    # ไฟล์ค้างจาก tee ที่ไม่เสร็จ
+                    self._unlink(entry.path)
+                elif entry.name.endswith(AUDIO_SUFFIX):
+                    video_id = entry.name[:-len(AUDIO_SUFFIX)]
+                    if os.path.exists(self._info_path(video_id)):
+                        st = entry.stat()
+                        found.append((st.st_mtime_ns, video_id, st.st_size))
+                    else:
+                        self._unlink(entry.path)
+        for _, video_id, size in sorted(found):
+            self._entries[video_id] = size
+            self._bytes += size
+        self._evict()
+        if self._entries:
+            logger.info(f"Audio cache: {len(self._entries)} tracks, {self._bytes / 1024 / 1024:.1f} MB")
+
+    def path(self, video_id: str) -> str:
+        return os.path.join(self.directory, video_id + AUDIO_SUFFIX)
+
+    def _info_path(self, video_id: str) -> str:
+        return os.path.join(self.directory, video_id + INFO_SUFFIX)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _touch(self, video_id: Optional[str]) -> Optional[str]:
+        """Path ของไฟล์เสียงใน cache และเลื่อนไปท้าย LRU (ต้องถือ lock)"""
+        if not video_id or video_id not in self.entries:
+            return None
+        path = self.path(video_id)
+        try:
+            os.utime(path)  # บันทึกลำดับ LRU ลงดิสก์ด้วย
+        except OSError:
+            # ไฟล์ถูกลบจากภายนอก
+            self._bytes -= self.entries.pop(video_id)
+            return None
+        self.entries.move_to_end(video_id)
+        return path
+
+    def info(self, video_id: Optional[str]) -> Optional[Dict]:
+        """
+        ข้อมูลเพลงที่เก็บไว้ตอน tee โดย ``url`` ชี้ไปที่ไฟล์ในเครื่อง หรือ None ถ้าไม่มีใน cache
+
+        Lets a replay skip yt-dlp as well as the audio download.
+        """
+        with self._lock:
+            path = self._touch(video_id)
+        if path is None:
+            return None
+        try:
+            with open(self._info_path(video_id), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read cached info for {video_id}: {e}")
+            return None
+        data['url'] = path
+        return data
+
+    def _admit(self, data: Dict) -> bool:
+        """นับการเล่นและตัดสินว่าเล่นครั้งนี้ควร tee ลง cache หรือไม่ (ต้องถือ lock)"""
+        video_id = data.get('id')
+        if not video_id or not YOUTUBE_ID_RE.match(video_id) or data.get('is_live') or not data.get('duration') \
+                or data['duration'] > self.max_track_seconds:
+            return False
+        plays = self._plays.pop(video_id, 0) + 1
+        self._plays[video_id] = plays
+        while len(self._plays) > MAX_TRACKED_PLAYS:
+            self._plays.popitem(last=False)
+        return plays >= self.admit_after and video_id not in self._filling
+
+    def open(self, track: Dict, factory=discord.FFmpegPCMAudio, *, before_options: Optional[str] = None,
+             **kwargs) -> discord.AudioSource:
+        """
+        สร้าง ffmpeg source ของเพลง: จากไฟล์ใน cache, แบบ tee ลง cache หรือ stream ตามปกติ
+
+        ``track`` is the resolved info dict. ``factory`` is discord.FFmpegPCMAudio
+        or OpusTrack, and ``kwargs`` go to it. ``before_options``
+        (the HTTP reconnect flags) are dropped when playing a local file.
+        """
+        video_id = track.get('id')
+        with self._lock:
+            path = self._touch(video_id)
+            if path is not None:
+                self.hits += 1
+                self.bytes_saved += self.entries[video_id]
+            else:
+                self.misses += 1
+                tee = self._admit(track)
+                if tee:
+                    self._filling.add(video_id)
+        if path is not None:
+            logger.info(f"Playing {video_id} from the audio cache")
+            return factory(path, **kwargs)
+        if not tee:
+            if not track['url'].startswith(('http://', 'https://')):
+                before_options = None  # ไฟล์ในเครื่อง (เช่นถูก evict หลัง info())
+            return factory(track['url'], before_options=before_options, **kwargs)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{video_id}.", suffix=TMP_SUFFIX)
+        os.close(fd)
+        try:
+            return TEE_CLASSES[factory](track['url'], cache=self, video_id=video_id, tmp_path=tmp_path,
+                                        info=track, before_options=before_options, **kwargs)
+        except BaseException:
+            self.finish(video_id, tmp_path, None)
+            raise
+
+    def finish(self, video_id: str, tmp_path: str, info: Optional[Dict]):
+        """จบการ tee: เก็บไฟล์เข้า cache ถ้าเล่นจนจบ (``info`` ไม่เป็น None) ไม่เช่นนั้นลบทิ้ง"""
+        size = 0
+        if info is not None:
+            try:
+                size = os.path.getsize(tmp_path)
+                if size:
+                    self._write_info(video_id, info)
+                    os.replace(tmp_path, self.path(video_id))
+            except OSError as e:
+                logger.warning(f"Could not store {video_id} in the audio cache: {e}")
+                size = 0
+        with self._lock:
+            self._filling.discard(video_id)
+            if not size:
+                self.aborted += 1
+                self._unlink(tmp_path)
+                return
+            self._bytes -= self.entries.pop(video_id, 0)
+            self.entries[video_id] = size
+            self._bytes += size
+            self.bytes_written += size
+            self.admissions += 1
+            self._evict()
+        logger.info(f"Cached {video_id} ({size / 1024 / 1024:.1f} MB)")
+
+    def _write_info(self, video_id: str, info: Dict):
+        fields = {k: info[k] for k in CACHED_FIELDS if k in info and k not in ('url', 'http_headers')}
+        tmp = self._info_path(video_id) + TMP_SUFFIX
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(fields, f, ensure_ascii=False)
+        os.replace(tmp, self._info_path(video_id))
+
+    def _evict(self):
+        # ไม่ลบไฟล์ล่าสุด แม้จะใหญ่กว่า max_bytes เอง เพราะเพิ่งถูกเล่น
+        while self._bytes > self.max_bytes and len(self.entries) > 1:
+            video_id, size = self.entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            # POSIX: ไฟล์ที่กำลังเล่นอยู่ยังอ่านต่อได้จนจบ
+            self._unlink(self.path(video_id))
+            self._unlink(self._info_path(video_id))
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'bytes_saved': self.bytes_saved,
+            'bytes_written': self.bytes_written,
+            'admissions': self.admissions,
+            'aborted': self.aborted,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self._bytes,
+        }
+
+
+class _CacheTee(discord.FFmpegAudio):
+    """
+    Mixin ที่ให้ ffmpeg ของ source เขียนเสียงต้นฉบับ (codec copy) ลงไฟล์ cache ไปพร้อมกับที่เล่น
+
+    Must come first in the bases so it wraps the concrete source's ``read``.
+    The extra output is spliced into the arguments the concrete class built,
+    right after the input, so the source is downloaded only once.
+    """
+
+    def __init__(self, source: str, *, cache: AudioCache, video_id: str, tmp_path: str, info: Dict, **kwargs):
+        self._tee = (cache, video_id, tmp_path, info)
+        self._tee_eof = False
+        super().__init__(source, **kwargs)
+
+    def _spawn_process(self, args, **subprocess_kwargs) -> subprocess.Popen:
+        tmp_path = self._tee[2]
+        i = args.index('-i') + 2
+        # -y: mkstemp สร้างไฟล์ว่างไว้แล้ว
+        args = [args[0], '-y', *args[1:i],
+                '-map', '0:a:0', '-c:a', 'copy', '-f', 'matroska', tmp_path,
+                '-map', '0:a:0', *args[i:]]
+        return super()._spawn_process(args, **subprocess_kwargs)
+
+    def read(self) -> bytes:
+        data = super().read()
+        if not data:
+            self._tee_eof = True
+        return data
+
+    def cleanup(self):
+        if self._tee is None:  # AudioSource.__del__ เรียก cleanup ซ้ำ
+            return super().cleanup()
+        cache, video_id, tmp_path, info = self._tee
+        self._tee = None
+        complete = False
+        process = getattr(self, '_process', None)
+        if self._tee_eof and process:
+            # เล่นจนจบแล้ว รอ ffmpeg เขียนท้ายไฟล์ Matroska ให้เสร็จ
+            try:
+                complete = process.wait(timeout=TEE_FINISH_TIMEOUT) == 0
+            except subprocess.TimeoutExpired:
+                pass
+        super().cleanup()
+        cache.finish(video_id, tmp_path, info if complete else None)
+
+
+class TeePCMAudio(_CacheTee, discord.FFmpegPCMAudio):
+    pass
+
+
+class TeeOpusTrack(_CacheTee, OpusTrack):
+    pass
+
+
+TEE_CLASSES = {discord.FFmpegPCMAudio: TeePCMAudio, OpusTrack: TeeOpusTrack}
+
+# ร่วมกันทั้ง bot.py และ cogs/music.py
+audio_cache = AudioCache()
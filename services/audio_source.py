@@ -0,0 +1,47 @@
+import logging
+import os
+from typing import Dict, Optional
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# --- Opus passthrough สำหรับเพลง ---
+# เดิมทุกเพลงถูกถอดเป็น PCM ใน ffmpeg ปรับเสียงใน Python แล้วเข้ารหัส Opus ใหม่ด้วย libopus 50 ครั้ง/วินาที
+# ถ้า stream เป็น Opus อยู่แล้ว (webm itag 251 ของ YouTube) และไม่ต้องปรับเสียง ffmpeg จะ copy packet ออกมาเลย
+# การปรับเสียงต้องเข้ารหัสใหม่อยู่ดี (ให้ ffmpeg ทำก็ใช้ CPU พอๆ กัน ดู benchmarks/bench_opus_passthrough.py)
+# จึงใช้ทางเดิม (PCM) เมื่อต้องปรับเสียงหรือเป็น codec อื่น
+# trade-off กับ loudness normalization: เพลงที่ copy Opus ได้จะไม่ถูกปรับ gain (และไม่ถูกวัดความดัง)
+# ใช้ได้เพราะ YouTube normalize เพลงส่วนใหญ่ไว้ใกล้ -14 LUFS อยู่แล้ว ถ้าต้องการ normalize ทุกเพลงให้ตั้ง PLAYBACK_MODE=pcm
+
+# auto = copy Opus เมื่อทำได้, pcm = ทางเดิมเสมอ (FFmpegPCMAudio + PCMVolumeTransformer)
+PLAYBACK_MODE = os.getenv("PLAYBACK_MODE", "auto")
+# ค่าเริ่มต้น 1.0 = ไม่ปรับเสียง ทำให้เพลง Opus ใช้ passthrough ได้
+# ตั้งค่าต่ำกว่านี้ได้ถ้าต้องการ แต่ทุกเพลงจะกลับไปใช้ทาง PCM (ถอด/เข้ารหัสใหม่)
+PLAYBACK_VOLUME = float(os.getenv("PLAYBACK_VOLUME", "1.0"))
+# ต่างจาก 1.0 ไม่เกิน ~0.5 dB ถือว่าไม่ต้องปรับเสียง
+UNITY_TOLERANCE = 0.06
+
+
+def is_opus_stream(data: Dict) -> bool:
+    """Whether the format yt-dlp selected is already Opus"""
+    return str(data.get('acodec') or '').lower().startswith('opus')
+
+
+def can_passthrough(data: Dict, volume: float = PLAYBACK_VOLUME, mode: str = PLAYBACK_MODE) -> bool:
+    """Whether this track is copied as Opus; ``volume`` is the playback volume, not the loudness gain"""
+    # Mixer ต้องถอด packet เป็น PCM ตอนรวมกับ TTS จึงต้องมี libopus ในเครื่อง
+    return mode != 'pcm' and abs(volume - 1.0) <= UNITY_TOLERANCE and is_opus_stream(data) and discord.opus.is_loaded()
+
+
+class OpusTrack(discord.FFmpegOpusAudio):
+    """เพลงที่ ffmpeg copy Opus packet (20 ms) จากต้นทางส่งเข้า voice ได้เลย ไม่ถอด/เข้ารหัสใหม่"""
+
+    def __init__(self, url: str, *, data: Dict, entry=None, before_options: Optional[str] = None,
+                 options: Optional[str] = None, **kwargs):
+        super().__init__(url, codec='copy', before_options=before_options, options=options, **kwargs)
+        self.data = data
+        self.entry = entry
+        self.title = data.get('title', 'Unknown Title')
+        self.url = data.get('webpage_url', '')
+        self.duration = data.get('duration', 0)
@@ -0,0 +1,418 @@
+import asyncio
+import hashlib
+import hmac
+import http.client
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# --- Command bus ระหว่าง webapp กับบอท ---
+# เดิมทุกคำสั่งวิ่ง webapp -> Firestore add -> บอทรับ -> Firestore update
+# เมื่อทั้งสอง process อยู่เครื่องเดียวกัน (start_all.py) ส่งตรงผ่าน Unix socket / HTTP localhost ได้เลย
+# ถ้าบอทไม่ได้เปิดช่องทาง local ไว้ จะถอยกลับไปใช้ Firestore อัตโนมัติ
+
+DEFAULT_ADDRESS = "unix:bot_commands.sock" if hasattr(socket, 'AF_UNIX') else "http://127.0.0.1:8765"
+SECRET_HEADER = "X-Command-Secret"
+COMMANDS_PATH = "/commands"
+
+
+class CommandBusUnavailable(Exception):
+    """The backend cannot take commands right now (the caller should try another one)"""
+
+
+def default_secret() -> str:
+    """Shared secret for the local channel: COMMAND_BUS_SECRET, else derived from the bot token both processes already have"""
+    secret = os.getenv("COMMAND_BUS_SECRET")
+    if secret:
+        return secret
+    token = os.getenv("DISCORD_TOKEN", "")
+    return hashlib.sha256(f"command-bus:{token}".encode()).hexdigest()
+
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    """'unix:/path/to.sock' -> ('unix', path), 'http://host:port' -> ('tcp', (host, port))"""
+    if address.startswith("unix:"):
+        return 'unix', address[len("unix:"):]
+    parsed = urlparse(address if "://" in address else f"http://{address}")
+    return 'tcp', (parsed.hostname or "127.0.0.1", parsed.port or 8765)
+
+
+class LocalCommand:
+    """
+    A command received over the local channel
+
+    It quacks like a Firestore command snapshot (``id``, ``to_dict()``), so
+    the bot's dispatcher can treat both the same way. ``reference`` is None
+    because there is no document to write a status back to.
+    """
+
+    reference = None
+
+    def __init__(self, command_id: str, data: Dict):
+        self.id = command_id
+        self.data = data
+        self.received_at = time.perf_counter()
+
+    def to_dict(self) -> Dict:
+        return self.data
+
+
+# --- Backends (ฝั่ง webapp) ---
+class CommandBus(ABC):
+    """Sends one dashboard command to the bot and returns its command id"""
+
+    name = "base"
+
+    @abstractmethod
+    def send(self, guild_id: str, command: Dict) -> str:
+        ...
+
+    def close(self):
+        pass
+
+
+class FirestoreCommandBus(CommandBus):
+    """
+    The original path: add a pending document under guilds/{guild_id}/commands
+
+    The document id is generated on the client, so with ``background=True``
+    ``send`` returns at once and the write runs on a small thread pool. At
+    most ``max_pending`` writes may be outstanding. Beyond that the bus
+    reports itself unavailable instead of queueing without limit.
+    """
+
+    name = "firestore"
+
+    def __init__(self, db, *, background: bool = False, workers: int = 4, max_pending: int = 256):
+        self.db = db
+        self.background = background
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='firestore-bus') if background else None
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.failed = 0
+
+    def send(self, guild_id: str, command: Dict) -> str:
+        from firebase_admin import firestore
+
+        data = dict(command, timestamp=firestore.SERVER_TIMESTAMP, status='pending')
+        doc_ref = self.db.collection('guilds').document(guild_id).collection('commands').document()
+        if not self.background:
+            doc_ref.set(data)
+            return doc_ref.id
+        if not self._slots.acquire(blocking=False):
+            raise CommandBusUnavailable("Firestore command writes are backed up")
+        try:
+            future = self._executor.submit(doc_ref.set, data)
+        except RuntimeError as e:
+            # executor ถูกปิดแล้ว (close): คืน slot ไม่งั้น max_pending จะลดลงถาวร
+            self._slots.release()
+            raise CommandBusUnavailable(f"Firestore command bus is closed: {e}") from e
+        future.add_done_callback(self._written)
+        return doc_ref.id
+
+    def _written(self, future: Future):
+        self._slots.release()
+        error = future.exception()
+        if error is not None:
+            self.failed += 1
+            logger.error(f"Failed to write web command to Firestore: {error}")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)  # รอเขียนคำสั่งที่ค้างให้เสร็จ
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.unix_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class LocalCommandBus(CommandBus):
+    """
+    HTTP over a Unix socket (or localhost TCP) straight into the bot process
+
+    Each webapp thread keeps its own keep-alive connection. Connection errors
+    raise ``CommandBusUnavailable``.
+    """
+
+    name = "local"
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, *, secret: Optional[str] = None, timeout: float = 2.0):
+        self.address = address
+        self.kind, self.target = parse_address(address)
+        self.secret = secret if secret is not None else default_secret()
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def open_connection(self) -> http.client.HTTPConnection:
+        """New (not yet connected) HTTP connection to the bot"""
+        if self.kind == 'unix':
+            return _UnixHTTPConnection(self.target, self.timeout)
+        return http.client.HTTPConnection(*self.target, timeout=self.timeout)
+
+    def _connection(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.open_connection()
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def send(self, guild_id: str, command: Dict) -> str:
+        body = json.dumps(dict(command, guild_id=str(guild_id)))
+        headers = {"Content-Type": "application/json", SECRET_HEADER: self.secret}
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("POST", COMMANDS_PATH, body=body, headers=headers)
+                response = conn.getresponse()
+                payload = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                self._drop_connection()
+                # connection ที่ค้างไว้อาจถูกฝั่งบอทปิดไปแล้ว ลองเปิดใหม่อีกครั้งเดียว
+                if attempt == 0 and not isinstance(e, (ConnectionRefusedError, FileNotFoundError, socket.timeout)):
+                    continue
+                raise CommandBusUnavailable(f"Local command channel {self.address} unavailable: {e}") from e
+            if response.status >= 500:
+                raise CommandBusUnavailable(f"Local command channel returned {response.status}")
+            if response.status != 202:
+                raise ValueError(f"Local command channel rejected command ({response.status}): {payload[:200]!r}")
+            return json.loads(payload)['command_id']
+        raise CommandBusUnavailable(f"Local command channel {self.address} unavailable")
+
+    def close(self):
+        self._drop_connection()
+
+
+class MemoryCommandBus(CommandBus):
+    """
+    In-process bus for tests and benchmarks
+
+    Every command is recorded in ``sent``. When a ``handler`` is given it is
+    called with a ``LocalCommand``. If ``loop`` is also given, the handler is
+    scheduled on that loop from the calling thread, the same way the bot
+    receives commands.
+    """
+
+    name = "memory"
+
+    def __init__(self, handler: Optional[Callable[[str, LocalCommand], Any]] = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.handler = handler
+        self.loop = loop
+        self.sent: List[Tuple[str, LocalCommand]] = []
+
+    def send(self, guild_id: str, command: Dict) -> str:
+        local = LocalCommand(uuid.uuid4().hex, dict(command))
+        self.sent.append((str(guild_id), local))
+        if self.handler is not None:
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self.handler, str(guild_id), local)
+            else:
+                self.handler(str(guild_id), local)
+        return local.id
+
+
+class FallbackCommandBus(CommandBus):
+    """
+    Tries ``primary`` first and falls back to ``fallback`` when it is unavailable
+
+    After a failure the primary is skipped for ``cooldown`` seconds. While
+    the bot is down, each request therefore costs at most one failed connect
+    per cooldown window.
+    """
+
+    def __init__(self, primary: CommandBus, fallback: CommandBus, *, cooldown: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.primary = primary
+        self.fallback = fallback
+        self.cooldown = cooldown
+        self._clock = clock
+        self._retry_at = 0.0
+        self.fallbacks = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.primary.name}+{self.fallback.name}"
+
+    def send(self, guild_id: str, command: Dict) -> str:
+        if self._clock() >= self._retry_at:
+            try:
+                return self.primary.send(guild_id, command)
+            except CommandBusUnavailable as e:
+                self._retry_at = self._clock() + self.cooldown
+                logger.warning(f"{e}; using {self.fallback.name} for {self.cooldown:.0f}s")
+        self.fallbacks += 1
+        return self.fallback.send(guild_id, command)
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+
+def create_command_bus(db=None, mode: Optional[str] = None, address: Optional[str] = None) -> Optional[CommandBus]:
+    """
+    Build the bus selected by COMMAND_BUS: auto (local with Firestore fallback), local, firestore or memory
+
+    Returns None when the selected backends are not usable, for example
+    firestore without a database.
+    """
+    mode = (mode or os.getenv("COMMAND_BUS", "auto")).lower()
+    address = address or os.getenv("COMMAND_BUS_ADDRESS", DEFAULT_ADDRESS)
+    firestore_bus = FirestoreCommandBus(db, background=True) if db is not None else None
+    if mode == 'memory':
+        return MemoryCommandBus()
+    if mode == 'firestore':
+        return firestore_bus
+    local_bus = LocalCommandBus(address)
+    if mode == 'local' or firestore_bus is None:
+        return local_bus
+    return FallbackCommandBus(local_bus, firestore_bus)
+
+
+# --- Server (ฝั่งบอท) ---
+def bind_unix_socket(path: str) -> socket.socket:
+    """
+    Listening Unix socket at ``path`` that only the current user can connect to
+
+    The socket file is created under a 0o177 umask, so it is 0600 from the
+    moment it exists instead of being world-accessible until a later chmod.
+    """
+    if os.path.exists(path):
+        os.unlink(path)  # socket เก่าจาก process ที่ปิดไม่สะอาด
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        sock.bind(path)
+    except OSError:
+        sock.close()
+        raise
+    finally:
+        os.umask(old_umask)
+    sock.listen(128)
+    return sock
+
+
+class LocalCommandServer:
+    """
+    aiohttp endpoint in the bot process that accepts commands from ``LocalCommandBus``
+
+    ``handler(guild_id, LocalCommand)`` is called on the event loop as soon
+    as the request is parsed. The response (202 with the command id) does not
+    wait for the command to finish, just like the Firestore path.
+    """
+
+    def __init__(self, handler: Callable[[str, LocalCommand], Any], address: str = DEFAULT_ADDRESS,
+                 *, secret: Optional[str] = None, state_hub=None):
+        self.handler = handler
+        self.state_hub = state_hub
+        self.address = address
+        self.kind, self.target = parse_address(address)
+        self.secret = secret if secret is not None else default_secret()
+        self._runner = None
+        self.received = 0
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    async def start(self):
+        from aiohttp import web
+
+        if self._runner is not None:
+            return
+        app = web.Application()
+        app.router.add_post(COMMANDS_PATH, self._handle)
+        app.router.add_get("/health", self._health)
+        if self.state_hub is not None:
+            app.router.add_get("/state", self._state)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            if self.kind == 'unix':
+                site = web.SockSite(runner, bind_unix_socket(self.target))
+                await site.start()
+            else:
+                site = web.TCPSite(runner, *self.target)
+                await site.start()
+        except Exception:
+            await runner.cleanup()
+            raise
+        self._runner = runner
+        logger.info(f"Local command channel listening on {self.address}")
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        if self.state_hub is not None:
+            self.state_hub.close()  # ปิด stream ที่ค้างอยู่ ไม่งั้น cleanup จะรอจน timeout
+        await self._runner.cleanup()
+        self._runner = None
+        if self.kind == 'unix' and os.path.exists(self.target):
+            try:
+                os.unlink(self.target)
+            except OSError:
+                pass
+
+    def _authorized(self, request) -> bool:
+        # เทียบแบบเวลาคงที่ ไม่ให้เดา secret จากเวลาตอบกลับได้
+        secret = request.headers.get(SECRET_HEADER)
+        return secret is not None and hmac.compare_digest(secret.encode(), self.secret.encode())
+
+    async def _health(self, request):
+        from aiohttp import web
+        return web.json_response({'status': 'ok'})
+
+    async def _state(self, request):
+        from aiohttp import web
+        from services.player_state import stream_state
+
+        if not self._authorized(request):
+            return web.json_response({'error': 'forbidden'}, status=403)
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        await stream_state(self.state_hub, response)
+        return response
+
+    async def _handle(self, request):
+        from aiohttp import web
+
+        if not self._authorized(request):
+            return web.json_response({'error': 'forbidden'}, status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.json_response({'error': 'invalid json'}, status=400)
+        guild_id = str(data.pop('guild_id', '') or '')
+        if not guild_id or not data.get('action'):
+            return web.json_response({'error': 'guild_id and action are required'}, status=400)
+        command = LocalCommand(uuid.uuid4().hex, data)
+        self.received += 1
+        result = self.handler(guild_id, command)
+        if asyncio.iscoroutine(result):
+            await result
+        return web.json_response({'command_id': command.id}, status=202)
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# --- Per-guild command dispatcher ---
+# คำสั่งของ guild เดียวกันทำงานตามลำดับเสมอ (play ก่อน skip)
+# แต่ guild ต่างกันทำงานพร้อมกันได้ โดยจำกัดจำนวนงานพร้อมกันทั้งหมดด้วย semaphore
+
+Handler = Callable[[str, Any], Awaitable[None]]
+
+
+class GuildDispatcher:
+    """
+    Runs ``handler(guild_id, item)`` concurrently across guilds and strictly in order within one guild
+
+    A guild only has a worker task while it has pending items, so hundreds of
+    idle guilds cost nothing. Items are de-duplicated by ``key(item)`` until
+    their handler finishes. A poll that sees the same pending document again
+    therefore does not run it twice.
+    """
+
+    def __init__(self, handler: Handler, *, max_concurrency: int = 8,
+                 key: Callable[[Any], Hashable] = id):
+        self.handler = handler
+        self.max_concurrency = max(1, max_concurrency)
+        self._key = key
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[str, Deque[Any]] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._keys: Set[Hashable] = set()
+        self._idle: Optional[asyncio.Event] = None
+        self.dispatched = 0
+
+    def _ensure_started(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._idle = asyncio.Event()
+            self._idle.set()
+
+    def submit(self, guild_id: str, item) -> bool:
+        """เพิ่มงานเข้าคิวของ guild (เรียกบน event loop) คืนค่า False ถ้างานนี้อยู่ในคิวแล้ว"""
+        self._ensure_started()
+        key = self._key(item)
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        self._pending.setdefault(guild_id, deque()).append(item)
+        self._idle.clear()
+        if guild_id not in self._workers:
+            self._workers[guild_id] = asyncio.ensure_future(self._drain(guild_id))
+        return True
+
+    async def _drain(self, guild_id: str):
+        queue = self._pending[guild_id]
+        try:
+            while queue:
+                item = queue[0]
+                async with self._slots:
+                    try:
+                        await self.handler(guild_id, item)
+                    except Exception as e:
+                        logger.error(f"Error dispatching command for guild {guild_id}: {e}")
+                    finally:
+                        queue.popleft()
+                        self._keys.discard(self._key(item))
+                        self.dispatched += 1
+        finally:
+            if not queue:
+                self._pending.pop(guild_id, None)
+            self._workers.pop(guild_id, None)
+            if not self._workers:
+                self._idle.set()
+
+    @property
+    def active_guilds(self) -> int:
+        return len(self._workers)
+
+    def queued(self, guild_id: Optional[str] = None) -> int:
+        if guild_id is not None:
+            return len(self._pending.get(guild_id, ()))
+        return sum(len(q) for q in self._pending.values())
+
+    async def join(self):
+        """รอจนทุก guild ทำงานในคิวเสร็จ"""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def stop(self):
+        workers = list(self._workers.values())
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._pending.clear()
+        self._keys.clear()
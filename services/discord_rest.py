@@ -0,0 +1,193 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# --- Discord REST client สำหรับ web dashboard ---
+# ใช้ Session เดียว (keep-alive + connection pool) พร้อม TTL cache แยกตาม token
+# และเคารพ rate limit bucket จาก header X-RateLimit-* ของ Discord เพื่อไม่ให้โดน 429
+
+DISCORD_API_ENDPOINT = "https://discord.com/api/v10"
+
+
+class DiscordRateLimited(Exception):
+    """Raised when a route is rate limited and there is no cached value to fall back on"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited by Discord, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def token_key(token: str) -> str:
+    """ไม่เก็บ token ตรงๆ ใน cache key"""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+class DiscordRESTClient:
+    """
+    Thread-safe, pooled and cached client for the few Discord GET routes the dashboard uses
+
+    Responses are cached per (token, route) for ``ttl`` seconds, so fresh data
+    costs no round trip; beyond ``max_entries`` the least recently used
+    entries are evicted. Before each request the client checks the route's
+    rate-limit bucket for that token (Discord limits user routes per OAuth
+    token, so one user's exhausted bucket does not block the others). If the
+    bucket is exhausted it serves the stale cached value, or waits when the
+    reset is at most ``max_wait`` seconds away.
+    """
+
+    def __init__(self, *, api_endpoint: str = DISCORD_API_ENDPOINT, timeout: float = 10.0,
+                 ttl: float = 60.0, pool_size: int = 20, max_wait: float = 2.0, max_entries: int = 2048,
+                 session: Optional[requests.Session] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.api_endpoint = api_endpoint
+        self.timeout = timeout
+        self.ttl = ttl
+        self.max_wait = max_wait
+        self.max_entries = max_entries
+        self._clock = clock
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+        self._lock = threading.Lock()
+        # (token_key, route) -> (expires_at, data) เรียงจากใช้ล่าสุดน้อยไปมาก
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._route_buckets: Dict[Tuple[str, str], str] = {}  # (token_key, route) -> bucket id
+        self._buckets: Dict[Tuple[str, str], Tuple[int, float]] = {}  # (token_key, bucket id) -> (remaining, reset_at)
+        self._global_reset_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.rate_limited = 0
+
+    def _cached(self, key) -> Tuple[Optional[Any], bool]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+        if entry is None:
+            return None, False
+        expires_at, data = entry
+        return data, self._clock() < expires_at
+
+    def _wait_time(self, token: str, route: str) -> float:
+        now = self._clock()
+        with self._lock:
+            wait = max(0.0, self._global_reset_at - now)
+            bucket = (token, self._route_buckets.get((token, route)))
+            if bucket in self._buckets:
+                remaining, reset_at = self._buckets[bucket]
+                if remaining <= 0 and reset_at > now:
+                    wait = max(wait, reset_at - now)
+        return wait
+
+    def _record_limits(self, token: str, route: str, response):
+        headers = response.headers
+        bucket = headers.get('X-RateLimit-Bucket')
+        now = self._clock()
+        with self._lock:
+            if bucket:
+                self._route_buckets[(token, route)] = bucket
+                try:
+                    remaining = int(headers.get('X-RateLimit-Remaining', 1))
+                    reset_after = float(headers.get('X-RateLimit-Reset-After', 0))
+                except ValueError:
+                    return
+                self._buckets[(token, bucket)] = (remaining, now + reset_after)
+            if response.status_code == 429:
+                retry_after = self._retry_after(response)
+                if headers.get('X-RateLimit-Global') or headers.get('X-RateLimit-Scope') == 'global':
+                    self._global_reset_at = now + retry_after
+                elif bucket:
+                    self._buckets[(token, bucket)] = (0, now + retry_after)
+
+    @staticmethod
+    def _retry_after(response) -> float:
+        try:
+            return float(response.headers.get('Retry-After') or response.json().get('retry_after', 1))
+        except (ValueError, AttributeError):
+            return 1.0
+
+    def get(self, route: str, authorization: str, *, ttl: Optional[float] = None, cache_key: Optional[str] = None):
+        """
+        GET ``route`` with the given Authorization header value, cached per token
+
+        ``cache_key`` overrides the per-token key (used for data shared by all
+        users, such as the bot's guilds).
+        """
+        token = token_key(authorization)
+        key = (cache_key or token, route)
+        data, fresh = self._cached(key)
+        if fresh:
+            self.hits += 1
+            return data
+        self.misses += 1
+
+        for _ in range(2):
+            wait = self._wait_time(token, route)
+            if wait > 0:
+                if data is not None:
+                    return data  # ใช้ข้อมูลเก่าแทนการรอ rate limit
+                if wait > self.max_wait:
+                    self.rate_limited += 1
+                    raise DiscordRateLimited(wait)
+                time.sleep(wait)
+
+            response = self.session.get(
+                f"{self.api_endpoint}{route}",
+                headers={"Authorization": authorization},
+                timeout=self.timeout,
+            )
+            self._record_limits(token, route, response)
+            if response.status_code == 429:
+                self.rate_limited += 1
+                logger.warning(f"Discord rate limited {route}, retry after {self._retry_after(response):.1f}s")
+                continue
+            response.raise_for_status()
+            data = response.json()
+            with self._lock:
+                self._cache[key] = (self._clock() + (self.ttl if ttl is None else ttl), data)
+                self._cache.move_to_end(key)
+                if len(self._cache) > self.max_entries:
+                    self._prune()
+            return data
+
+        if data is not None:
+            return data
+        raise DiscordRateLimited(self._wait_time(token, route))
+
+    def invalidate(self, authorization: str):
+        """ลบ cache ของ token (เช่นตอน logout)"""
+        key = token_key(authorization)
+        with self._lock:
+            for cache_key in [k for k in self._cache if k[0] == key]:
+                del self._cache[cache_key]
+            self._prune()
+
+    def _prune(self):
+        now = self._clock()
+        for cache_key in [k for k, (expires_at, _) in self._cache.items() if expires_at < now - self.ttl]:
+            del self._cache[cache_key]
+        # entry ยังใหม่ทั้งหมดแต่เกินขนาด: ทิ้งตัวที่ไม่ได้ใช้นานที่สุด
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        # bucket แยกตาม token จึงโตตามจำนวนผู้ใช้ ทิ้ง bucket ที่ reset แล้ว (เรียนรู้ใหม่จาก header ครั้งถัดไป)
+        self._buckets = {k: v for k, v in self._buckets.items() if v[1] > now}
+        self._route_buckets = {k: b for k, b in self._route_buckets.items() if (k[0], b) in self._buckets}
+
+    def stats(self) -> Dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'rate_limited': self.rate_limited,
+            'cached': len(self._cache),
+        }
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Optional
+
+import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+# --- Extraction worker pool ---
+# yt-dlp ทำงานใน executor ของตัวเอง ไม่แย่ง default executor กับ Firestore
+# แต่ละ worker มี YoutubeDL instance ของตัวเอง (YoutubeDL ไม่ thread-safe)
+
+_worker_state = threading.local()
+
+
+def _has_callable(value) -> bool:
+    if callable(value):
+        return True
+    if isinstance(value, dict):
+        return any(_has_callable(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_has_callable(v) for v in value)
+    return False
+
+
+def _picklable_options(options: Dict) -> Dict:
+    """Drop option values that cannot cross a process boundary (e.g. lambdas)"""
+    return {k: v for k, v in options.items() if not _has_callable(v)}
+
+
+def _init_worker(options: Dict, sanitize: bool):
+    _worker_state.ytdl = yt_dlp.YoutubeDL(options)
+    _worker_state.sanitize = sanitize
+
+
+def _worker_extract(target: str, download: bool) -> Optional[Dict]:
+    ytdl = _worker_state.ytdl
+    data = ytdl.extract_info(target, download=download)
+    if data is not None and _worker_state.sanitize:
+        # ข้าม process ต้อง pickle ได้
+        data = ytdl.sanitize_info(data)
+    return data
+
+
+class _Job:
+    __slots__ = ('fn', 'args', 'local', 'future')
+
+    def __init__(self, fn: Callable, args: tuple, local: bool, future: asyncio.Future):
+        self.fn = fn
+        self.args = args
+        self.local = local  # ต้องรันใน process นี้ (ส่งผลกลับ event loop ระหว่างทำงาน)
+        self.future = future
+
+
+class ExtractionPool:
+    """
+    Bounded pool สำหรับ ytdl.extract_info
+
+    งานถูกเก็บเป็นคิวแยกตาม guild และจ่ายงานแบบ round-robin ระหว่าง guild
+    ดังนั้น guild ที่ใส่ 50 เพลงจะไม่ทำให้ /play ของ guild อื่นต้องรอ
+    เมื่อคิวเต็ม ``extract`` จะรอ (backpressure) แทนที่จะสะสมงานไม่จำกัด
+
+    ``run`` schedules other blocking yt-dlp work, such as streaming playlist
+    ingestion, through the same per-guild queues. Such a job holds one worker
+    slot for its whole run, so at most ``workers`` jobs of any kind run at
+    once. It always runs on a thread of this process; with the process
+    backend those threads come from a second executor of the same size.
+    """
+
+    def __init__(self, ytdl_options: Dict, *, workers: int = 4, backend: str = 'thread',
+                 max_pending: int = 64, max_pending_per_guild: int = 16):
+        if backend not in ('thread', 'process'):
+            raise ValueError(f"Unknown extraction backend: {backend}")
+        self.workers = max(1, workers)
+        self.backend = backend
+        self.max_pending = max_pending
+        self.max_pending_per_guild = max(1, min(max_pending_per_guild, max_pending))
+        self._ytdl_options = ytdl_options
+        self._executor = None
+        self._local_executor: Optional[ThreadPoolExecutor] = None
+        self._dispatchers = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._guild_slots: Dict[object, asyncio.Semaphore] = {}
+        self._pending: "OrderedDict[object, Deque[_Job]]" = OrderedDict()
+        self._ready: Deque[object] = deque()
+        self._wakeup: Optional[asyncio.Condition] = None
+        self.completed = 0
+        self.failed = 0
+
+    def _start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self._loop = loop
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self._guild_slots.clear()
+        self._wakeup = asyncio.Condition()
+        if self._executor is None:
+            if self.backend == 'process':
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(_picklable_options(self._ytdl_options), True),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix='ytdl',
+                    initializer=_init_worker,
+                    initargs=(self._ytdl_options, False),
+                )
+        self._dispatchers = [loop.create_task(self._dispatch()) for _ in range(self.workers)]
+        logger.info(f"Extraction pool started ({self.backend}, {self.workers} workers)")
+
+    @property
+    def queued(self) -> int:
+        return sum(len(jobs) for jobs in self._pending.values())
+
+    async def extract(self, target: str, *, download: bool = False, guild_id=None) -> Optional[Dict]:
+        """Run ``extract_info(target)`` on a worker, fairly scheduled per guild"""
+        return await self._submit(_worker_extract, (target, download), False, guild_id)
+
+    async def run(self, fn: Callable, *args, guild_id=None):
+        """Run ``fn(*args)`` on a thread of this process, scheduled like ``extract``"""
+        return await self._submit(fn, args, True, guild_id)
+
+    async def _submit(self, fn: Callable, args: tuple, local: bool, guild_id):
+        self._start()
+        guild_slot = self._guild_slots.get(guild_id)
+        if guild_slot is None:
+            guild_slot = self._guild_slots[guild_id] = asyncio.Semaphore(self.max_pending_per_guild)
+
+        async with guild_slot, self._slots:
+            job = _Job(fn, args, local, self._loop.create_future())
+            async with self._wakeup:
+                jobs = self._pending.get(guild_id)
+                if jobs is None:
+                    jobs = self._pending[guild_id] = deque()
+                if not jobs:
+                    self._ready.append(guild_id)
+                jobs.append(job)
+                self._wakeup.notify()
+            return await job.future
+
+    def _next_job(self) -> Optional[_Job]:
+        while self._ready:
+            guild_id = self._ready.popleft()
+            jobs = self._pending[guild_id]
+            job = jobs.popleft()
+            if jobs:
+                self._ready.append(guild_id)
+            else:
+                del self._pending[guild_id]
+            if not job.future.done():
+                return job
+        return None
+
+    async def _dispatch(self):
+        while True:
+            async with self._wakeup:
+                job = self._next_job()
+                while job is None:
+                    await self._wakeup.wait()
+                    job = self._next_job()
+            executor = self._executor
+            if job.local and self.backend == 'process':
+                if self._local_executor is None:
+                    self._local_executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ytdl-local')
+                executor = self._local_executor
+            try:
+                data = await self._loop.run_in_executor(executor, job.fn, *job.args)
+            except asyncio.CancelledError:
+                if not job.future.done():
+                    job.future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                if not job.future.done():
+                    job.future.set_exception(e)
+            else:
+                self.completed += 1
+                if not job.future.done():
+                    job.future.set_result(data)
+
+    def stats(self) -> Dict:
+        return {
+            'backend': self.backend,
+            'workers': self.workers,
+            'queued': self.queued,
+            'completed': self.completed,
+            'failed': self.failed,
+        }
+
+    async def shutdown(self):
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        self._loop = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._local_executor is not None:
+            self._local_executor.shutdown(wait=False, cancel_futures=True)
+            self._local_executor = None
+
+
+_shared_pool: Optional[ExtractionPool] = None
+
+
+def get_extraction_pool(ytdl_options: Dict) -> ExtractionPool:
+    """Return the process-wide extraction pool, creating it from env config on first use"""
+    global _shared_pool
+    if _shared_pool is None:
+        _shared_pool = ExtractionPool(
+            ytdl_options,
+            workers=int(os.getenv("EXTRACTION_WORKERS", "4")),
+            backend=os.getenv("EXTRACTION_BACKEND", "thread"),
+            max_pending=int(os.getenv("EXTRACTION_QUEUE_SIZE", "64")),
+            max_pending_per_guild=int(os.getenv("EXTRACTION_QUEUE_PER_GUILD", "16")),
+        )
+    return _shared_pool
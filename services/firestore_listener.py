@@ -0,0 +1,161 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from services.metrics import FIRESTORE_OPS
+
+logger = logging.getLogger(__name__)
+
+# --- Firestore real-time command listener ---
+# ใช้ on_snapshot แทนการ poll ทุก 5 วินาที: Firestore ส่งเอกสารใหม่มาทันทีที่ถูกสร้าง
+# callback ของ SDK ทำงานบน thread ของ SDK จึงต้องส่งต่อเข้า asyncio.Queue บน bot.loop
+
+CommandHandler = Callable[[str, Any], Awaitable[None]]
+
+
+def command_created_at(document) -> float:
+    """Sort key that keeps commands in the order they were written"""
+    created = getattr(document, 'create_time', None)
+    return created.timestamp() if created is not None else 0.0
+
+
+class SnapshotListener:
+    """
+    Watches Firestore queries and feeds newly pending command documents to ``handler``
+
+    ``handler(key, document)`` runs on the event loop, one document at a time,
+    in creation order within each snapshot. Watches that stop streaming are re-attached with
+    exponential backoff. The initial snapshot after a reconnect re-delivers
+    pending documents, and those already seen are skipped.
+    """
+
+    def __init__(self, handler: CommandHandler, *, check_interval: float = 5.0,
+                 max_backoff: float = 60.0, max_seen: int = 10000):
+        self.handler = handler
+        self.check_interval = check_interval
+        self.max_backoff = max_backoff
+        self.max_seen = max_seen
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._watches: Dict[str, Tuple[Any, Any]] = {}  # key -> (query, watch)
+        self._retry_at: Dict[str, Tuple[float, float]] = {}  # key -> (next attempt, backoff)
+        self._seen: "OrderedDict[str, str]" = OrderedDict()
+        self._tasks = []
+        self.delivered = 0
+        self.reconnects = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        if self._tasks:
+            return
+        self._loop = loop or asyncio.get_event_loop()
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            self._loop.create_task(self._consume()),
+            self._loop.create_task(self._supervise()),
+        ]
+        for key, (query, _) in list(self._watches.items()):
+            self._attach(key, query)
+
+    async def stop(self):
+        for key in list(self._watches):
+            self.unwatch(key)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def watch(self, key: str, query):
+        """เริ่มฟังคำสั่งจาก query (เช่น commands ของ guild หนึ่ง)"""
+        if key in self._watches:
+            return
+        self._watches[key] = (query, None)
+        if self._loop is not None:
+            self._attach(key, query)
+
+    def unwatch(self, key: str):
+        query, watch = self._watches.pop(key, (None, None))
+        self._retry_at.pop(key, None)
+        if watch is not None:
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                logger.warning(f"Failed to unsubscribe listener {key}: {e}")
+
+    def _attach(self, key: str, query):
+        try:
+            watch = query.on_snapshot(self._make_callback(key))
+        except Exception as e:
+            logger.error(f"Failed to attach Firestore listener {key}: {e}")
+            watch = None
+        self._watches[key] = (query, watch)
+
+    def _schedule_retry(self, key: str):
+        _, backoff = self._retry_at.get(key, (0.0, self.check_interval / 2))
+        backoff = min(self.max_backoff, backoff * 2)
+        self._retry_at[key] = (self._loop.time() + backoff, backoff)
+
+    def _make_callback(self, key: str):
+        def on_snapshot(docs, changes, read_time):
+            # ทำงานบน thread ของ Firestore SDK
+            for change in sorted(changes, key=lambda c: command_created_at(c.document)):
+                try:
+                    self._loop.call_soon_threadsafe(self._on_change, key, change.type.name, change.document)
+                except RuntimeError:
+                    return  # event loop ปิดไปแล้ว
+        return on_snapshot
+
+    def _on_change(self, key: str, kind: str, document):
+        FIRESTORE_OPS.inc(op='snapshot_change', status='ok')
+        if kind == 'REMOVED':
+            self._seen.pop(document.id, None)
+            return
+        if document.id in self._seen:
+            return
+        self._seen[document.id] = key
+        while len(self._seen) > self.max_seen:
+            self._seen.popitem(last=False)
+        self._queue.put_nowait((key, document))
+
+    async def _consume(self):
+        while True:
+            key, document = await self._queue.get()
+            self.delivered += 1
+            try:
+                await self.handler(key, document)
+            except Exception as e:
+                logger.error(f"Error handling web command {document.id}: {e}")
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            now = self._loop.time()
+            for key, (query, watch) in list(self._watches.items()):
+                if watch is not None and watch.is_active:
+                    self._retry_at.pop(key, None)
+                    continue
+                retry_at, _ = self._retry_at.get(key, (0.0, 0.0))
+                if now < retry_at:
+                    continue
+                logger.warning(f"Firestore listener {key} is not active, reconnecting")
+                if watch is not None:
+                    try:
+                        watch.unsubscribe()
+                    except Exception:
+                        pass
+                self.reconnects += 1
+                self._schedule_retry(key)
+                self._attach(key, query)
+
+    def stats(self) -> Dict:
+        return {
+            'watches': len(self._watches),
+            'active': sum(1 for _, w in self._watches.values() if w is not None and w.is_active),
+            'pending': self._queue.qsize() if self._queue else 0,
+            'delivered': self.delivered,
+            'reconnects': self.reconnects,
+        }
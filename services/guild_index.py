@@ -0,0 +1,88 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import FrozenSet, Iterable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- Guild membership index ---
+# บอทรู้รายชื่อ guild ของตัวเองอยู่แล้ว (bot.guilds) จึงเขียนเป็นไฟล์ JSON เล็กๆ ไว้ให้ webapp อ่าน
+# webapp ไม่ต้องเรียก /users/@me/guilds ด้วย bot token อีก (ซึ่งได้สูงสุดแค่ 200 guild ต่อหน้า)
+
+DEFAULT_INDEX_PATH = os.getenv("GUILD_INDEX_PATH", "bot_guilds.json")
+
+
+class GuildIndex:
+    """
+    File-backed set of the guild IDs the bot is in
+
+    The bot is the only writer. It calls ``publish`` once on ready and then
+    ``add``/``remove`` as guilds are joined or left. Every write replaces the
+    file atomically, so a reader never sees a partial file. The webapp calls
+    ``ids()``, which costs one ``stat`` and only re-reads the file after it
+    was replaced.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH):
+        self.path = path
+        self._ids: Set[str] = set()
+        self._loaded: Optional[FrozenSet[str]] = None
+        self._loaded_version: Optional[Tuple[int, int]] = None
+
+    # --- ฝั่งบอท (writer) ---
+    def publish(self, guild_ids: Iterable):
+        """เขียนรายชื่อ guild ทั้งหมดใหม่ (เรียกตอน on_ready)"""
+        self._ids = {str(guild_id) for guild_id in guild_ids}
+        self._write()
+
+    def add(self, guild_id):
+        guild_id = str(guild_id)
+        if guild_id not in self._ids:
+            self._ids.add(guild_id)
+            self._write()
+
+    def remove(self, guild_id):
+        guild_id = str(guild_id)
+        if guild_id in self._ids:
+            self._ids.discard(guild_id)
+            self._write()
+
+    def _write(self):
+        payload = {'updated_at': time.time(), 'guilds': sorted(self._ids)}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.guild_index.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(payload, f, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            logger.error(f"Failed to write guild index {self.path}: {e}")
+
+    # --- ฝั่ง webapp (reader) ---
+    def ids(self) -> Optional[FrozenSet[str]]:
+        """Guild IDs the bot is in, or None if the bot has not published an index yet"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        # os.replace สร้าง inode ใหม่ทุกครั้ง จึงตรวจได้แม้ mtime ละเอียดไม่พอ
+        version = (st.st_ino, st.st_mtime_ns)
+        if version != self._loaded_version:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._loaded = frozenset(json.load(f).get('guilds', ()))
+                self._loaded_version = version
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to read guild index {self.path}: {e}")
+                return self._loaded
+        return self._loaded
+
+    def __contains__(self, guild_id) -> bool:
+        ids = self.ids()
+        return ids is not None and str(guild_id) in ids
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import shlex
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+import discord
+import numpy as np
+
+from services.audio_source import can_passthrough
+from services.metrics import track_process
+
+logger = logging.getLogger(__name__)
+
+# --- Loudness normalization ---
+# วัดความดัง (EBU R128 integrated loudness) ของแต่ละเพลงครั้งเดียวด้วย ffmpeg นอก hot path แล้วเก็บผลตาม video id
+# ตอนเล่น gain ของเพลงคูณกับ PLAYBACK_VOLUME ใน frame path ด้วยตาราง NumPy ที่รวม limiter ไว้ กันเสียงแตก
+# เพลงที่ยังวัดไม่เสร็จเล่นที่ gain 1.0 ก่อน แล้วค่อยๆ ปรับเมื่อได้ผล
+# เพลงที่ copy Opus ได้ (ดู services/audio_source.py) ข้าม normalization ทั้งหมด ไม่เสีย ffmpeg ไปวัด
+
+LOUDNESS_NORMALIZE = os.getenv("LOUDNESS_NORMALIZE", "1") != "0"
+# -14 LUFS เท่ากับระดับที่ YouTube normalize เพลงส่วนใหญ่ไว้แล้ว
+LOUDNESS_TARGET_LUFS = float(os.getenv("LOUDNESS_TARGET_LUFS", "-14"))
+LOUDNESS_MAX_GAIN_DB = float(os.getenv("LOUDNESS_MAX_GAIN_DB", "12"))
+LOUDNESS_ANALYZE_SECONDS = float(os.getenv("LOUDNESS_ANALYZE_SECONDS", "600"))
+LOUDNESS_WORKERS = int(os.getenv("LOUDNESS_WORKERS", "2"))
+LOUDNESS_CACHE_PATH = os.getenv("LOUDNESS_CACHE_PATH", "loudness.json")
+
+SAMPLES_PER_FRAME = discord.opus.Encoder.SAMPLES_PER_FRAME
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000
+LIMITER_KNEE = 0.8 * 32767  # ประมาณ -2 dBFS ต่ำกว่านี้ไม่ถูกแตะ
+LIMITER_CEILING = 0.99 * 32767
+
+INTEGRATED_RE = re.compile(r'I:\s*(-?\d+(?:\.\d+)?|-inf)\s*LUFS')
+_RAMP = np.repeat(np.arange(SAMPLES_PER_FRAME, dtype=np.float32) / SAMPLES_PER_FRAME, 2)
+
+
+def parse_ebur128(output: str) -> Optional[float]:
+    """Integrated loudness (LUFS) from the summary ffmpeg's ebur128 filter prints"""
+    matches = INTEGRATED_RE.findall(output)
+    if not matches:
+        return None
+    value = float(matches[-1])
+    return value if math.isfinite(value) else None
+
+
+def loudness_gain(lufs: Optional[float], target: float = LOUDNESS_TARGET_LUFS,
+                  max_gain_db: float = LOUDNESS_MAX_GAIN_DB) -> float:
+    """Linear gain that brings ``lufs`` to ``target``; boosts are capped, cuts are not"""
+    if lufs is None or lufs <= -70:  # เงียบหรือวัดไม่ได้ ไม่ต้องปรับ
+        return 1.0
+    return 10 ** (min(target - lufs, max_gain_db) / 20)
+
+
+async def measure_loudness(url: str, *, before_options: str = '', seconds: float = LOUDNESS_ANALYZE_SECONDS,
+                           executable: str = 'ffmpeg') -> Optional[float]:
+    """ถอดเสียงด้วย ffmpeg (ไม่ส่งออกที่ไหน) แล้วอ่านค่า integrated loudness"""
+    if not url.startswith(('http://', 'https://')):
+        before_options = ''  # -reconnect ใช้ได้กับ HTTP เท่านั้น (ไฟล์ใน audio cache)
+    args = [executable, '-hide_banner', '-nostats', *shlex.split(before_options), '-i', url, '-vn']
+    if seconds:
+        args += ['-t', f'{seconds:g}']
+    args += ['-af', 'ebur128=framelog=quiet', '-f', 'null', '-']
+    process = await asyncio.create_subprocess_exec(*args, stdin=asyncio.subprocess.DEVNULL,
+                                                   stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+    track_process(process, 'loudness')
+    try:
+        _, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg exited with {process.returncode}: {stderr.decode(errors='replace')[-200:]}")
+    return parse_ebur128(stderr.decode(errors='replace'))
+
+
+class LoudnessStore:
+    """
+    video id -> integrated loudness ที่วัดแล้ว เก็บเป็น JSON บนดิสก์ (LRU ไม่เกิน ``max_entries``)
+
+    The measured loudness is stored rather than the gain, so changing
+    LOUDNESS_TARGET_LUFS does not require measuring again. Analyses are
+    single-flight and limited to ``workers`` ffmpeg processes at a time.
+    Must only be used from the event loop thread.
+    """
+
+    def __init__(self, path: Optional[str] = LOUDNESS_CACHE_PATH, *, max_entries: int = 20000,
+                 workers: int = LOUDNESS_WORKERS,
+                 measure: Callable[..., Awaitable[Optional[float]]] = measure_loudness):
+        self.path = path
+        self.max_entries = max_entries
+        self._measure = measure
+        self._workers = workers
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._entries: Optional["OrderedDict[str, Optional[float]]"] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._save_task: Optional[asyncio.Task] = None
+        self.analyses = 0
+        self.failures = 0
+
+    @property
+    def entries(self) -> "OrderedDict[str, Optional[float]]":
+        # โหลดไฟล์ครั้งแรกที่ใช้ ไม่ใช่ตอน import
+        if self._entries is None:
+            self._entries = OrderedDict()
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        self._entries.update(json.load(f))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not load loudness cache {self.path}: {e}")
+        return self._entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def loudness(self, video_id: str) -> Optional[float]:
+        return self.entries.get(video_id)
+
+    def gain(self, video_id: Optional[str]) -> Optional[float]:
+        """Gain ของเพลงนี้ หรือ None ถ้ายังไม่เคยวัด"""
+        if not video_id or video_id not in self.entries:
+            return None
+        self.entries.move_to_end(video_id)
+        return loudness_gain(self.entries[video_id])
+
+    def analyze(self, video_id: Optional[str], url: str, *, before_options: str = '') -> Optional[asyncio.Future]:
+        """
+        เริ่มวัดความดังเบื้องหลัง (ถ้ายังไม่เคยวัดและไม่ได้กำลังวัดอยู่)
+
+        Returns a future that resolves to the gain, or None when the gain is
+        already known or there is no video id to key it by.
+        """
+        if not video_id or video_id in self.entries:
+            return None
+        future = self._inflight.get(video_id)
+        if future is None:
+            future = asyncio.ensure_future(self._analyze(video_id, url, before_options))
+            self._inflight[video_id] = future
+            future.add_done_callback(lambda _: self._inflight.pop(video_id, None))
+        return future
+
+    async def _analyze(self, video_id: str, url: str, before_options: str) -> float:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._workers)
+        async with self._semaphore:
+            try:
+                lufs = await self._measure(url, before_options=before_options)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # ไม่บันทึกผล ครั้งหน้าจะลองวัดใหม่
+                self.failures += 1
+                logger.warning(f"Loudness analysis failed for {video_id}: {e}")
+                return 1.0
+        self.analyses += 1
+        self.entries[video_id] = lufs
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self._schedule_save()
+        gain = loudness_gain(lufs)
+        logger.info(f"Loudness of {video_id}: {lufs} LUFS, gain {20 * math.log10(gain):+.1f} dB")
+        return gain
+
+    def _schedule_save(self):
+        # รวมการเขียนไฟล์ที่เกิดติดกันเป็นครั้งเดียว และเขียนนอก event loop
+        if self.path and (self._save_task is None or self._save_task.done()):
+            self._save_task = asyncio.ensure_future(self._save())
+
+    async def _save(self):
+        await asyncio.sleep(1)
+        snapshot = dict(self.entries)
+        try:
+            await asyncio.to_thread(self._write, snapshot)
+        except OSError as e:
+            logger.warning(f"Could not save loudness cache {self.path}: {e}")
+
+    def _write(self, snapshot: Dict):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, self.path)
+
+    def stats(self) -> Dict:
+        return {
+            'tracks': len(self.entries),
+            'analyses': self.analyses,
+            'failures': self.failures,
+            'pending': len(self._inflight),
+        }
+
+
+def limiter_table(gain: float, knee: float = LIMITER_KNEE, ceiling: float = LIMITER_CEILING) -> np.ndarray:
+    """
+    ตาราง 65536 ค่า: sample s16 ทุกค่า (เรียงตาม bit pattern แบบ uint16) -> sample หลังคูณ gain และผ่าน limiter
+
+    Below ``knee`` the output is exactly ``sample * gain``. Above it, the
+    output bends smoothly (tanh) towards ``ceiling`` and never reaches it.
+    """
+    x = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.float64) * gain
+    y = np.abs(x)
+    over = y > knee
+    y[over] = knee + (ceiling - knee) * np.tanh((y[over] - knee) / (ceiling - knee))
+    return np.rint(np.copysign(y, x)).astype(np.int16)
+
+
+class GainLimiter:
+    """
+    คูณ PCM s16 ด้วย gain พร้อม soft-knee limiter โดยเปิดตาราง (ดู limiter_table)
+
+    Gain and limiting are folded into one precomputed table, so a frame costs
+    a single ``np.take``: no per-frame peak search and no float conversion.
+    When ``gain`` changes, the table is rebuilt and that one frame crossfades
+    from the old table's output to the new one to avoid a click.
+    """
+
+    def __init__(self, gain: float = 1.0):
+        self.gain = gain
+        self.table_builds = 0
+        self._table_gain: Optional[float] = None
+        self._table: Optional[np.ndarray] = None
+        self._out = np.empty(SAMPLES_PER_FRAME * 2, dtype=np.int16)
+
+    def process(self, data: bytes) -> bytes:
+        indices = np.frombuffer(data, dtype=np.uint16)
+        if self.gain != self._table_gain:
+            old = self._table
+            self._table = limiter_table(self.gain)
+            self._table_gain = self.gain
+            self.table_builds += 1
+            if old is not None:
+                ramp = _RAMP if len(indices) == len(_RAMP) else np.linspace(0, 1, len(indices), endpoint=False)
+                before = old[indices].astype(np.float32)
+                after = self._table[indices].astype(np.float32)
+                return (before + (after - before) * ramp).astype(np.int16).tobytes()
+        out = self._out if len(indices) == len(self._out) else np.empty(len(indices), dtype=np.int16)
+        np.take(self._table, indices, out=out)
+        return out.tobytes()
+
+
+class NormalizedVolume(discord.PCMVolumeTransformer):
+    """
+    PCMVolumeTransformer ที่คูณ ``volume`` กับ gain ของเพลง (``track_gain``) ผ่าน GainLimiter แทน audioop
+
+    ``track_gain`` may be set from the event loop while the voice thread
+    reads, for example when the loudness analysis finishes mid-track. The
+    limiter crossfades to the new value.
+    """
+
+    def __init__(self, original: discord.AudioSource, volume: float = 1.0, track_gain: float = 1.0):
+        super().__init__(original, volume)
+        self.track_gain = track_gain
+        self.limiter = GainLimiter(volume * track_gain)
+
+    def read(self) -> bytes:
+        ret = self.original.read()
+        if not ret:
+            return ret
+        self.limiter.gain = self._volume * self.track_gain
+        return self.limiter.process(ret)
+
+
+# ร่วมกันทั้ง bot.py และ cogs/music.py
+loudness_store = LoudnessStore()
+
+
+def prepare(data: Dict, *, before_options: str = ''):
+    """เริ่มวัดความดังตั้งแต่ตอน resolve (เพลงในคิวถูก resolve ล่วงหน้า จึงมักวัดเสร็จก่อนเล่น)"""
+    if LOUDNESS_NORMALIZE and data.get('url') and not can_passthrough(data):
+        loudness_store.analyze(data.get('id'), data['url'], before_options=before_options)
+
+
+def normalize(source: NormalizedVolume, data: Dict, *, before_options: str = '') -> NormalizedVolume:
+    """ใส่ gain ของเพลงให้ source ถ้ายังไม่รู้ gain จะเริ่มวัดและปรับให้เมื่อวัดเสร็จ"""
+    if not LOUDNESS_NORMALIZE:
+        return source
+    gain = loudness_store.gain(data.get('id'))
+    if gain is not None:
+        source.track_gain = gain
+        return source
+    future = loudness_store.analyze(data.get('id'), data.get('url', ''), before_options=before_options)
+    if future is not None:
+        def apply(done: asyncio.Future):
+            if not done.cancelled() and done.exception() is None:
+                source.track_gain = done.result()
+        future.add_done_callback(apply)
+    return source
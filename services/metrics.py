@@ -0,0 +1,350 @@
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+import weakref
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- Metrics ของ process บอท (Prometheus text format) ---
+# เดิมรู้เวลาของ /play ได้จาก logger.info ใน bot.log เท่านั้น
+# ตอนนี้แต่ละช่วง (defer, connect, extract, ffmpeg spawn, packet แรก) ถูกเก็บเป็น histogram
+# และเปิด endpoint /metrics ให้ Prometheus scrape แล้วดู p50/p99 ข้ามทุก guild ได้
+# ไม่ใช้ prometheus_client: metric ที่ใช้มีแค่ counter/gauge/histogram ส่วน HTTP ใช้ aiohttp ที่มีอยู่แล้ว
+
+# "" = ปิด endpoint
+METRICS_ADDRESS = os.getenv("METRICS_ADDRESS", "http://127.0.0.1:9108")
+METRICS_PATH = "/metrics"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# วินาที: ครอบคลุมตั้งแต่ defer (~ms) ถึง extract ที่ช้า (หลายวินาที)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    """Metric หนึ่งตัวพร้อม label; ค่าของแต่ละชุด label เก็บแยกกัน (thread-safe)"""
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(ชื่อ sample, label ที่ format แล้ว, ค่า)"""
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, key), value) for key, value in self._values.items()]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    """Gauge ที่ตั้งค่าเอง หรืออ่านจาก ``function`` ตอน scrape (ไม่มี label)"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        try:
+            return [(self.name, '', float(self.function()))]
+        except Exception as e:
+            logger.warning(f"Gauge {self.name} failed: {e}")
+            return []
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # นับแยกต่อ bucket (ไม่สะสม) แล้วค่อยสะสมตอน render
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return state[2] if state else 0
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        samples = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                labels = _labels(self.labelnames + ('le',), key + (_format_value(bound),))
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            labels = _labels(self.labelnames, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class StatsGauges:
+    """
+    แปลง dict สถิติที่มีอยู่แล้ว (เช่น ``audio_cache.stats``) เป็น gauge ``<prefix>_<key>`` ตอน scrape
+
+    Non-numeric values are skipped, so the stats properties can stay as they
+    are for logs and the dashboard.
+    """
+
+    def __init__(self, prefix: str, documentation: str, function: Callable[[], Dict]):
+        self.prefix = prefix
+        self.documentation = documentation
+        self.function = function
+
+    def render(self) -> List[str]:
+        try:
+            stats = self.function()
+        except Exception as e:
+            logger.warning(f"Stats for {self.prefix} failed: {e}")
+            return []
+        lines = []
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"{self.prefix}_{key}"
+            lines += [f"# HELP {name} {self.documentation}: {key}", f"# TYPE {name} gauge",
+                      f"{name} {_format_value(value)}"]
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        key = getattr(metric, 'name', None) or metric.prefix
+        with self._lock:
+            if key in self._metrics:
+                raise ValueError(f"Metric {key} is already registered")
+            self._metrics[key] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              function: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def stats(self, prefix: str, documentation: str, function: Callable[[], Dict]) -> StatsGauges:
+        return self.register(StatsGauges(prefix, documentation, function))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+PLAY_PHASE_SECONDS = registry.histogram(
+    'bot_play_phase_seconds', 'Time spent in each phase of a play command', ('path', 'phase'))
+FIRST_AUDIO_SECONDS = registry.histogram(
+    'bot_play_first_audio_seconds', 'Time from receiving a play command to its first audio frame', ('path',))
+DISCORD_RATE_LIMITED = registry.counter(
+    'bot_discord_rate_limited_total', 'Discord HTTP responses with status 429', ('scope',))
+FIRESTORE_OPS = registry.counter(
+    'bot_firestore_ops_total', 'Firestore operations issued or received by the bot', ('op', 'status'))
+FFMPEG_SPAWNED = registry.counter('bot_ffmpeg_spawned_total', 'ffmpeg processes started', ('kind',))
+
+# process ffmpeg ที่ยังไม่จบ (weak: ไม่ยืดอายุ object ของ process)
+_processes: "weakref.WeakSet" = weakref.WeakSet()
+_processes_lock = threading.Lock()
+
+
+def _alive(process) -> bool:
+    poll = getattr(process, 'poll', None)  # subprocess.Popen
+    return poll() is None if poll is not None else process.returncode is None  # asyncio Process
+
+
+def track_process(process, kind: str):
+    """นับ process ffmpeg (subprocess.Popen หรือ asyncio Process) ใน gauge ``bot_ffmpeg_processes``"""
+    if process is None:
+        return
+    FFMPEG_SPAWNED.inc(kind=kind)
+    with _processes_lock:
+        _processes.add(process)
+
+
+def track_source(source, kind: str):
+    """นับ process ของ discord.FFmpegAudio (ไม่มีผลกับ source ที่ไม่ได้เปิด ffmpeg)"""
+    track_process(getattr(source, '_process', None), kind)
+    return source
+
+
+def active_processes() -> int:
+    with _processes_lock:
+        processes = list(_processes)
+    return sum(1 for process in processes if _alive(process))
+
+
+registry.gauge('bot_ffmpeg_processes', 'ffmpeg processes currently running', function=active_processes)
+
+
+class PlayTimer:
+    """
+    จับเวลาของคำสั่ง play หนึ่งครั้ง แต่ละ ``phase`` วัดจากจุดที่จบ phase ก่อนหน้า
+
+    ``first_audio`` may be called from the voice thread; it records the last
+    phase and the total once.
+    """
+
+    def __init__(self, path: str, started: Optional[float] = None):
+        self.path = path
+        self.started = time.perf_counter() if started is None else started
+        self._mark = self.started
+        self._done = False
+
+    def phase(self, name: str):
+        now = time.perf_counter()
+        PLAY_PHASE_SECONDS.observe(now - self._mark, path=self.path, phase=name)
+        self._mark = now
+
+    def first_audio(self):
+        if self._done:
+            return
+        self._done = True
+        self.phase('first_packet')
+        FIRST_AUDIO_SECONDS.observe(self._mark - self.started, path=self.path)
+
+
+def discord_http_trace():
+    """aiohttp TraceConfig สำหรับ ``commands.Bot(http_trace=...)`` นับ 429 จาก Discord"""
+    import aiohttp
+
+    async def on_request_end(session, context, params):
+        if params.response.status == 429:
+            headers = params.response.headers
+            scope = headers.get('X-RateLimit-Scope') or ('global' if headers.get('X-RateLimit-Global') else 'user')
+            DISCORD_RATE_LIMITED.inc(scope=scope)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_end.append(on_request_end)
+    return trace
+
+
+class MetricsServer:
+    """aiohttp endpoint ``/metrics`` ใน process บอท (ที่อยู่รูปแบบเดียวกับ COMMAND_BUS_ADDRESS)"""
+
+    def __init__(self, address: str = METRICS_ADDRESS, registry: Registry = registry):
+        self.address = address
+        self.registry = registry
+        self._runner = None
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    async def start(self):
+        from aiohttp import web
+        from services.command_bus import parse_address
+
+        if self._runner is not None or not self.address:
+            return
+        kind, target = parse_address(self.address)
+        app = web.Application()
+        app.router.add_get(METRICS_PATH, self._metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            site = web.UnixSite(runner, target) if kind == 'unix' else web.TCPSite(runner, *target)
+            await site.start()
+        except Exception:
+            await runner.cleanup()
+            raise
+        self._runner = runner
+        logger.info(f"Metrics endpoint listening on {self.address}{METRICS_PATH}")
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        await self._runner.cleanup()
+        self._runner = None
+
+    async def _metrics(self, request):
+        from aiohttp import web
+        return web.Response(body=self.registry.render().encode(), headers={'Content-Type': CONTENT_TYPE})
@@ -0,0 +1,488 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import discord
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# --- PCM mixer ---
+# ทุกเสียงของ guild (เพลง + TTS) ถูกรวมเป็น AudioSource เดียว จึงมี player/encoder แค่ชุดเดียวต่อ guild
+# เพลงถูกลดเสียง (duck) ระหว่างที่ TTS พูด และเพลงต่อกันแบบ crossfade ได้
+# การรวมเสียงทำด้วย NumPy ทีละ frame (20 ms) ถ้ามีเสียงเดียวที่ไม่ต้องปรับ gain จะส่ง bytes ต่อไปตรงๆ
+# input ที่เป็น Opus (OpusTrack) ถูกส่งต่อเป็น packet โดยไม่ encode ใหม่ และถูกถอดเป็น PCM เฉพาะตอนต้องรวมเสียง
+# เพลงถัดไปที่ pre-roll ไว้ (set_next) ถูกสลับเข้ามาใน frame เดียวกับที่เพลงปัจจุบันจบ
+
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+CHANNELS = discord.opus.Encoder.CHANNELS
+SAMPLES_PER_FRAME = discord.opus.Encoder.SAMPLES_PER_FRAME
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000
+
+CROSSFADE_SECONDS = float(os.getenv("MIXER_CROSSFADE_SECONDS", "0"))
+DUCK_GAIN = float(os.getenv("MIXER_DUCK_GAIN", "0.3"))
+DUCK_RAMP_SECONDS = float(os.getenv("MIXER_DUCK_RAMP_MS", "150")) / 1000
+
+SILENCE = b'\0' * FRAME_SIZE
+# ตำแหน่งภายใน frame (0..1) ใช้สร้าง gain ที่เปลี่ยนแบบต่อเนื่อง ไม่ให้มีเสียงคลิก
+_RAMP = (np.arange(SAMPLES_PER_FRAME, dtype=np.float32) / SAMPLES_PER_FRAME)[:, None]
+
+
+def seconds_to_frames(seconds: float) -> int:
+    return max(0, int(round(seconds / FRAME_SECONDS)))
+
+
+class Envelope:
+    """Gain ที่เลื่อนไปหาค่าเป้าหมายแบบ linear ภายใน ``frames`` frame"""
+    __slots__ = ('value', 'target', 'frames_left')
+
+    def __init__(self, value: float = 1.0):
+        self.value = value
+        self.target = value
+        self.frames_left = 0
+
+    def set(self, target: float, frames: int):
+        if target == self.target:
+            return
+        self.target = target
+        self.frames_left = frames
+        if frames <= 0:
+            self.value = target
+
+    def advance(self):
+        """Gain ของ frame ถัดไป: float ถ้าคงที่ หรือ array (samples, 1) ระหว่างเปลี่ยน"""
+        if self.frames_left <= 0:
+            return self.value
+        start = self.value
+        end = start + (self.target - start) / self.frames_left
+        self.frames_left -= 1
+        self.value = self.target if self.frames_left == 0 else end
+        return start + (end - start) * _RAMP
+
+
+class MixerInput:
+    """เสียงหนึ่งรายการใน mixer (เพลงหรือ TTS) พร้อม callback ``after`` แบบเดียวกับ VoiceClient.play"""
+    __slots__ = ('source', 'after', 'fade', 'fading_out', 'end_frame', 'frames', 'on_ending', 'opus', 'decoder',
+                 'on_start', 'follows')
+
+    def __init__(self, source: discord.AudioSource, after: Optional[Callable] = None, *,
+                 duration: float = 0, on_ending: Optional[Callable[[], None]] = None,
+                 on_start: Optional[Callable[[], None]] = None, follows: bool = False):
+        self.source = source
+        self.after = after
+        self.fade = Envelope()
+        self.fading_out = False
+        self.end_frame = seconds_to_frames(duration) if duration else 0
+        self.frames = 0
+        self.on_ending = on_ending
+        self.opus = source.is_opus()
+        self.decoder = None
+        self.on_start = on_start  # เรียกครั้งเดียวตอนได้ frame แรก
+        self.follows = follows  # ต่อจากเพลงก่อนหน้าในคิว (นับช่วงเงียบระหว่างเพลง)
+
+    def pcm(self, data: bytes) -> bytes:
+        """PCM ของ frame นี้ (ถอด Opus packet เมื่อจำเป็นเท่านั้น)"""
+        if not self.opus:
+            return data
+        if self.decoder is None:
+            self.decoder = discord.opus.Decoder()
+        data = self.decoder.decode(data)
+        if len(data) != FRAME_SIZE:
+            data = data[:FRAME_SIZE].ljust(FRAME_SIZE, b'\0')
+        return data
+
+
+class Mixer(discord.AudioSource):
+    """
+    Mixing AudioSource for one guild: a music layer plus a queue of speech clips
+
+    - Music ducks to ``duck_gain`` while speech plays, with a short ramp.
+    - ``play_music`` while a track is playing fades the old track out and the
+      new one in over ``crossfade`` seconds. A track with a known duration
+      calls ``on_ending`` that many seconds before its end, so the caller can
+      start the next track in time.
+    - Every input's ``after(error)`` is called exactly once: when it ends, is
+      stopped, has faded out, or when the mixer is cleaned up.
+    - ``set_next`` arms a pre-rolled track. When the music ends on its own,
+      the next track's first frame goes out in that same frame, so there is
+      no gap. Silence between a track and the one that ``follows`` it is
+      recorded in ``gap_meter``.
+    - An Opus input playing alone at unity gain is forwarded packet by packet
+      and ``is_opus()`` reports True for that frame, so the player skips the
+      encoder. The input is only decoded to PCM while it has to be mixed.
+
+    ``read`` runs on the voice thread. The other methods are called from the
+    event loop, and all shared state is guarded by a lock. When nothing is
+    left to play, ``read`` returns b'' and the mixer closes. A closed mixer
+    rejects new inputs, so the caller starts a fresh one.
+    """
+
+    def __init__(self, *, crossfade: float = CROSSFADE_SECONDS, duck_gain: float = DUCK_GAIN,
+                 duck_ramp: float = DUCK_RAMP_SECONDS):
+        self.crossfade = crossfade
+        self.duck_gain = duck_gain
+        self._duck_ramp_frames = seconds_to_frames(duck_ramp)
+        self._duck = Envelope()
+        self._lock = threading.Lock()
+        self._music: List[MixerInput] = []
+        self._speech: List[MixerInput] = []
+        self.closed = False
+        self.frames = 0
+        self.mixed_frames = 0  # frame ที่ต้องคำนวณด้วย NumPy (ไม่ใช่ passthrough)
+        self.opus_frames = 0  # frame ที่ส่ง Opus packet ต่อไปโดยไม่ encode ใหม่
+        self._opus = False
+        self._next: Optional[MixerInput] = None
+        self.handoffs = 0
+        self.gap_started: Optional[float] = None  # perf_counter ตอนเพลงจบเองและไม่มีเพลงเล่นต่อ
+
+    # --- ฝั่ง event loop ---
+    def play_music(self, source: discord.AudioSource, *, after: Optional[Callable] = None, duration: float = 0,
+                   crossfade: Optional[float] = None, on_ending: Optional[Callable[[], None]] = None,
+                   on_start: Optional[Callable[[], None]] = None, follows: bool = False) -> bool:
+        """เริ่มเพลงใหม่ เพลงเดิม (ถ้ามี) จะ fade out และเพลงที่ pre-roll ไว้ถูกยกเลิก; คืน False ถ้า mixer ปิดไปแล้ว"""
+        crossfade = self.crossfade if crossfade is None else crossfade
+        frames = seconds_to_frames(crossfade)
+        item = MixerInput(source, after, duration=duration, on_ending=on_ending if frames else None,
+                          on_start=on_start, follows=follows)
+        with self._lock:
+            if self.closed:
+                return False
+            stopped = [self._next] if self._next else []
+            self._next = None
+            current = [m for m in self._music if not m.fading_out]
+            if current and frames:
+                for music in current:
+                    music.fading_out = True
+                    music.fade.set(0.0, frames)
+                item.fade = Envelope(0.0)
+                item.fade.set(1.0, frames)
+            else:
+                stopped += current
+                self._music = [m for m in self._music if m not in current]
+            self._music.append(item)
+        self._finish(stopped)
+        return True
+
+    def set_next(self, source: discord.AudioSource, *, after: Optional[Callable] = None, duration: float = 0,
+                 on_start: Optional[Callable[[], None]] = None) -> bool:
+        """
+        ตั้งเพลงที่จะเล่นต่อทันทีเมื่อเพลงปัจจุบันจบเอง (แทนที่เพลงที่ตั้งไว้ก่อนหน้า)
+
+        Returns False if the mixer is closed or no music is playing, in which
+        case the caller keeps ownership of ``source``.
+        """
+        item = MixerInput(source, after, duration=duration, on_start=on_start, follows=True)
+        with self._lock:
+            if self.closed or not any(not m.fading_out for m in self._music):
+                return False
+            replaced, self._next = self._next, item
+        if replaced is not None:
+            self._finish([replaced])
+        return True
+
+    def clear_next(self) -> bool:
+        with self._lock:
+            item, self._next = self._next, None
+        if item is not None:
+            self._finish([item])
+        return item is not None
+
+    def play_speech(self, source: discord.AudioSource, *, after: Optional[Callable] = None) -> bool:
+        """ต่อคิวเสียงพูด (เล่นทีละรายการ) เพลงจะถูกลดเสียงระหว่างพูด"""
+        with self._lock:
+            if self.closed:
+                return False
+            self._speech.append(MixerInput(source, after))
+        return True
+
+    def stop_music(self) -> bool:
+        """หยุดเพลงทั้งหมดทันที รวมถึงเพลงที่ pre-roll ไว้ (เหมือน VoiceClient.stop แต่ไม่กระทบ TTS)"""
+        with self._lock:
+            stopped, self._music = self._music, []
+            if self._next is not None:
+                stopped.append(self._next)
+                self._next = None
+            self.gap_started = None
+        self._finish(stopped)
+        return bool(stopped)
+
+    def stop_speech(self) -> bool:
+        with self._lock:
+            stopped, self._speech = self._speech, []
+        self._finish(stopped)
+        return bool(stopped)
+
+    @property
+    def music_playing(self) -> bool:
+        with self._lock:
+            return any(not m.fading_out for m in self._music)
+
+    @property
+    def speaking(self) -> bool:
+        with self._lock:
+            return bool(self._speech)
+
+    # --- ฝั่ง voice thread ---
+    @staticmethod
+    def _read(item: MixerInput):
+        try:
+            data = item.source.read()
+        except Exception as e:
+            return b'', e
+        if data and not item.opus and len(data) < FRAME_SIZE:
+            data += b'\0' * (FRAME_SIZE - len(data))
+        return data, None
+
+    def read(self) -> bytes:
+        with self._lock:
+            if not self._music and not self._speech:
+                self.closed = True
+                return b''
+            music = list(self._music)
+            speech = self._speech[0] if self._speech else None
+        # อ่าน source นอก lock (ffmpeg pipe อาจช้า) แล้วคำนวณ gain ใน lock
+        reads = [(item,) + self._read(item) for item in music]
+        if speech is not None:
+            reads.append((speech,) + self._read(speech))
+        self.frames += 1
+
+        layers = []  # (input, bytes, gain)
+        finished = []
+        ending = []
+        started = []
+        handoff = None
+        with self._lock:
+            self._duck.set(self.duck_gain if speech is not None else 1.0, self._duck_ramp_frames)
+            duck = self._duck.advance()
+            live = {id(item) for item in self._music + self._speech}
+            for item, data, error in reads:
+                if id(item) not in live:
+                    continue  # ถูก stop ระหว่างอ่าน (after ถูกเรียกไปแล้ว)
+                if item is speech:
+                    gain = 1.0
+                else:
+                    gain = item.fade.advance() * duck
+                    if item.fading_out and item.fade.frames_left == 0:
+                        finished.append((item, error))
+                if not data:
+                    if not (finished and finished[-1][0] is item):
+                        finished.append((item, error))
+                    continue
+                item.frames += 1
+                if item.frames == 1 and item is not speech:
+                    started.append(item)
+                if item.on_ending is not None and item.end_frame and \
+                        item.frames >= item.end_frame - seconds_to_frames(self.crossfade):
+                    ending.append(item.on_ending)
+                    item.on_ending = None
+                layers.append((item, data, gain))
+            if finished:
+                done = {id(item) for item, _ in finished}
+                ended = any(not item.fading_out and item is not speech for item, _ in finished)
+                self._music = [m for m in self._music if id(m) not in done]
+                self._speech = [s for s in self._speech if id(s) not in done]
+                if ended and not any(not m.fading_out for m in self._music):
+                    # เพลงจบเอง: สลับไปเพลงที่ pre-roll ไว้ใน frame นี้เลย
+                    handoff, self._next = self._next, None
+                    if handoff is not None:
+                        self._music.append(handoff)
+                        self.handoffs += 1
+                    self.gap_started = time.perf_counter()
+
+        if handoff is not None:
+            # frame แรกมาจากบัฟเฟอร์ pre-roll จึงไม่ทำให้ frame นี้ช้า
+            data, error = self._read(handoff)
+            with self._lock:
+                live = any(m is handoff for m in self._music)
+                if live and data:
+                    handoff.frames += 1
+                    started.append(handoff)
+                    layers.append((handoff, data, duck))
+                elif live:
+                    self._music.remove(handoff)
+                    finished.append((handoff, error))
+        if started:
+            self._record_starts(started)
+
+        for item in started:
+            if item.on_start is not None:
+                self._call(item.on_start)
+        for item, error in finished:
+            self._finish([item], error)
+        for callback in ending:
+            self._call(callback)
+
+        self._opus = False
+        if not layers:
+            # เสียงที่เหลือจบพร้อมกันใน frame นี้ frame ถัดไปจะปิด mixer หรือเล่นรายการถัดไป
+            return SILENCE
+        item, data, gain = layers[0]
+        if len(layers) == 1 and isinstance(gain, float) and gain == 1.0:
+            if item.opus:
+                self._opus = True
+                self.opus_frames += 1
+            return data
+        self.mixed_frames += 1
+        try:
+            return mix([(item.pcm(data), gain) for item, data, gain in layers])
+        except discord.opus.OpusError as e:
+            logger.warning(f"Opus decode failed while mixing: {e}")
+            return SILENCE
+
+    def _record_starts(self, items: List[MixerInput]):
+        with self._lock:
+            gap_started, self.gap_started = self.gap_started, None
+        if gap_started is not None and any(item.follows for item in items):
+            gap_meter.record(time.perf_counter() - gap_started)
+
+    def _finish(self, items: List[MixerInput], error: Optional[Exception] = None):
+        for item in items:
+            try:
+                item.source.cleanup()
+            except Exception as e:
+                logger.warning(f"Mixer input cleanup failed: {e}")
+            if item.after is not None:
+                self._call(item.after, error)
+
+    @staticmethod
+    def _call(callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"Mixer callback failed: {e}")
+
+    def is_opus(self) -> bool:
+        # AudioPlayer เรียกทุก frame หลัง read() จึงบอกได้ว่า frame ล่าสุดเป็น Opus หรือ PCM
+        return self._opus
+
+    def cleanup(self):
+        with self._lock:
+            self.closed = True
+            items = self._music + self._speech + ([self._next] if self._next else [])
+            self._music, self._speech, self._next = [], [], None
+        self._finish(items)
+
+
+def mix(layers) -> bytes:
+    """รวม frame PCM s16le หลายชั้น ``(bytes, gain)`` เป็น frame เดียว พร้อม clip"""
+    out = None
+    for data, gain in layers:
+        pcm = np.frombuffer(data, dtype=np.int16).reshape(-1, CHANNELS)
+        if isinstance(gain, float):
+            # คูณด้วย float32 ไม่ให้ NumPy ขยายเป็น float64
+            gain = None if gain == 1.0 else np.float32(gain)
+        if out is None:
+            out = pcm.astype(np.float32)
+            if gain is not None:
+                out *= gain
+        elif gain is None:
+            out += pcm
+        else:
+            out += pcm * gain
+    np.clip(out, -32768, 32767, out=out)
+    return out.astype(np.int16).tobytes()
+
+
+# --- ช่วงเงียบระหว่างเพลง ---
+class GapMeter:
+    """สถิติช่วงเงียบระหว่างเพลงที่เล่นต่อกันในคิว (ตั้งแต่ frame สุดท้ายของเพลงก่อนถึง frame แรกของเพลงถัดไป)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.gapless = 0  # สลับภายใน frame เดียว
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.total += seconds
+            self.last = seconds
+            self.max = max(self.max, seconds)
+            if seconds < FRAME_SECONDS:
+                self.gapless += 1
+        logger.debug(f"Track gap: {seconds * 1000:.1f} ms")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'count': self.count,
+                'gapless': self.gapless,
+                'last_ms': round(self.last * 1000, 1),
+                'mean_ms': round(self.total / self.count * 1000, 1) if self.count else 0.0,
+                'max_ms': round(self.max * 1000, 1),
+            }
+
+
+gap_meter = GapMeter()
+
+
+# --- Mixer ต่อ guild ---
+_mixers: Dict[int, Mixer] = {}
+
+
+def _attach(voice_client, add: Callable[[Mixer], bool]) -> Mixer:
+    """ใส่ input เข้า mixer ที่กำลังเล่นของ guild หรือเริ่ม mixer ใหม่ถ้ายังไม่มี/ปิดไปแล้ว"""
+    guild_id = voice_client.guild.id
+    mixer = _mixers.get(guild_id)
+    if mixer is not None and voice_client.source is mixer and add(mixer):
+        return mixer
+    previous = mixer
+    mixer = Mixer()
+    if previous is not None:
+        # เพลงก่อนหน้าจบจน mixer เดิมปิดไปแล้ว: ช่วงเงียบนับต่อจาก mixer เดิม
+        mixer.gap_started = previous.gap_started
+    add(mixer)
+    if voice_client.is_playing() or voice_client.is_paused():
+        # mixer เดิมที่เพิ่งปิด (player thread ยังไม่จบ) หรือ source อื่น
+        voice_client.stop()
+    voice_client.play(mixer)
+    _mixers[guild_id] = mixer
+    return mixer
+
+
+def get_mixer(voice_client) -> Optional[Mixer]:
+    """Mixer ที่กำลังเล่นอยู่ของ voice client นี้ (ถ้ามี)"""
+    if voice_client is None:
+        return None
+    mixer = _mixers.get(voice_client.guild.id)
+    if mixer is None or mixer.closed or voice_client.source is not mixer:
+        return None
+    return mixer
+
+
+def play_music(voice_client, source: discord.AudioSource, *, after: Optional[Callable] = None,
+               duration: float = 0, on_ending: Optional[Callable[[], None]] = None,
+               on_start: Optional[Callable[[], None]] = None, follows: bool = False) -> Mixer:
+    return _attach(voice_client, lambda mixer: mixer.play_music(
+        source, after=after, duration=duration, on_ending=on_ending, on_start=on_start, follows=follows))
+
+
+def queue_next(voice_client, source: discord.AudioSource, *, after: Optional[Callable] = None,
+               duration: float = 0, on_start: Optional[Callable[[], None]] = None) -> bool:
+    """ตั้งเพลงที่ pre-roll ไว้ให้เล่นต่อทันที คืน False ถ้าไม่มีเพลงกำลังเล่น (source ยังเป็นของผู้เรียก)"""
+    mixer = get_mixer(voice_client)
+    return mixer is not None and mixer.set_next(source, after=after, duration=duration, on_start=on_start)
+
+
+def clear_next(voice_client) -> bool:
+    mixer = get_mixer(voice_client)
+    return mixer.clear_next() if mixer is not None else False
+
+
+def play_speech(voice_client, source: discord.AudioSource, *, after: Optional[Callable] = None) -> Mixer:
+    return _attach(voice_client, lambda mixer: mixer.play_speech(source, after=after))
+
+
+def stop_music(voice_client) -> bool:
+    mixer = get_mixer(voice_client)
+    return mixer.stop_music() if mixer is not None else False
+
+
+def music_playing(voice_client) -> bool:
+    mixer = get_mixer(voice_client)
+    return mixer is not None and mixer.music_playing
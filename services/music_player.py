@@ -0,0 +1,490 @@
+import asyncio
+import logging
+import os
+from typing import Dict, Optional, Set
+
+import discord
+import yt_dlp
+
+from services.audio_cache import audio_cache
+from services.audio_source import PLAYBACK_VOLUME, OpusTrack, can_passthrough
+from services.extraction import get_extraction_pool
+from services.loudness import NormalizedVolume, normalize, prepare
+from services.metrics import track_source
+from services.mixer import get_mixer, music_playing, play_music, queue_next, stop_music
+from services.playback import Prefetcher, QueueEntry, spawn
+from services.player_state import PlaybackClock, PlayerStateHub
+from services.playlist import entry_kwargs, iter_playlist
+from services.preroll import PREROLL_SECONDS, PrerolledSource
+from services.title_index import title_index
+from services.track_cache import track_cache
+from services.track_catalog import track_catalog
+from services.track_queue import TrackQueue
+
+logger = logging.getLogger(__name__)
+
+# --- Playback pipeline: entry -> source -> mixer ---
+# ใช้ร่วมกันระหว่างคำสั่งจาก web dashboard (bot.py) และ slash command (cogs/music.py)
+# คิวเก็บแค่ metadata (QueueEntry) audio source ถูกสร้างตอนจะเล่นจริง แล้วส่งเข้า mixer ของ guild
+# สถานะของ player (คิว เพลงปัจจุบัน ตำแหน่งเพลง) มีชุดเดียว web dashboard จึงเห็นเพลงที่เริ่มจากทางไหนก็ได้
+
+# --- การตั้งค่า YTDL และ FFMPEG ---
+# ใช้ yt-dlp ซึ่งเป็นเวอร์ชันที่พัฒนาต่อจาก youtube-dl
+# Enhanced YTDL configuration with fallback strategies and better error handling
+YTDL_OPTIONS = {
+    'format': 'bestaudio[ext=webm]/bestaudio[ext=m4a]/bestaudio/best',
+    'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
+    'restrictfilenames': True,
+    'noplaylist': True,
+    'nocheckcertificate': True,
+    'ignoreerrors': False,
+    'logtostderr': False,
+    'quiet': True,
+    'no_warnings': True,
+    'default_search': 'ytsearch',
+    'extract_flat': False,
+    'retries': 5,
+    'fragment_retries': 5,
+    'retry_sleep_functions': {'http': lambda n: min(4, 0.5 * (2 ** n))},
+    # Enhanced configuration for latest YouTube API with multiple fallbacks
+    'extractor_args': {
+        'youtube': {
+            'player_client': ['ios', 'android', 'mweb', 'web', 'tv_embedded'],
+            'skip': ['dash', 'hls'],
+            'max_comments': [0],
+            'innertube_host': ['youtubei.googleapis.com'],
+        }
+    },
+    'age_limit': None,
+    'geo_bypass': True,
+    'http_headers': {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'en-us,en;q=0.5',
+        'Sec-Fetch-Mode': 'navigate',
+    }
+}
+FFMPEG_OPTIONS = {
+    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5',
+    'options': '-vn'
+}
+
+PLAYLIST_MAX_ENTRIES = int(os.getenv("PLAYLIST_MAX_ENTRIES", "500"))
+PREFETCH_SECONDS = float(os.getenv("PREFETCH_SECONDS", "15"))
+STATE_QUEUE_PREVIEW = int(os.getenv("STATE_QUEUE_PREVIEW", "25"))
+
+ytdl = yt_dlp.YoutubeDL(YTDL_OPTIONS)
+extraction_pool = get_extraction_pool(YTDL_OPTIONS)
+
+
+class YTDLSource(NormalizedVolume):
+    """
+    คลาสสำหรับจัดการการดึงข้อมูลและสตรีมเสียงจาก YouTube
+    """
+    def __init__(self, source, *, data, volume=PLAYBACK_VOLUME, entry: Optional[QueueEntry] = None):
+        super().__init__(source, volume)
+        self.data = data
+        self.entry = entry
+        self.title = data.get('title', 'Unknown Title')
+        self.url = data.get('webpage_url', '')
+        self.duration = data.get('duration', 0)
+
+    @staticmethod
+    def friendly_error(error: Exception) -> ValueError:
+        """แปลง error ของ yt-dlp เป็นข้อความที่ผู้ใช้อ่านเข้าใจ"""
+        error_msg = str(error)
+        if "Failed to extract any player response" in error_msg:
+            return ValueError("วิดีโอนี้ไม่สามารถเล่นได้ อาจจะถูกลบ ถูกตั้งเป็นส่วนตัว หรือถูกบล็อกในภูมิภาคนี้")
+        elif "Video unavailable" in error_msg:
+            return ValueError("วิดีโอไม่พร้อมใช้งาน")
+        elif "Private video" in error_msg:
+            return ValueError("วิดีโอนี้เป็นวิดีโอส่วนตัว")
+        elif "age-restricted" in error_msg.lower():
+            return ValueError("วิดีโอนี้มีการจำกัดอายุ")
+        else:
+            return ValueError(f"ไม่สามารถเล่นวิดีโอได้: {error_msg}")
+
+    @classmethod
+    async def resolve(cls, url, *, stream=True, guild_id=None) -> dict:
+        """ดึงข้อมูลเพลง (ผ่าน cache) โดยยังไม่สร้าง ffmpeg process"""
+        async def extract(target):
+            logger.info(f"Extracting info for URL: {target}")
+            data = await extraction_pool.extract(target, download=not stream, guild_id=guild_id)
+
+            if not data:
+                raise ValueError("Could not extract video information")
+
+            if 'entries' in data:
+                # ถ้าเป็น playlist ให้เลือกวิดีโอแรก
+                if not data['entries']:
+                    raise ValueError("Playlist is empty")
+                data = data['entries'][0]
+
+            if not data.get('url'):
+                raise ValueError("No audio URL found")
+            track_catalog.record_track(data)
+            return data
+
+        try:
+            if stream:
+                # เพลงที่อยู่ใน audio cache หรือเคย resolve แล้วจะไม่เรียก yt-dlp ซ้ำ
+                data = audio_cache.info(track_cache.video_id(url)) or await track_cache.resolve(url, extract)
+                prepare(data, before_options=FFMPEG_OPTIONS['before_options'])
+                title_index.add_info(data)
+                return data
+            return await extract(url)
+        except Exception as e:
+            logger.error(f"Error in YTDLSource.resolve: {e}")
+            raise cls.friendly_error(e)
+
+    @classmethod
+    def from_data(cls, data, *, stream=True, entry: Optional[QueueEntry] = None):
+        def open_source(factory, **kwargs):
+            if stream:
+                # เล่นจาก audio cache ถ้ามี หรือ tee ลง cache ถ้าเพลงถูกเล่นบ่อยพอ
+                source = audio_cache.open(data, factory, **FFMPEG_OPTIONS, **kwargs)
+            else:
+                source = factory(ytdl.prepare_filename(data), **FFMPEG_OPTIONS, **kwargs)
+            return track_source(source, 'music')
+
+        if can_passthrough(data):
+            # ต้นทางเป็น Opus อยู่แล้ว: ffmpeg copy packet ไม่ต้องถอด/เข้ารหัสใหม่
+            logger.info(f"Created Opus passthrough source for: {data.get('title', 'Unknown')}")
+            return open_source(OpusTrack, data=data, entry=entry)
+        source = open_source(discord.FFmpegPCMAudio)
+        logger.info(f"Successfully created audio source for: {data.get('title', 'Unknown')}")
+        return normalize(cls(source, data=data, entry=entry), data, before_options=FFMPEG_OPTIONS['before_options'])
+
+    @classmethod
+    async def from_entry(cls, entry: QueueEntry, *, guild_id=None):
+        """สร้าง audio source ตอนจะเล่นจริง (just in time)"""
+        data = await cls.resolve(entry.target, guild_id=guild_id)
+        entry.update(data)
+        return cls.from_data(data, entry=entry)
+
+    @classmethod
+    async def from_url(cls, url, *, loop=None, stream=True, guild_id=None):
+        data = await cls.resolve(url, stream=stream, guild_id=guild_id)
+        return cls.from_data(data, stream=stream)
+
+
+def entry_state(entry: QueueEntry) -> dict:
+    return {
+        'title': entry.title,
+        'duration': entry.duration,
+        'requester': entry.requester,
+        'url': entry.webpage_url,
+    }
+
+
+class MusicPlayer:
+    """
+    คิว เพลงปัจจุบัน และตำแหน่งเพลงของทุก guild พร้อมขั้นตอนเล่นเพลงต่อกัน
+
+    Methods that touch the state must run on the event loop; callbacks from
+    the voice thread hop back with ``call_soon_threadsafe``. ``state``
+    publishes ``snapshot(guild_id)`` to the web dashboard; call
+    ``notify(guild_id)`` after changing a player outside these methods.
+    ``bind(bot)`` must be called before anything is played.
+    """
+
+    def __init__(self, bot=None, *, prefetch_seconds: float = PREFETCH_SECONDS,
+                 queue_preview: int = STATE_QUEUE_PREVIEW):
+        self.bot = bot
+        self.queue_preview = queue_preview
+        self.state = PlayerStateHub(self.snapshot, self.active_guilds)
+        self.queues: Dict[int, TrackQueue] = {}
+        self.current_tracks: Dict[int, Optional[QueueEntry]] = {}
+        self.playback_clocks: Dict[int, PlaybackClock] = {}
+        self.prefetcher = Prefetcher(lead_seconds=prefetch_seconds)
+        self.playlist_tasks: Dict[int, set] = {}
+
+    def bind(self, bot):
+        self.bot = bot
+
+    def notify(self, guild_id: int, *, resync: bool = False):
+        self.state.notify(guild_id, resync=resync)
+
+    def queue(self, guild_id: int) -> TrackQueue:
+        return self.queues.setdefault(guild_id, TrackQueue())
+
+    def clock(self, guild_id: int) -> PlaybackClock:
+        return self.playback_clocks.setdefault(guild_id, PlaybackClock())
+
+    def voice_client(self, guild_id: int):
+        guild = self.bot.get_guild(guild_id)
+        return guild.voice_client if guild else None
+
+    # --- สถานะ player สำหรับ web dashboard (ส่งเป็น delta ผ่าน local channel) ---
+    def snapshot(self, guild_id: int) -> Optional[dict]:
+        """สถานะปัจจุบันของ player ใน guild หรือ None ถ้าไม่มี player"""
+        voice_client = self.voice_client(guild_id)
+        entry = self.current_tracks.get(guild_id)
+        queue = self.queues.get(guild_id)
+        if voice_client is None and entry is None and not queue:
+            self.playback_clocks.pop(guild_id, None)
+            return None
+        clock = self.clock(guild_id)
+        paused = bool(voice_client and voice_client.is_paused())
+        # pause/resume อาจมาจากทางอื่นที่ไม่ได้อัปเดต clock
+        if paused:
+            clock.pause()
+        else:
+            clock.resume()
+        return {
+            'connected': voice_client is not None,
+            'channel': voice_client.channel.name if voice_client and voice_client.channel else None,
+            'now_playing': entry_state(entry) if entry else None,
+            'paused': paused,
+            **clock.as_state(),
+            'queue_length': len(queue) if queue else 0,
+            'queue': [entry_state(e) for e in queue.slice(0, self.queue_preview)] if queue else [],
+        }
+
+    def active_guilds(self) -> Set[int]:
+        guild_ids = {voice_client.guild.id for voice_client in self.bot.voice_clients} if self.bot else set()
+        guild_ids.update(guild_id for guild_id, entry in self.current_tracks.items() if entry)
+        guild_ids.update(guild_id for guild_id, queue in self.queues.items() if queue)
+        return guild_ids
+
+    # --- รับเพลงเข้าคิว ---
+    def enqueue(self, guild_id: int, entry: QueueEntry, voice_client, text_channel, *, timer=None) -> bool:
+        """
+        เพิ่มเพลงเข้าคิว ถ้าไม่มีเพลงเล่นอยู่จะเริ่มเล่นทันที
+
+        Returns True if the entry started playing, False if it waits in the
+        queue (its metadata is then resolved in the background).
+        """
+        busy = music_playing(voice_client) or self.current_tracks.get(guild_id)
+        self.queue(guild_id).append(entry)
+        if busy:
+            spawn(self.resolve_entry(entry, guild_id))
+            self.notify(guild_id)
+            logger.info(f"Added {entry.title} to queue for guild {guild_id}")
+            return False
+        entry.timer = timer
+        self.start_next_track(guild_id, text_channel)
+        return True
+
+    def add_playlist(self, guild_id: int, url: str, text_channel, *, requester: str = '',
+                     requester_id: Optional[int] = None) -> asyncio.Task:
+        task = spawn(self.ingest_playlist(guild_id, url, text_channel, requester=requester, requester_id=requester_id))
+        self.playlist_tasks.setdefault(guild_id, set()).add(task)
+        return task
+
+    def clear(self, guild_id: int):
+        """ล้างคิวและเพลงปัจจุบัน (ผู้เรียกหยุดเสียงใน voice client เอง)"""
+        if self.queues.get(guild_id):
+            self.queues[guild_id].clear()
+        self.current_tracks[guild_id] = None
+        self.playback_clocks.pop(guild_id, None)
+        self.prefetcher.cancel(guild_id)
+        self.cancel_playlists(guild_id)
+        self.notify(guild_id)
+
+    def close(self):
+        for guild_id in list(self.queues):
+            self.prefetcher.cancel(guild_id)
+        for guild_id in list(self.playlist_tasks):
+            self.cancel_playlists(guild_id)
+
+    async def resolve_entry(self, entry: QueueEntry, guild_id: int):
+        """เติม metadata ของเพลงในคิว (ผลลัพธ์ถูกเก็บใน track cache ไว้ใช้ตอนเล่น)"""
+        try:
+            data = await YTDLSource.resolve(entry.target, guild_id=guild_id)
+            entry.update(data)
+            if guild_id in self.queues:
+                self.queues[guild_id].touch()
+            self.notify(guild_id)
+        except ValueError as e:
+            logger.warning(f"Could not resolve queued track {entry.query}: {e}")
+
+    # --- เพลงถัดไป: prefetch / pre-roll ---
+    async def prefetch_next(self, guild_id: int, text_channel):
+        """resolve เพลงถัดไปล่วงหน้าก่อนเพลงปัจจุบันจบ แล้ว pre-roll ไว้ให้เล่นต่อได้ทันที"""
+        queue = self.queues.get(guild_id)
+        if queue:
+            entry = queue[0]
+            await self.resolve_entry(entry, guild_id)
+            await self.preroll_next(guild_id, entry, text_channel)
+
+    async def preroll_next(self, guild_id: int, entry: QueueEntry, text_channel):
+        """เริ่ม ffmpeg ของเพลงถัดไปและบัฟเฟอร์ frame แรกๆ ไว้ใน mixer (ไม่ใช้ตอน crossfade)"""
+        voice_client = self.voice_client(guild_id)
+        mixer = get_mixer(voice_client)
+        if PREROLL_SECONDS <= 0 or mixer is None or mixer.crossfade > 0:
+            return
+        try:
+            player = await YTDLSource.from_entry(entry, guild_id=guild_id)
+        except ValueError as e:
+            logger.warning(f"Could not pre-roll {entry.query}: {e}")
+            return
+        queue = self.queues.get(guild_id)
+        if not queue or queue[0] is not entry:
+            player.cleanup()
+            return
+        source = PrerolledSource(player)
+        after_playing, _ = self.track_callbacks(guild_id, entry, text_channel)
+        on_start = lambda: self.bot.loop.call_soon_threadsafe(self.handoff_started, guild_id, entry, text_channel)
+        if not queue_next(voice_client, source, after=after_playing, duration=entry.duration, on_start=on_start):
+            source.cleanup()
+
+    def handoff_started(self, guild_id: int, entry: QueueEntry, text_channel):
+        """mixer สลับไปเล่นเพลงที่ pre-roll ไว้แล้ว (ต้องเรียกบน event loop)"""
+        queue = self.queues.get(guild_id)
+        self.current_tracks[guild_id] = entry
+        if not queue or queue[0] is not entry:
+            # คิวถูกแก้หลัง pre-roll: หยุดเพลงนี้ after ของมันจะเล่นเพลงถัดไปตามคิวจริง
+            voice_client = self.voice_client(guild_id)
+            if voice_client:
+                stop_music(voice_client)
+            return
+        queue.popleft()
+        self.prefetcher.cancel(guild_id)
+        self.playback_clocks.pop(guild_id, None)
+        spawn(self.track_started(guild_id, entry, text_channel))
+
+    # --- เล่นเพลงถัดไป ---
+    def play_next(self, guild_id: int, entry: QueueEntry, text_channel):
+        """เล่นเพลงถัดไปหลัง ``entry`` จบ (เรียกจาก voice thread ได้)"""
+        self.bot.loop.call_soon_threadsafe(self.advance_queue, guild_id, entry, text_channel)
+
+    def advance_queue(self, guild_id: int, entry: QueueEntry, text_channel):
+        # เพลงถัดไปอาจเริ่มไปแล้วตอน crossfade/pre-roll หรือเพลงถูก stop ไปแล้ว
+        if self.current_tracks.get(guild_id) is entry:
+            self.start_next_track(guild_id, text_channel, follows=True)
+
+    def crossfade_next(self, guild_id: int, entry: QueueEntry, text_channel):
+        """เพลงใกล้จบ: เริ่มเพลงถัดไปเลยเพื่อให้ mixer crossfade (ถ้าคิวว่างจะรอเพลงจบตามปกติ)"""
+        if self.queues.get(guild_id):
+            self.advance_queue(guild_id, entry, text_channel)
+
+    def start_next_track(self, guild_id: int, text_channel, follows: bool = False):
+        """
+        หยิบเพลงถัดไปจากคิวแล้วเริ่ม resolve (ต้องเรียกบน event loop)
+
+        The entry is popped and marked current synchronously, so callers that check
+        ``current_tracks`` right after never start a second track.
+        """
+        self.prefetcher.cancel(guild_id)
+        self.playback_clocks.pop(guild_id, None)
+        queue = self.queues.get(guild_id)
+        if not queue:
+            self.current_tracks[guild_id] = None
+            self.notify(guild_id)
+            logger.info(f"Queue is empty for guild {guild_id}")
+            return
+        entry = queue.popleft()
+        self.current_tracks[guild_id] = entry
+        self.notify(guild_id)
+        spawn(self.play_entry(guild_id, entry, text_channel, follows=follows))
+
+    def track_callbacks(self, guild_id: int, entry: QueueEntry, text_channel):
+        """callback ``after`` และ ``on_ending`` ของเพลงใน mixer (ถูกเรียกจาก voice thread)"""
+        def after_playing(error):
+            if error:
+                logger.error(f"Player error: {error}")
+            self.play_next(guild_id, entry, text_channel)
+
+        def on_ending():
+            self.bot.loop.call_soon_threadsafe(self.crossfade_next, guild_id, entry, text_channel)
+
+        return after_playing, on_ending
+
+    async def track_started(self, guild_id: int, entry: QueueEntry, text_channel):
+        """อัปเดตสถานะหลังเพลงเริ่มเล่น และตั้งเวลา prefetch เพลงถัดไป"""
+        self.clock(guild_id).start()
+        self.notify(guild_id)
+        track_catalog.record_play(guild_id, entry.video_id, entry.title, entry.duration)
+        self.prefetcher.schedule(guild_id, entry.duration, lambda: self.prefetch_next(guild_id, text_channel))
+
+        # ส่งข้อความใน channel
+        if text_channel:
+            embed = discord.Embed(
+                title="🎵 กำลังเล่นเพลง",
+                description=entry.title,
+                color=discord.Color.blue()
+            )
+            await text_channel.send(embed=embed)
+        logger.info(f"Now playing: {entry.title} in guild {guild_id}")
+
+    async def play_entry(self, guild_id: int, entry: QueueEntry, text_channel, follows: bool = False):
+        """สร้าง audio source ของเพลงแบบ just in time แล้วเริ่มเล่น"""
+        try:
+            if not self.voice_client(guild_id):
+                logger.warning(f"No voice client found for guild {guild_id}")
+                self.current_tracks[guild_id] = None
+                self.notify(guild_id)
+                return
+
+            timer, entry.timer = entry.timer, None
+            try:
+                data = await YTDLSource.resolve(entry.target, guild_id=guild_id)
+                entry.update(data)
+                if timer:
+                    timer.phase('extract')
+                player = YTDLSource.from_data(data, entry=entry)
+                if timer:
+                    timer.phase('ffmpeg_spawn')
+            except ValueError as e:
+                logger.error(f"Skipping {entry.query} in guild {guild_id}: {e}")
+                if self.current_tracks.get(guild_id) is not entry:
+                    return
+                self.start_next_track(guild_id, text_channel)
+                if text_channel:
+                    await text_channel.send(f"ข้ามเพลง **{entry.title}**: {e}")
+                return
+
+            # ถูกสั่ง stop ระหว่างรอ resolve
+            voice_client = self.voice_client(guild_id)
+            if self.current_tracks.get(guild_id) is not entry or not voice_client:
+                player.cleanup()
+                return
+
+            after_playing, on_ending = self.track_callbacks(guild_id, entry, text_channel)
+            # follows: เพลงก่อนหน้าจบเอง ช่วงเงียบระหว่างสองเพลงถูกนับใน gap meter
+            play_music(voice_client, player, after=after_playing, duration=entry.duration,
+                       on_ending=on_ending, on_start=timer.first_audio if timer else None, follows=follows)
+            await self.track_started(guild_id, entry, text_channel)
+        except Exception as e:
+            logger.error(f"Error in play_next: {e}")
+            self.current_tracks[guild_id] = None
+            self.notify(guild_id)
+
+    # --- เพลย์ลิสต์ ---
+    async def ingest_playlist(self, guild_id: int, url: str, text_channel, *, requester: str = '',
+                              requester_id: Optional[int] = None):
+        """โหลดเพลย์ลิสต์แบบ streaming เพลงแรกเริ่มเล่นได้ก่อนโหลดครบ"""
+        added = 0
+        try:
+            async for item in iter_playlist(url, YTDL_OPTIONS, pool=extraction_pool, guild_id=guild_id,
+                                            max_entries=PLAYLIST_MAX_ENTRIES):
+                kwargs = entry_kwargs(item)
+                if not kwargs:
+                    continue
+                self.queue(guild_id).append(QueueEntry(requester=requester, requester_id=requester_id, **kwargs))
+                title_index.add_info(kwargs)
+                track_catalog.record_track(kwargs)
+                added += 1
+                self.notify(guild_id)
+                voice_client = self.voice_client(guild_id)
+                if voice_client and not music_playing(voice_client) and not self.current_tracks.get(guild_id):
+                    self.start_next_track(guild_id, text_channel)
+        except Exception as e:
+            logger.error(f"Playlist ingestion failed for guild {guild_id}: {e}")
+            if text_channel:
+                await text_channel.send(f"โหลดเพลย์ลิสต์ไม่สำเร็จ: {YTDLSource.friendly_error(e)}")
+            return
+        finally:
+            self.playlist_tasks.get(guild_id, set()).discard(asyncio.current_task())
+        logger.info(f"Queued {added} playlist tracks for guild {guild_id}")
+        if text_channel:
+            await text_channel.send(f"📃 เพิ่ม {added} เพลงจากเพลย์ลิสต์แล้ว")
+
+    def cancel_playlists(self, guild_id: int):
+        for task in self.playlist_tasks.pop(guild_id, set()):
+            task.cancel()
+
+
+# ร่วมกันทั้ง bot.py (คำสั่งจาก web) และ cogs/music.py (slash command)
+music_player = MusicPlayer()
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.track_cache import extract_video_id, watch_url
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class QueueEntry:
+    """
+    รายการในคิวแบบ metadata อย่างเดียว
+
+    ไม่มี stream URL หรือ ffmpeg process ผูกอยู่ สิ่งเหล่านั้นถูกสร้างตอนจะเล่นจริง
+    """
+    query: str
+    requester: str = ''
+    requester_id: Optional[int] = None
+    video_id: Optional[str] = None
+    title: Optional[str] = None
+    duration: int = 0
+    webpage_url: Optional[str] = None
+    # PlayTimer ของคำสั่ง play ที่เริ่มเพลงนี้ทันที (ไม่ได้รอในคิว)
+    timer: Optional[Any] = field(default=None, repr=False, compare=False)
+    # เพิ่มขึ้นทุกครั้งที่ update() เปลี่ยน metadata ให้ cache ที่แสดงรายการนี้รู้ว่าต้องสร้างใหม่
+    revision: int = field(default=0, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.video_id is None:
+            self.video_id = extract_video_id(self.query)
+        if self.title is None:
+            self.title = self.query
+
+    @property
+    def target(self) -> str:
+        """What to hand to yt-dlp: the known page URL, else the raw query"""
+        if self.webpage_url:
+            return self.webpage_url
+        if self.video_id:
+            return watch_url(self.video_id)
+        return self.query
+
+    @property
+    def resolved(self) -> bool:
+        return self.webpage_url is not None
+
+    def update(self, data: Dict):
+        """Fill metadata from a resolved yt-dlp info dict"""
+        before = (self.video_id, self.title, self.duration, self.webpage_url)
+        self.video_id = data.get('id', self.video_id)
+        self.title = data.get('title') or self.title
+        self.duration = data.get('duration') or self.duration
+        self.webpage_url = data.get('webpage_url') or self.webpage_url
+        if (self.video_id, self.title, self.duration, self.webpage_url) != before:
+            self.revision += 1
+
+
+class Prefetcher:
+    """
+    resolve เพลงถัดไปล่วงหน้าก่อนเพลงปัจจุบันจบ ``lead_seconds`` วินาที
+
+    One pending prefetch per guild; scheduling again replaces the old one.
+    """
+
+    def __init__(self, lead_seconds: float = 15.0):
+        self.lead_seconds = lead_seconds
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def schedule(self, guild_id: int, duration: float, fetch: Callable[[], Awaitable]):
+        self.cancel(guild_id)
+        delay = max(0.0, (duration or 0) - self.lead_seconds)
+        self._tasks[guild_id] = asyncio.ensure_future(self._run(guild_id, delay, fetch))
+
+    async def _run(self, guild_id: int, delay: float, fetch: Callable[[], Awaitable]):
+        try:
+            await asyncio.sleep(delay)
+            await fetch()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Prefetch failed for guild {guild_id}: {e}")
+        finally:
+            if self._tasks.get(guild_id) is asyncio.current_task():
+                del self._tasks[guild_id]
+
+    def cancel(self, guild_id: int):
+        task = self._tasks.pop(guild_id, None)
+        if task and not task.done():
+            task.cancel()
+
+
+_background_tasks = set()
+
+
+def spawn(coro) -> asyncio.Task:
+    """Start a fire-and-forget task and keep a reference until it finishes"""
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
@@ -0,0 +1,409 @@
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Set
+
+from services.command_bus import DEFAULT_ADDRESS, SECRET_HEADER, LocalCommandBus, default_secret
+
+logger = logging.getLogger(__name__)
+
+# --- Live player state: บอท -> webapp -> browser ---
+# บอทเผยแพร่สถานะ player ของแต่ละ guild เป็น delta (เฉพาะ field ที่เปลี่ยน) ผ่าน local channel
+# webapp ต่อเข้าบอทแค่ connection เดียวแล้วกระจายต่อให้ทุกแท็บผ่าน Server-Sent Events
+# ตำแหน่งเพลงส่งเป็น started_at (เวลาที่เริ่มเล่นหลังหักช่วง pause) ให้ browser คำนวณเอง
+# จึงไม่ต้องส่ง event ทุกวินาที
+
+STATE_PATH = "/state"
+KEEPALIVE_INTERVAL = 15.0
+
+
+def diff_state(old: Optional[Dict], new: Dict) -> Dict:
+    """Top-level fields of ``new`` that differ from ``old``"""
+    if not old:
+        return dict(new)
+    return {key: value for key, value in new.items() if old.get(key) != value}
+
+
+class PlaybackClock:
+    """Tracks the elapsed position of the current track across pauses"""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self.started_at: Optional[float] = None
+        self.paused_at: Optional[float] = None
+
+    def start(self, offset: float = 0.0):
+        self.started_at = self._clock() - offset
+        self.paused_at = None
+
+    def pause(self):
+        if self.started_at is not None and self.paused_at is None:
+            self.paused_at = self._clock()
+
+    def resume(self):
+        if self.paused_at is not None:
+            self.started_at += self._clock() - self.paused_at
+            self.paused_at = None
+
+    def stop(self):
+        self.started_at = None
+        self.paused_at = None
+
+    def position(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.paused_at or self._clock()) - self.started_at
+
+    def as_state(self) -> Dict:
+        """Fields that only change on start, pause or resume"""
+        return {
+            'started_at': round(self.started_at, 3) if self.started_at is not None else None,
+            'paused_position': round(self.position(), 3) if self.paused_at is not None else None,
+        }
+
+
+# --- ฝั่งบอท ---
+class StateSubscription:
+    """One consumer of ``PlayerStateHub`` events; ``get()`` returns None once it must reconnect"""
+
+    def __init__(self, max_pending: int):
+        self.queue: asyncio.Queue = asyncio.Queue(max_pending)
+        self.closed = False
+
+    def push(self, event) -> bool:
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.closed = True  # ช้าเกินไป ให้ต่อใหม่แล้วรับ snapshot เต็ม
+            return False
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            try:
+                self.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+
+    async def get(self):
+        if self.closed and self.queue.empty():
+            return None
+        return await self.queue.get()
+
+
+class PlayerStateHub:
+    """
+    Publishes per-guild player state as deltas to subscribers
+
+    ``snapshot(guild_id)`` builds the current state dict of a guild, or None
+    if it has no player. ``guilds()`` lists the guilds that may have one.
+    Call ``notify(guild_id)`` after anything that changes a player. Notifies
+    in the same loop iteration are coalesced into one diff per guild. A
+    periodic sweep catches changes made by code paths that do not notify.
+    Nothing is computed while there are no subscribers.
+    """
+
+    def __init__(self, snapshot: Callable[[int], Optional[Dict]], guilds: Callable[[], Iterable[int]], *,
+                 sweep_interval: float = 2.0, max_pending: int = 1000):
+        self.snapshot = snapshot
+        self.guilds = guilds
+        self.sweep_interval = sweep_interval
+        self.max_pending = max_pending
+        self._states: Dict[str, Dict] = {}
+        self._dirty: Set[int] = set()
+        self._resync: Set[int] = set()
+        self._flush_handle: Optional[asyncio.Handle] = None
+        self._subscribers: Set[StateSubscription] = set()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.seq = 0
+        self.published = 0
+
+    def notify(self, guild_id: int, *, resync: bool = False):
+        """บันทึกว่า guild นี้มีการเปลี่ยนแปลง (เรียกบน event loop)"""
+        if not self._subscribers:
+            return
+        self._dirty.add(guild_id)
+        if resync:
+            self._resync.add(guild_id)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_event_loop().call_soon(self._flush)
+
+    def subscribe(self) -> StateSubscription:
+        """New subscriber; its first events are full snapshots of every active guild"""
+        subscription = StateSubscription(self.max_pending)
+        if not self._subscribers:
+            self._states.clear()  # ไม่มีใครฟังอยู่ state ที่เก็บไว้อาจเก่าแล้ว
+            for guild_id in self.guilds():
+                self._update(guild_id, publish=False)
+            self._sweeper = asyncio.ensure_future(self._sweep())
+        subscription.push({'type': 'reset', 'seq': self.seq})
+        for guild_id, state in self._states.items():
+            subscription.push({'type': 'state', 'seq': self.seq, 'guild_id': guild_id, 'reset': True, 'changes': state})
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: StateSubscription):
+        subscription.close()
+        self._subscribers.discard(subscription)
+        if not self._subscribers and self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    def close(self):
+        for subscription in list(self._subscribers):
+            self.unsubscribe(subscription)
+
+    def _flush(self):
+        self._flush_handle = None
+        dirty, self._dirty = self._dirty, set()
+        for guild_id in dirty:
+            self._update(guild_id)
+        self._resync.clear()
+
+    def _update(self, guild_id: int, publish: bool = True):
+        key = str(guild_id)
+        try:
+            new = self.snapshot(guild_id)
+        except Exception as e:
+            logger.error(f"Failed to build player state for guild {guild_id}: {e}")
+            return
+        old = self._states.get(key)
+        if new is None:
+            if old is not None:
+                del self._states[key]
+                if publish:
+                    self._publish({'type': 'removed', 'guild_id': key})
+            return
+        self._states[key] = new
+        if not publish:
+            return
+        if guild_id in self._resync:
+            self._publish({'type': 'state', 'guild_id': key, 'reset': True, 'changes': new})
+            return
+        changes = diff_state(old, new)
+        if changes:
+            self._publish({'type': 'state', 'guild_id': key, 'reset': old is None, 'changes': changes})
+
+    def _publish(self, event: Dict):
+        self.seq += 1
+        self.published += 1
+        event['seq'] = self.seq
+        for subscription in list(self._subscribers):
+            if not subscription.push(event):
+                logger.warning("Player state subscriber fell behind, dropping it")
+                self.unsubscribe(subscription)
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            for guild_id in set(self.guilds()) | {int(key) for key in self._states}:
+                self._dirty.add(guild_id)
+            self._flush()
+
+    def state(self, guild_id: int) -> Optional[Dict]:
+        return self._states.get(str(guild_id))
+
+    def stats(self) -> Dict:
+        return {'subscribers': len(self._subscribers), 'guilds': len(self._states),
+                'published': self.published, 'seq': self.seq}
+
+
+async def stream_state(hub: PlayerStateHub, response, *, keepalive: float = KEEPALIVE_INTERVAL):
+    """เขียน event ของ hub ลง aiohttp StreamResponse เป็น NDJSON จนกว่า client จะตัดการเชื่อมต่อ"""
+    subscription = hub.subscribe()
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), keepalive)
+            except asyncio.TimeoutError:
+                await response.write(b"\n")
+                continue
+            if event is None:
+                break
+            await response.write(json.dumps(event, ensure_ascii=False).encode() + b"\n")
+    except (ConnectionResetError, asyncio.CancelledError):
+        pass
+    finally:
+        hub.unsubscribe(subscription)
+
+
+# --- ฝั่ง webapp ---
+class _Listener:
+    """Listener consumed from a worker thread (Flask / WSGI)"""
+
+    def __init__(self, max_pending: int):
+        self.queue: "queue.Queue" = queue.Queue(max_pending)
+        self.stale = False
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.stale = True
+
+    def drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+class _AsyncListener:
+    """Listener consumed by a coroutine on ``loop`` (ASGI)"""
+
+    def __init__(self, max_pending: int, loop: asyncio.AbstractEventLoop):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.max_pending = max_pending
+        self.loop = loop
+        self.stale = False
+
+    def put(self, item):
+        try:
+            self.loop.call_soon_threadsafe(self._put, item)
+        except RuntimeError:
+            pass  # event loop ปิดไปแล้ว
+
+    def _put(self, item):
+        if self.queue.qsize() >= self.max_pending:
+            self.stale = True
+        elif not self.stale:
+            self.queue.put_nowait(item)
+
+    def drain(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+
+class StateRelay:
+    """
+    One upstream connection to the bot's state stream, fanned out to any number of browser tabs
+
+    ``subscribe(guild_id)`` returns a listener whose ``queue`` receives
+    ``(event_name, data)`` tuples. With ``loop`` the queue is an
+    ``asyncio.Queue`` fed on that loop. A listener that falls behind is marked
+    stale and has to resynchronise from ``resync()``. The upstream thread
+    starts on the first subscription and reconnects with a fixed delay.
+    """
+
+    def __init__(self, address: str = DEFAULT_ADDRESS, *, secret: Optional[str] = None,
+                 retry_interval: float = 2.0, max_pending: int = 256):
+        self.bus = LocalCommandBus(address, secret=secret if secret is not None else default_secret(),
+                                   timeout=KEEPALIVE_INTERVAL * 3)
+        self.retry_interval = retry_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._states: Dict[str, Dict] = {}
+        self._listeners: Dict[str, Set[_Listener]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.connected = False
+
+    def subscribe(self, guild_id: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        listener = _AsyncListener(self.max_pending, loop) if loop is not None else _Listener(self.max_pending)
+        with self._lock:
+            self._listeners.setdefault(str(guild_id), set()).add(listener)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='state-relay', daemon=True)
+                self._thread.start()
+        return listener
+
+    def unsubscribe(self, guild_id: str, listener):
+        with self._lock:
+            listeners = self._listeners.get(str(guild_id))
+            if listeners is not None:
+                listeners.discard(listener)
+                if not listeners:
+                    del self._listeners[str(guild_id)]
+
+    def snapshot(self, guild_id: str) -> Dict:
+        with self._lock:
+            return self._snapshot(str(guild_id))
+
+    def _snapshot(self, guild_id: str) -> Dict:
+        return {'connected': self.connected, 'server_time': time.time(),
+                'state': dict(self._states.get(guild_id) or {})}
+
+    def resync(self, guild_id: str, listener) -> Dict:
+        """ล้าง event ที่ค้างแล้วคืน snapshot ล่าสุด (สำหรับ listener ที่ตามไม่ทัน)"""
+        with self._lock:
+            listener.drain()
+            listener.stale = False
+            return self._snapshot(str(guild_id))
+
+    def close(self):
+        self._stop.set()
+
+    def _fan_out(self, guild_id: Optional[str], name: str, data: Dict):
+        targets = self._listeners.get(guild_id, ()) if guild_id is not None else \
+            [listener for listeners in self._listeners.values() for listener in listeners]
+        for listener in targets:
+            if not listener.stale:
+                listener.put((name, data))
+
+    def _set_connected(self, connected: bool):
+        with self._lock:
+            if self.connected == connected:
+                return
+            self.connected = connected
+            self._fan_out(None, 'status', {'connected': connected})
+
+    def apply(self, event: Dict):
+        """Apply one upstream event to the local copy and forward it to the guild's listeners"""
+        kind = event.get('type')
+        with self._lock:
+            if kind == 'reset':
+                # บอทส่ง snapshot ชุดใหม่ตามมา guild ที่ไม่อยู่ในชุดนี้ถือว่าไม่มี player แล้ว
+                for guild_id in list(self._states):
+                    self._fan_out(guild_id, 'removed', {})
+                self._states.clear()
+                return
+            guild_id = event.get('guild_id')
+            if guild_id is None:
+                return
+            if kind == 'removed':
+                self._states.pop(guild_id, None)
+                self._fan_out(guild_id, 'removed', {})
+            elif kind == 'state':
+                changes = event.get('changes', {})
+                if event.get('reset'):
+                    self._states[guild_id] = dict(changes)
+                else:
+                    self._states.setdefault(guild_id, {}).update(changes)
+                if event.get('reset'):
+                    self._fan_out(guild_id, 'snapshot', self._snapshot(guild_id))
+                else:
+                    self._fan_out(guild_id, 'delta', {'server_time': time.time(), 'changes': changes})
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._stream()
+            except Exception as e:
+                logger.debug(f"Player state stream unavailable: {e}")
+            self._set_connected(False)
+            self._stop.wait(self.retry_interval)
+
+    def _stream(self):
+        conn = self.bus.open_connection()
+        try:
+            conn.request("GET", STATE_PATH, headers={SECRET_HEADER: self.bus.secret})
+            response = conn.getresponse()
+            if response.status != 200:
+                raise ConnectionError(f"state stream returned {response.status}")
+            self._set_connected(True)
+            while not self._stop.is_set():
+                line = response.readline()
+                if not line:
+                    break  # บอทปิด stream
+                line = line.strip()
+                if line:
+                    self.apply(json.loads(line))
+        finally:
+            conn.close()
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import threading
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+import yt_dlp
+
+from services.extraction import ExtractionPool
+from services.track_cache import YOUTUBE_HOSTS
+
+logger = logging.getLogger(__name__)
+
+# --- Streaming playlist ingestion ---
+# ใช้ flat extraction (ไม่ resolve ทีละวิดีโอ) และส่งรายการออกมาทีละเพลงผ่าน async generator
+# เพลงแรกเริ่มเล่นได้ขณะที่ yt-dlp ยังโหลดหน้าถัดไปของเพลย์ลิสต์อยู่
+# งานโหลดเพลย์ลิสต์ใช้ worker ของ ExtractionPool (คิวต่อ guild เดียวกับ /play) ไม่สร้าง thread เอง
+
+PLAYLIST_OVERRIDES = {
+    'extract_flat': 'in_playlist',
+    'noplaylist': False,
+    'lazy_playlist': True,
+    'skip_download': True,
+}
+
+# เก็บแค่ฟิลด์ที่ QueueEntry ใช้ ไม่เก็บ info dict ของแต่ละวิดีโอ
+FLAT_FIELDS = ('id', 'title', 'duration', 'url')
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def is_playlist_url(query: str) -> bool:
+    """True สำหรับลิงก์เพลย์ลิสต์ YouTube (ไม่รวม watch?v=...&list=...)"""
+    try:
+        parsed = urlparse(query.strip())
+    except ValueError:
+        return False
+    if (parsed.hostname or '').lower() not in YOUTUBE_HOSTS:
+        return False
+    params = parse_qs(parsed.query)
+    return parsed.path == '/playlist' and bool(params.get('list'))
+
+
+async def iter_playlist(url: str, ytdl_options: Dict, *, pool: ExtractionPool, guild_id=None,
+                        max_entries: int = 500, buffer: int = 50) -> AsyncIterator[Dict]:
+    """
+    Yield flat playlist entries as yt-dlp pages them in
+
+    The producer walks yt-dlp's lazy entry generator as one ``pool.run`` job
+    for ``guild_id``, so it waits its turn with the guild's other extractions
+    and holds a single worker while it runs. At most ``buffer`` entries wait
+    for the consumer, so memory stays flat whatever the playlist length.
+    Closing the generator early stops the producer and frees the worker.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = threading.Semaphore(buffer)
+    stop = threading.Event()
+
+    def deliver(item):
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+        except RuntimeError:
+            stop.set()  # event loop ปิดไปแล้ว
+
+    def produce():
+        try:
+            ytdl = yt_dlp.YoutubeDL({**ytdl_options, **PLAYLIST_OVERRIDES})
+            info = ytdl.extract_info(url, download=False, process=False)
+            entries = (info or {}).get('entries')
+            if entries is None:
+                entries = [info] if info else []
+            for count, entry in enumerate(entries):
+                if count >= max_entries:
+                    break
+                while not slots.acquire(timeout=0.5):
+                    if stop.is_set():
+                        return
+                if stop.is_set():
+                    return
+                if entry:
+                    deliver({k: entry.get(k) for k in FLAT_FIELDS})
+                else:
+                    slots.release()
+        except Exception as e:
+            deliver(_Failure(e))
+        finally:
+            deliver(_DONE)
+
+    job = asyncio.ensure_future(pool.run(produce, guild_id=guild_id))
+    # pool ปิดก่อนงานเริ่มหรือระหว่างทำงาน: ไม่ให้ผู้บริโภครอไปตลอด (producer ส่ง _DONE มาก่อนแล้วถ้าจบปกติ)
+    job.add_done_callback(lambda _: queue.put_nowait(_DONE))
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            slots.release()
+            yield item
+    finally:
+        stop.set()
+        if not job.done():
+            job.cancel()  # ถ้ายังรอคิวอยู่ก็ไม่ต้องเริ่ม ถ้ากำลังทำงาน producer จะหยุดเองภายใน 0.5 วินาที
+
+
+def entry_kwargs(item: Dict) -> Optional[Dict]:
+    """Map a flat playlist item to QueueEntry keyword arguments"""
+    video_id = item.get('id')
+    if not video_id:
+        return None
+    return {
+        'query': item.get('url') or video_id,
+        'video_id': video_id,
+        'title': item.get('title') or video_id,
+        'duration': int(item.get('duration') or 0),
+    }
@@ -0,0 +1,90 @@
+import collections
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# --- Pre-roll ของเพลงถัดไป ---
+# เริ่ม ffmpeg ของเพลงถัดไปก่อนเพลงปัจจุบันจบ แล้วอ่าน frame แรกๆ เก็บไว้ในบัฟเฟอร์ที่จำกัดขนาด
+# ตอนเพลงปัจจุบันจบ mixer สลับมาเล่นเพลงนี้ได้ภายใน frame เดียว ไม่ต้องรอ spawn/connect/demux
+
+PREROLL_SECONDS = float(os.getenv("PREROLL_SECONDS", "3"))
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000
+
+
+class PrerolledSource(discord.AudioSource):
+    """
+    AudioSource ที่อ่าน ``seconds`` วินาทีแรกของ ``original`` ล่วงหน้าใน thread แยก
+
+    The filler thread stops when the buffer is full, the source ends, or the
+    source is cleaned up. ``read`` serves buffered frames first. Once the
+    filler has stopped and the buffer is empty, ``read`` reads the original
+    directly, so the original is never read from two threads at once.
+    """
+
+    def __init__(self, original: discord.AudioSource, seconds: float = PREROLL_SECONDS):
+        self.original = original
+        self.capacity = max(1, int(round(seconds / FRAME_SECONDS)))
+        self._frames = collections.deque()
+        self._cond = threading.Condition()
+        self._filling = True
+        self._ended = False
+        self._closed = False
+        self.started_at = time.perf_counter()
+        self.ready_at: Optional[float] = None  # เวลาที่ได้ frame แรก
+        self._thread = threading.Thread(target=self._fill, daemon=True, name='preroll')
+        self._thread.start()
+
+    def _fill(self):
+        try:
+            while True:
+                with self._cond:
+                    if self._closed or len(self._frames) >= self.capacity:
+                        return
+                data = self.original.read()
+                with self._cond:
+                    if self.ready_at is None:
+                        self.ready_at = time.perf_counter()
+                    if not data:
+                        self._ended = True
+                        return
+                    self._frames.append(data)
+                    self._cond.notify_all()
+        except Exception as e:
+            logger.warning(f"Pre-roll read failed: {e}")
+            with self._cond:
+                self._ended = True
+        finally:
+            with self._cond:
+                self._filling = False
+                self._cond.notify_all()
+
+    @property
+    def buffered(self) -> int:
+        return len(self._frames)
+
+    def read(self) -> bytes:
+        with self._cond:
+            while not self._frames and self._filling:
+                # ยังไม่มี frame แรก: รอเหมือนอ่าน ffmpeg ตรงๆ
+                self._cond.wait()
+            if self._frames:
+                return self._frames.popleft()
+            if self._ended or self._closed:
+                return b''
+        return self.original.read()
+
+    def is_opus(self) -> bool:
+        return self.original.is_opus()
+
+    def cleanup(self):
+        with self._cond:
+            self._closed = True
+            self._frames.clear()
+        # ปิด ffmpeg ทำให้ read ใน filler thread จบ
+        self.original.cleanup()
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from services.metrics import FIRESTORE_OPS
+
+logger = logging.getLogger(__name__)
+
+# --- Write-behind buffer สำหรับสถานะคำสั่งจาก web ---
+# รวมการ update status (completed / timeout / error) หลายรายการเป็น WriteBatch เดียว
+# Firestore จำกัด 500 operations ต่อ batch
+
+FIRESTORE_BATCH_LIMIT = 500
+
+
+class StatusWriter:
+    """
+    Groups document updates into Firestore ``WriteBatch`` commits
+
+    Updates are flushed when ``max_batch`` are buffered or ``flush_interval``
+    seconds after the first one, whichever comes first. Several updates to the
+    same document within one window collapse into a single write. If a batch
+    fails, e.g. because one document was deleted, its updates are retried one
+    by one so the other commands still get their status.
+    """
+
+    def __init__(self, db, *, max_batch: int = 100, flush_interval: float = 0.5):
+        self.db = db
+        self.max_batch = max(1, min(max_batch, FIRESTORE_BATCH_LIMIT))
+        self.flush_interval = flush_interval
+        self._buffer: "OrderedDict[str, Tuple[Any, Dict]]" = OrderedDict()
+        self._inflight: Set[str] = set()
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self.writes = 0
+        self.commits = 0
+        self.failed = 0
+
+    def update(self, ref, data: Dict):
+        """Buffer ``ref.update(data)`` (must be called on the event loop)"""
+        path = ref.path
+        if path in self._buffer:
+            self._buffer[path][1].update(data)
+        else:
+            self._buffer[path] = (ref, dict(data))
+        if len(self._buffer) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.ensure_future(self._flush_later())
+
+    def is_pending(self, path: str) -> bool:
+        """True while an update for ``path`` is buffered or being committed"""
+        return path in self._buffer or path in self._inflight
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.flush_interval)
+        except asyncio.CancelledError:
+            return
+        self._timer = None
+        self._start_flush()
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._buffer:
+            return
+        items = list(self._buffer.items())
+        self._buffer.clear()
+        task = asyncio.ensure_future(self._commit(items))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _commit(self, items: List[Tuple[str, Tuple[Any, Dict]]]):
+        paths = [path for path, _ in items]
+        self._inflight.update(paths)
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(None, self._commit_batch, items)
+            self.commits += 1
+            self.writes += len(items)
+            FIRESTORE_OPS.inc(op='batch_commit', status='ok')
+        except Exception as e:
+            FIRESTORE_OPS.inc(op='batch_commit', status='error')
+            logger.warning(f"Batched status write of {len(items)} commands failed, retrying individually: {e}")
+            for path, (ref, data) in items:
+                try:
+                    await loop.run_in_executor(None, lambda: ref.update(data))
+                    self.commits += 1
+                    self.writes += 1
+                    FIRESTORE_OPS.inc(op='update', status='ok')
+                except Exception as item_error:
+                    self.failed += 1
+                    FIRESTORE_OPS.inc(op='update', status='error')
+                    logger.error(f"Failed to update status of {path}: {item_error}")
+        finally:
+            self._inflight.difference_update(paths)
+
+    def _commit_batch(self, items):
+        batch = self.db.batch()
+        for _, (ref, data) in items:
+            batch.update(ref, data)
+        batch.commit()
+
+    async def flush(self):
+        """Commit everything buffered so far and wait for it"""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*list(self._flushes), return_exceptions=True)
+
+    async def close(self):
+        await self.flush()
+        stats = self.stats()
+        logger.info(
+            f"Status writer drained: {stats['writes']} writes in {stats['commits']} commits "
+            f"(saved {stats['round_trips_saved']} round trips)"
+        )
+
+    def stats(self) -> Dict:
+        return {
+            'writes': self.writes,
+            'commits': self.commits,
+            'round_trips_saved': self.writes - self.commits,
+            'failed': self.failed,
+            'buffered': len(self._buffer),
+        }
@@ -0,0 +1,194 @@
+import bisect
+import logging
+import re
+import unicodedata
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from services.track_cache import extract_video_id, watch_url
+
+logger = logging.getLogger(__name__)
+
+# --- Index ชื่อเพลงสำหรับ autocomplete ของ /play ---
+# พิมพ์ผิดหนึ่งตัวใน /play เดิมต้องเสีย ytsearch ทั้งรอบ ตอนนี้ autocomplete ตอบจาก index ในหน่วยความจำ
+# ที่เก็บชื่อเพลงที่เคย resolve แล้ว (และเพลงจากเพลย์ลิสต์) ไม่เรียก network เลย
+# - คำค้นสั้น (< 3 ตัวอักษร): หาคำที่ขึ้นต้นด้วยคำค้นจาก vocabulary ที่เรียงไว้ (bisect)
+# - คำค้นยาว: นับ trigram (ที่ไม่พบบ่อยเกินไป) ที่ตรงกันด้วย NumPy แล้วจัดอันดับใหม่เฉพาะผู้สมัครไม่กี่สิบรายการ
+#   trigram ไม่ต้องแบ่งคำ จึงใช้กับชื่อภาษาไทยที่ไม่มีช่องว่างได้ และทนการพิมพ์ผิดเล็กน้อย
+
+MAX_CHOICES = 25  # Discord แสดง autocomplete ได้สูงสุด 25 ตัวเลือก
+CHOICE_NAME_LIMIT = 100
+RERANK_CANDIDATES = 64
+# trigram ที่พบในเอกสารมากกว่าสัดส่วนนี้ (เช่น " th") แทบไม่ช่วยคัดผู้สมัคร แต่ทำให้ต้องนับมาก
+COMMON_GRAM_RATIO = 0.02
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize_title(text: str) -> str:
+    """ตัวพิมพ์เล็ก ตัด accent และเครื่องหมายวรรคตอน เหลือคำคั่นด้วยช่องว่างเดียว"""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    # ตัดเฉพาะ combining mark ของอักษรละติน สระ/วรรณยุกต์ไทยเป็น Mn เหมือนกันจึงต้องเก็บไว้
+    text = ''.join(c for c in text if not (unicodedata.combining(c) and c < 'Ͱ'))
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def trigrams(normalized: str) -> set:
+    padded = f" {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def format_duration(seconds: int) -> str:
+    if not seconds:
+        return ''
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class TitleIndex:
+    """
+    Index ชื่อเพลงในหน่วยความจำ: prefix ของคำ + trigram -> เลขเอกสาร
+
+    Postings are ``array('i')`` so they stay compact and can be read by NumPy
+    without copying. A title that changes keeps its old postings; results are
+    always re-ranked against the current title, so stale postings only cost a
+    little work. Must only be used from the event loop thread.
+    """
+
+    def __init__(self):
+        self._ids: List[str] = []  # doc -> video id
+        self._titles: List[str] = []
+        self._normalized: List[str] = []
+        self._durations: List[int] = []
+        self._docs: Dict[str, int] = {}  # video id -> doc
+        self._grams: Dict[str, array] = {}
+        self._words: Dict[str, array] = {}
+        self._vocabulary: List[str] = []  # คำทั้งหมดเรียงตามตัวอักษร สำหรับค้นหาด้วย prefix
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, video_id: Optional[str], title: Optional[str], duration: int = 0) -> bool:
+        """เพิ่มหรืออัปเดตเพลง คืน True ถ้ามีการเปลี่ยนแปลง"""
+        if not video_id or not title or title == video_id:
+            return False
+        doc = self._docs.get(video_id)
+        normalized = normalize_title(title)
+        if doc is not None:
+            if duration:
+                self._durations[doc] = int(duration)
+            if self._titles[doc] == title:
+                return False
+            self._titles[doc] = title
+            self._normalized[doc] = normalized
+        else:
+            doc = len(self._ids)
+            self._docs[video_id] = doc
+            self._ids.append(video_id)
+            self._titles.append(title)
+            self._normalized.append(normalized)
+            self._durations.append(int(duration or 0))
+        for gram in trigrams(normalized):
+            postings = self._grams.get(gram)
+            if postings is None:
+                postings = self._grams[gram] = array('i')
+            postings.append(doc)
+        for word in set(normalized.split()):
+            postings = self._words.get(word)
+            if postings is None:
+                postings = self._words[word] = array('i')
+                bisect.insort(self._vocabulary, word)
+            postings.append(doc)
+        return True
+
+    def add_info(self, data: Dict) -> bool:
+        """เพิ่มจาก info dict ของ yt-dlp หรือรายการในเพลย์ลิสต์"""
+        return self.add(data.get('id') or data.get('video_id'), data.get('title'), data.get('duration') or 0)
+
+    def extend(self, items: Iterable[Dict]) -> int:
+        return sum(1 for data in items if self.add_info(data))
+
+    def title_for(self, query: str) -> Optional[str]:
+        """ชื่อเพลงของ URL ที่ได้จาก autocomplete (ใช้แสดงก่อน resolve เสร็จ)"""
+        doc = self._docs.get(extract_video_id(query) or '')
+        return self._titles[doc] if doc is not None else None
+
+    # --- ค้นหา ---
+    def search(self, query: str, limit: int = MAX_CHOICES) -> List[int]:
+        """เลขเอกสารที่ตรงกับ ``query`` มากที่สุด ``limit`` รายการ (ว่าง = เพลงที่เพิ่มล่าสุด)"""
+        normalized = normalize_title(query)
+        if not self._ids:
+            return []
+        if not normalized:
+            return list(range(len(self._ids) - 1, max(-1, len(self._ids) - 1 - limit), -1))
+        grams = trigrams(normalized)
+        if len(normalized.replace(' ', '')) < 3:
+            candidates = self._prefix_candidates(normalized.split()[-1], RERANK_CANDIDATES * 2)
+        else:
+            candidates = self._trigram_candidates(grams)
+        scored = [(self._score(doc, normalized, grams), doc) for doc in candidates]
+        scored = [item for item in scored if item[0] > 0]
+        # คะแนนเท่ากัน: เพลงที่เพิ่มล่าสุดก่อน
+        scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        return [doc for _, doc in scored[:limit]]
+
+    def _prefix_candidates(self, prefix: str, limit: int) -> List[int]:
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        docs = set()
+        for word in self._vocabulary[start:]:
+            if not word.startswith(prefix) or len(docs) >= limit:
+                break
+            docs.update(self._words[word][-limit:])
+        return list(docs)
+
+    def _trigram_candidates(self, grams: set) -> List[int]:
+        postings = sorted((self._grams[gram] for gram in grams if gram in self._grams), key=len)
+        if not postings:
+            return []
+        # ใช้ trigram ที่หายากก่อน ตัด trigram ที่พบบ่อยเกินไปทิ้ง (เหลืออย่างน้อยครึ่งหนึ่ง)
+        common = max(RERANK_CANDIDATES, int(len(self._ids) * COMMON_GRAM_RATIO))
+        keep = max((len(postings) + 1) // 2, sum(1 for p in postings if len(p) <= common))
+        docs = np.concatenate([np.frombuffer(p, dtype=np.int32) for p in postings[:keep]])
+        # เอกสารหนึ่งอาจมี trigram เดียวกันซ้ำจาก title เก่า จึงเป็นแค่คะแนนคร่าวๆ สำหรับคัดผู้สมัคร
+        docs, hits = np.unique(docs, return_counts=True)
+        if len(docs) > RERANK_CANDIDATES:
+            docs = docs[np.argpartition(hits, -RERANK_CANDIDATES)[-RERANK_CANDIDATES:]]
+        return docs.tolist()
+
+    def _score(self, doc: int, normalized: str, grams: set) -> float:
+        title = self._normalized[doc]
+        score = len(grams & trigrams(title)) / len(grams)
+        if title.startswith(normalized):
+            score += 1.0
+        elif f" {normalized}" in f" {title}":
+            score += 0.5  # ตรงกับต้นคำใดคำหนึ่ง
+        elif normalized in title:
+            score += 0.25
+        return score
+
+    def suggest(self, query: str, limit: int = MAX_CHOICES) -> List[Tuple[str, str]]:
+        """ตัวเลือก autocomplete ``(ชื่อที่แสดง, URL ของวิดีโอ)``"""
+        choices = []
+        for doc in self.search(query, limit):
+            duration = format_duration(self._durations[doc])
+            suffix = f" ({duration})" if duration else ''
+            title = self._titles[doc]
+            if len(title) + len(suffix) > CHOICE_NAME_LIMIT:
+                title = title[:CHOICE_NAME_LIMIT - len(suffix) - 1] + '…'
+            choices.append((title + suffix, watch_url(self._ids[doc])))
+        return choices
+
+    def stats(self) -> Dict:
+        return {
+            'titles': len(self._ids),
+            'trigrams': len(self._grams),
+            'words': len(self._vocabulary),
+            'postings': sum(len(p) for p in self._grams.values()) + sum(len(p) for p in self._words.values()),
+        }
+
+
+# index ร่วมกันทั้ง bot.py และ cogs/music.py
+title_index = TitleIndex()
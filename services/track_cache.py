@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+# --- Two-tier resolution cache สำหรับ YTDLSource.from_url ---
+# Tier 1: normalized query/URL -> video id
+# Tier 2: video id -> resolved track info (stream URL) หมดอายุตามพารามิเตอร์ expire ของ googlevideo
+
+YOUTUBE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+YOUTUBE_HOSTS = {'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com'}
+
+# ฟิลด์ที่เก็บไว้ใน cache (ไม่เก็บ info dict ทั้งก้อนของ yt-dlp)
+CACHED_FIELDS = (
+    'id', 'title', 'url', 'webpage_url', 'duration', 'ext', 'acodec',
+    'abr', 'asr', 'http_headers', 'thumbnail', 'uploader', 'extractor',
+)
+
+DEFAULT_STREAM_TTL = 30 * 60  # ใช้เมื่อ URL ไม่มีพารามิเตอร์ expire
+EXPIRY_MARGIN = 60  # เผื่อเวลาไว้ก่อน URL หมดอายุจริง
+QUERY_TTL = 24 * 60 * 60  # ผลการค้นหาเปลี่ยนได้ จึงไม่เก็บ query -> id ตลอดไป
+
+
+def extract_video_id(query: str) -> Optional[str]:
+    """Return the YouTube video ID encoded in a URL, if any"""
+    try:
+        parsed = urlparse(query)
+    except ValueError:
+        return None
+    host = (parsed.hostname or '').lower()
+    if host == 'youtu.be':
+        candidate = parsed.path.lstrip('/').split('/')[0]
+    elif host in YOUTUBE_HOSTS:
+        if parsed.path == '/watch':
+            candidate = parse_qs(parsed.query).get('v', [''])[0]
+        elif parsed.path.startswith(('/shorts/', '/embed/', '/live/')):
+            candidate = parsed.path.split('/')[2]
+        else:
+            return None
+    else:
+        return None
+    return candidate if YOUTUBE_ID_RE.match(candidate) else None
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query or URL into a cache key"""
+    query = query.strip()
+    video_id = extract_video_id(query)
+    if video_id:
+        return f"id:{video_id}"
+    if query.startswith(('http://', 'https://')):
+        return f"url:{query}"
+    return "q:" + " ".join(query.lower().split())
+
+
+def stream_expiry(info: Dict, now: float) -> float:
+    """Compute when the stream URL in ``info`` should be considered stale"""
+    expires_at = None
+    try:
+        expire = parse_qs(urlparse(info.get('url', '')).query).get('expire')
+        if expire:
+            expires_at = float(expire[0])
+    except (TypeError, ValueError):
+        expires_at = None
+
+    if expires_at is None:
+        return now + DEFAULT_STREAM_TTL
+
+    # URL ต้องยังใช้งานได้จนเล่นจบเพลง
+    duration = info.get('duration') or 0
+    return expires_at - EXPIRY_MARGIN - duration
+
+
+def watch_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+class TrackCache:
+    """
+    Bounded LRU cache ที่แปลง query -> video id -> stream info
+    พร้อม single-flight: คำขอที่ซ้ำกันขณะกำลัง extract จะรอผลลัพธ์เดียวกัน
+
+    Must only be used from the event loop thread.
+    """
+
+    def __init__(self, max_queries: int = 1024, max_tracks: int = 512,
+                 clock: Callable[[], float] = time.time):
+        self.max_queries = max_queries
+        self.max_tracks = max_tracks
+        self._clock = clock
+        self._queries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (video_id, stored_at)
+        self._tracks: "OrderedDict[str, tuple]" = OrderedDict()  # video_id -> (info, expires_at)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._tracks)
+
+    def _lookup_id(self, key: str) -> Optional[str]:
+        if key.startswith('id:'):
+            return key[3:]
+        entry = self._queries.get(key)
+        if entry is None:
+            return None
+        video_id, stored_at = entry
+        if self._clock() - stored_at > QUERY_TTL:
+            del self._queries[key]
+            return None
+        self._queries.move_to_end(key)
+        return video_id
+
+    def _lookup_track(self, video_id: str) -> Optional[Dict]:
+        entry = self._tracks.get(video_id)
+        if entry is None:
+            return None
+        info, expires_at = entry
+        if self._clock() >= expires_at:
+            del self._tracks[video_id]
+            return None
+        self._tracks.move_to_end(video_id)
+        return info
+
+    def video_id(self, query: str) -> Optional[str]:
+        """Video id ของ query ถ้ารู้แล้ว (URL ของ YouTube หรือเคยค้นหาแล้ว) โดยไม่นับเป็น hit/miss"""
+        return self._lookup_id(normalize_query(query))
+
+    def get(self, query: str) -> Optional[Dict]:
+        """Return cached track info for ``query`` without touching yt-dlp"""
+        key = normalize_query(query)
+        video_id = self._lookup_id(key)
+        info = self._lookup_track(video_id) if video_id else None
+        if info is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(info)
+
+    def put(self, query: str, info: Dict):
+        """Store resolved ``info`` under both tiers"""
+        video_id = info.get('id')
+        if not video_id:
+            return
+        now = self._clock()
+        key = normalize_query(query)
+        if not key.startswith('id:'):
+            self._queries[key] = (video_id, now)
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+
+        if not info.get('url'):
+            return
+        expires_at = stream_expiry(info, now)
+        if expires_at <= now:
+            return
+        trimmed = {k: info[k] for k in CACHED_FIELDS if k in info}
+        self._tracks[video_id] = (trimmed, expires_at)
+        self._tracks.move_to_end(video_id)
+        while len(self._tracks) > self.max_tracks:
+            self._tracks.popitem(last=False)
+
+    def invalidate(self, video_id: str):
+        self._tracks.pop(video_id, None)
+
+    async def resolve(self, query: str, extract: Callable[[str], Awaitable[Dict]]) -> Dict:
+        """
+        คืนค่า track info ของ query โดยใช้ cache ถ้าเป็นไปได้
+
+        ``extract(target)`` is only awaited on a miss. If the video ID is already
+        known (tier 1 hit) the canonical watch URL is extracted instead of
+        repeating the search.
+        """
+        cached = self.get(query)
+        if cached is not None:
+            return cached
+
+        key = normalize_query(query)
+        future = self._inflight.get(key)
+        if future is None:
+            video_id = self._lookup_id(key)
+            target = watch_url(video_id) if video_id else query
+            future = asyncio.ensure_future(self._fill(query, target, extract))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        info = await asyncio.shield(future)
+        return dict(info)
+
+    async def _fill(self, query: str, target: str, extract: Callable[[str], Awaitable[Dict]]) -> Dict:
+        info = await extract(target)
+        self.put(query, info)
+        return info
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'queries': len(self._queries),
+            'tracks': len(self._tracks),
+        }
+
+
+# cache ร่วมกันทั้ง bot.py และ cogs/music.py
+track_cache = TrackCache(
+    max_queries=int(os.getenv("TRACK_CACHE_QUERIES", "1024")),
+    max_tracks=int(os.getenv("TRACK_CACHE_SIZE", "512")),
+)
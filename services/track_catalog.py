@@ -0,0 +1,276 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.track_cache import CACHED_FIELDS, stream_expiry
+
+logger = logging.getLogger(__name__)
+
+# --- Catalog เพลงถาวร (SQLite) ใช้ร่วมกันระหว่างบอทและ webapp ---
+# เดิมทุกอย่างที่ yt-dlp คืนมาหายไปตอนรีสตาร์ต และ "Popular Songs" ใน dashboard เป็นรายการที่เขียนตายตัว
+# บอทบันทึก video id / ชื่อ / ความยาว / format ล่าสุด และจำนวนครั้งที่เล่นต่อ guild
+# แบบรวมเป็น transaction เดียวนอก event loop ส่วน webapp เปิดไฟล์เดียวกันแบบอ่านอย่างเดียว
+# WAL mode: ผู้อ่านไม่บล็อกผู้เขียน และไม่เห็นข้อมูลที่เขียนไม่เสร็จ
+
+TRACK_CATALOG_PATH = os.getenv("TRACK_CATALOG_PATH", "track_catalog.db")
+# จำนวนเพลงล่าสุดที่โหลดเข้า autocomplete / track cache ตอนบอทเริ่ม
+TRACK_CATALOG_WARM_TRACKS = int(os.getenv("TRACK_CATALOG_WARM_TRACKS", "20000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    video_id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    duration INTEGER NOT NULL DEFAULT 0,
+    formats TEXT,
+    expires_at REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS plays (
+    guild_id TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    last_played REAL NOT NULL,
+    PRIMARY KEY (guild_id, video_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS tracks_updated ON tracks (updated_at);
+CREATE INDEX IF NOT EXISTS plays_popular ON plays (guild_id, count);
+CREATE INDEX IF NOT EXISTS plays_recent ON plays (guild_id, last_played);
+"""
+
+# format ล่าสุดไม่ทับด้วย NULL (เช่นรายการจากเพลย์ลิสต์ที่ยังไม่ได้ resolve) และความยาว 0 ไม่ทับค่าที่รู้แล้ว
+UPSERT_TRACK = """
+INSERT INTO tracks (video_id, title, duration, formats, expires_at, updated_at)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (video_id) DO UPDATE SET
+    title = excluded.title,
+    duration = CASE WHEN excluded.duration > 0 THEN excluded.duration ELSE tracks.duration END,
+    formats = COALESCE(excluded.formats, tracks.formats),
+    expires_at = CASE WHEN excluded.formats IS NULL THEN tracks.expires_at ELSE excluded.expires_at END,
+    updated_at = excluded.updated_at
+"""
+
+UPSERT_PLAY = """
+INSERT INTO plays (guild_id, video_id, count, last_played) VALUES (?, ?, ?, ?)
+ON CONFLICT (guild_id, video_id) DO UPDATE SET
+    count = plays.count + excluded.count,
+    last_played = MAX(plays.last_played, excluded.last_played)
+"""
+
+GUILD_TRACKS = """
+SELECT t.video_id, t.title, t.duration, p.count, p.last_played
+FROM plays p JOIN tracks t ON t.video_id = p.video_id
+WHERE p.guild_id = ?
+ORDER BY {order} DESC
+LIMIT ?
+"""
+
+TrackRow = Tuple[str, str, int, Optional[str], float, float]
+
+
+class TrackCatalog:
+    """
+    SQLite catalog of resolved tracks and per-guild play counts
+
+    The bot is the only writer. ``record_track`` and ``record_play`` only
+    buffer in memory (event loop thread); the buffer is written in one
+    transaction by a worker thread ``flush_interval`` seconds after the first
+    change, or as soon as ``max_batch`` rows are pending. ``load`` returns the
+    most recent tracks so the bot can warm its in-memory indexes at startup.
+
+    The webapp only calls ``popular``/``recent``, which open the database
+    read-only (one connection per thread) and return [] until the bot has
+    created it.
+    """
+
+    def __init__(self, path: str = TRACK_CATALOG_PATH, *, flush_interval: float = 2.0,
+                 max_batch: int = 500, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._clock = clock
+        self._tracks: Dict[str, TrackRow] = {}
+        self._plays: Dict[Tuple[str, str], List] = {}  # (guild_id, video_id) -> [count, last_played]
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes: set = set()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        self._readers = threading.local()
+        self.rows_written = 0
+        self.commits = 0
+        self.failed = 0
+
+    # --- ฝั่งบอท (writer) ---
+    def _connect_writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # WAL + NORMAL: ไฟดับเสียแค่ transaction ท้ายๆ
+            conn.executescript(SCHEMA)
+            self._writer = conn
+        return self._writer
+
+    def load(self, limit: int = TRACK_CATALOG_WARM_TRACKS) -> List[Dict]:
+        """
+        เพลงที่อัปเดตล่าสุด ``limit`` รายการ เรียงจากเก่าไปใหม่ (blocking เรียกผ่าน asyncio.to_thread)
+
+        Each item has ``id``, ``title`` and ``duration``. If the stored
+        formats are still valid, their fields (stream URL, codec, headers)
+        are merged in so the track can be played without yt-dlp.
+        """
+        now = self._clock()
+        with self._write_lock:
+            rows = self._connect_writer().execute(
+                "SELECT video_id, title, duration, formats, expires_at FROM tracks "
+                "ORDER BY updated_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        items = []
+        for video_id, title, duration, formats, expires_at in reversed(rows):
+            item = {}
+            if formats and expires_at > now:
+                try:
+                    item.update(json.loads(formats))
+                except ValueError:
+                    pass
+            item.update(id=video_id, title=title, duration=duration)
+            items.append(item)
+        return items
+
+    def record_track(self, info: Dict):
+        """บันทึกผลจาก yt-dlp (หรือรายการเพลย์ลิสต์ที่ไม่มี format)"""
+        video_id = info.get('id') or info.get('video_id')
+        title = info.get('title')
+        if not video_id or not title:
+            return
+        now = self._clock()
+        formats, expires_at = None, 0.0
+        if info.get('url') and info.get('id'):
+            expires_at = stream_expiry(info, now)
+            formats = json.dumps({k: info[k] for k in CACHED_FIELDS if k in info},
+                                 ensure_ascii=False, separators=(',', ':'))
+        pending = self._tracks.get(video_id)
+        if formats is None and pending is not None and pending[3] is not None:
+            formats, expires_at = pending[3], pending[4]
+        self._tracks[video_id] = (video_id, title, int(info.get('duration') or 0), formats, expires_at, now)
+        self._changed()
+
+    def record_play(self, guild_id, video_id: Optional[str], title: Optional[str] = None, duration: int = 0):
+        if not video_id:
+            return
+        if title and video_id not in self._tracks:
+            # กันกรณีเล่นจาก audio cache ที่ catalog ยังไม่มีเพลงนี้ (ไม่ทับ format ที่มีอยู่)
+            self.record_track({'video_id': video_id, 'title': title, 'duration': duration})
+        play = self._plays.setdefault((str(guild_id), video_id), [0, 0.0])
+        play[0] += 1
+        play[1] = self._clock()
+        self._changed()
+
+    def _changed(self):
+        if len(self._tracks) + len(self._plays) >= self.max_batch:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.flush_interval)
+        except asyncio.CancelledError:
+            return
+        self._timer = None
+        self._start_flush()
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._tracks and not self._plays:
+            return
+        tracks = list(self._tracks.values())
+        plays = [(guild_id, video_id, count, last) for (guild_id, video_id), (count, last) in self._plays.items()]
+        self._tracks = {}
+        self._plays = {}
+        task = asyncio.ensure_future(self._commit(tracks, plays))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _commit(self, tracks: List[TrackRow], plays: List[Tuple]):
+        try:
+            await asyncio.to_thread(self._write, tracks, plays)
+            self.commits += 1
+            self.rows_written += len(tracks) + len(plays)
+        except sqlite3.Error as e:
+            self.failed += len(tracks) + len(plays)
+            logger.error(f"Failed to write {len(tracks)} tracks / {len(plays)} plays to catalog {self.path}: {e}")
+
+    def _write(self, tracks: List[TrackRow], plays: List[Tuple]):
+        with self._write_lock:
+            conn = self._connect_writer()
+            with conn:
+                conn.executemany(UPSERT_TRACK, tracks)
+                conn.executemany(UPSERT_PLAY, plays)
+
+    async def flush(self):
+        """เขียนทุกอย่างที่ค้างอยู่และรอจนเสร็จ"""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*list(self._flushes), return_exceptions=True)
+
+    async def close(self):
+        await self.flush()
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def stats(self) -> Dict:
+        return {
+            'rows_written': self.rows_written,
+            'commits': self.commits,
+            'failed': self.failed,
+            'buffered': len(self._tracks) + len(self._plays),
+        }
+
+    # --- ฝั่ง webapp (reader) ---
+    def _reader(self) -> Optional[sqlite3.Connection]:
+        conn = getattr(self._readers, 'conn', None)
+        if conn is None:
+            if not os.path.exists(self.path):
+                return None
+            try:
+                conn = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to open track catalog {self.path}: {e}")
+                return None
+            self._readers.conn = conn
+        return conn
+
+    def _guild_tracks(self, guild_id, order: str, limit: int) -> List[Dict]:
+        conn = self._reader()
+        if conn is None:
+            return []
+        try:
+            rows = conn.execute(GUILD_TRACKS.format(order=order), (str(guild_id), limit)).fetchall()
+        except sqlite3.Error as e:
+            # เช่นบอทสร้างไฟล์แล้วแต่ยังไม่ได้สร้างตาราง
+            logger.warning(f"Failed to read track catalog {self.path}: {e}")
+            return []
+        return [
+            {'video_id': video_id, 'title': title, 'duration': duration, 'plays': count, 'last_played': last}
+            for video_id, title, duration, count, last in rows
+        ]
+
+    def popular(self, guild_id, limit: int = 8) -> List[Dict]:
+        """เพลงที่ guild นี้เล่นบ่อยที่สุด"""
+        return self._guild_tracks(guild_id, 'p.count DESC, p.last_played', limit)
+
+    def recent(self, guild_id, limit: int = 8) -> List[Dict]:
+        """เพลงที่ guild นี้เล่นล่าสุด"""
+        return self._guild_tracks(guild_id, 'p.last_played', limit)
+
+
+# catalog ร่วมกันทั้ง bot.py และ cogs/music.py (webapp สร้าง instance ของตัวเองที่ path เดียวกัน)
+track_catalog = TrackCatalog()
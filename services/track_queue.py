@@ -0,0 +1,212 @@
+import random
+from typing import Generic, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+# --- คิวเพลงต่อ guild แบบ implicit treap ---
+# push / pop / remove-at / move ใช้เวลา O(log n), shuffle ใช้ O(n)
+# เหมาะกับคิวหลักหมื่นเพลงที่ list.pop(0) และการ insert กลางคิวเริ่มช้า
+
+
+class _Node:
+    __slots__ = ('value', 'priority', 'size', 'left', 'right')
+
+    def __init__(self, value, priority: float):
+        self.value = value
+        self.priority = priority
+        self.size = 1
+        self.left: Optional['_Node'] = None
+        self.right: Optional['_Node'] = None
+
+
+def _size(node: Optional[_Node]) -> int:
+    return node.size if node else 0
+
+
+def _update(node: _Node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+
+
+def _split(node: Optional[_Node], index: int) -> Tuple[Optional[_Node], Optional[_Node]]:
+    """Split into (first ``index`` items, the rest)"""
+    if node is None:
+        return None, None
+    left_size = _size(node.left)
+    if index <= left_size:
+        left, node.left = _split(node.left, index)
+        _update(node)
+        return left, node
+    node.right, right = _split(node.right, index - left_size - 1)
+    _update(node)
+    return node, right
+
+
+def _merge(left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        _update(left)
+        return left
+    right.left = _merge(left, right.left)
+    _update(right)
+    return right
+
+
+class TrackQueue(Generic[T]):
+    """
+    Indexed queue ที่รองรับการจัดการคิวขนาดใหญ่
+
+    ``version`` เพิ่มขึ้นทุกครั้งที่คิวเปลี่ยน ใช้เป็น key สำหรับ cache หน้า /list
+    """
+
+    def __init__(self, items: Iterable[T] = (), *, rng: Optional[random.Random] = None):
+        self._rng = rng or random.Random()
+        self._root: Optional[_Node] = None
+        self.version = 0
+        self.extend(items)
+
+    def __len__(self) -> int:
+        return _size(self._root)
+
+    def __bool__(self) -> bool:
+        return self._root is not None
+
+    def __iter__(self) -> Iterator[T]:
+        return self._iter_range(0, len(self))
+
+    def __repr__(self) -> str:
+        return f"TrackQueue(len={len(self)})"
+
+    def _index(self, index: int) -> int:
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("queue index out of range")
+        return index
+
+    def touch(self):
+        """Mark the queue as changed (e.g. an entry's metadata was filled in)"""
+        self.version += 1
+
+    def __getitem__(self, index: int) -> T:
+        index = self._index(index)
+        node = self._root
+        while True:
+            left_size = _size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return node.value
+            else:
+                index -= left_size + 1
+                node = node.right
+
+    def insert(self, index: int, item: T):
+        index = max(0, min(index if index >= 0 else index + len(self), len(self)))
+        left, right = _split(self._root, index)
+        self._root = _merge(_merge(left, _Node(item, self._rng.random())), right)
+        self.touch()
+
+    def append(self, item: T):
+        self._root = _merge(self._root, _Node(item, self._rng.random()))
+        self.touch()
+
+    def extend(self, items: Iterable[T]):
+        items = list(items)
+        if items:
+            self._root = _merge(self._root, self._build(items))
+            self.touch()
+
+    def pop(self, index: int = -1) -> T:
+        """Remove and return the item at ``index`` (remove-at)"""
+        index = self._index(index)
+        left, rest = _split(self._root, index)
+        node, right = _split(rest, 1)
+        self._root = _merge(left, right)
+        self.touch()
+        return node.value
+
+    def popleft(self) -> T:
+        return self.pop(0)
+
+    def move(self, src: int, dst: int):
+        """ย้ายเพลงจากตำแหน่ง ``src`` ไป ``dst`` (0-based)"""
+        src = self._index(src)
+        dst = self._index(dst)
+        if src != dst:
+            self.insert(dst, self.pop(src))
+
+    def shuffle(self):
+        items = list(self)
+        self._rng.shuffle(items)
+        self._root = self._build(items)
+        self.touch()
+
+    def clear(self):
+        self._root = None
+        self.touch()
+
+    def slice(self, start: int, stop: int) -> List[T]:
+        """Return items ``[start:stop]`` in O(log n + k), for paginated listing"""
+        start = max(0, start)
+        stop = min(stop, len(self))
+        return list(self._iter_range(start, stop)) if start < stop else []
+
+    def _iter_range(self, start: int, stop: int) -> Iterator[T]:
+        # in-order traversal ที่ข้าม subtree ก่อน start
+        stack = []
+        node = self._root
+        offset = 0
+        remaining = stop - start
+        while node is not None:
+            left_size = _size(node.left)
+            if start < offset + left_size:
+                stack.append(node)
+                node = node.left
+            elif start == offset + left_size:
+                stack.append(node)
+                break
+            else:
+                offset += left_size + 1
+                node = node.right
+        while stack and remaining > 0:
+            node = stack.pop()
+            yield node.value
+            remaining -= 1
+            child = node.right
+            while child is not None:
+                stack.append(child)
+                child = child.left
+
+    def _build(self, items: List[T]) -> Optional[_Node]:
+        # สร้าง treap จากลำดับที่รู้อยู่แล้วใน O(n) ด้วย stack (Cartesian tree)
+        stack: List[_Node] = []
+        for item in items:
+            node = _Node(item, self._rng.random())
+            last = None
+            while stack and stack[-1].priority < node.priority:
+                last = stack.pop()
+            node.left = last
+            if stack:
+                stack[-1].right = node
+            stack.append(node)
+        if not stack:
+            return None
+        root = stack[0]
+        # คำนวณ size แบบ post-order โดยไม่ใช้ recursion
+        order = []
+        pending = [root]
+        while pending:
+            node = pending.pop()
+            order.append(node)
+            if node.left:
+                pending.append(node.left)
+            if node.right:
+                pending.append(node.right)
+        for node in reversed(order):
+            _update(node)
+        return root
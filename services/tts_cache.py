@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from services.tts_engines import ENGINES, GTTSEngine, TTSEngine
+
+logger = logging.getLogger(__name__)
+
+# --- Content-addressed TTS cache ---
+# ไฟล์เสียงถูกเก็บตาม hash ของ (engine, text, lang, slow) ข้อความเดิมจึงเล่นได้ทันทีโดยไม่ต้องสร้างเสียงใหม่
+# ขนาดรวมถูกจำกัดด้วย LRU โดยใช้ mtime ของไฟล์เป็นลำดับการใช้งาน ทำให้ลำดับยังอยู่หลัง restart
+
+DEFAULT_TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+DEFAULT_TTS_CACHE_BYTES = int(float(os.getenv("TTS_CACHE_MAX_MB", "100")) * 1024 * 1024)
+DEFAULT_TTS_WORKERS = int(os.getenv("TTS_WORKERS", "4"))  # จำนวน synthesis พร้อมกันรวมทุก guild
+AUDIO_SUFFIXES = tuple({engine.suffix for engine in ENGINES.values()})
+TMP_SUFFIX = '.tmp'
+
+
+def tts_key(text: str, lang: str, slow: bool, engine: str = 'gtts') -> str:
+    payload = json.dumps([engine, text, lang, bool(slow)], ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """
+    Size-bounded LRU disk cache of synthesized speech
+
+    ``get`` returns the path of an audio file for (text, lang, slow) made by
+    ``engine`` (the cache's default engine if omitted). On a miss the engine runs in the cache's own executor, never on the event loop,
+    and concurrent requests for the same key share one synthesis. Files are
+    written to a temp file and renamed into place, so a crash never leaves a
+    truncated entry behind. When the total size is over ``max_bytes`` the least
+    recently used files are deleted.
+
+    Must only be used from the event loop thread.
+    """
+
+    def __init__(self, directory: str = DEFAULT_TTS_CACHE_DIR, max_bytes: int = DEFAULT_TTS_CACHE_BYTES, *,
+                 engine: Optional[TTSEngine] = None, workers: int = DEFAULT_TTS_WORKERS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.engine = engine or GTTSEngine()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='tts')
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # file name -> size (เก่าสุดอยู่หน้า)
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._load()
+
+    def _load(self):
+        """สร้าง index จากไฟล์ที่มีอยู่ เรียงตาม mtime (ใช้ล่าสุดอยู่ท้าย)"""
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                if entry.name.endswith(TMP_SUFFIX):
+                    # ไฟล์ค้างจากการเขียนที่ไม่เสร็จ
+                    self._unlink(entry.path)
+                    continue
+                if entry.name.endswith(AUDIO_SUFFIXES):
+                    st = entry.stat()
+                    found.append((st.st_mtime_ns, entry.name, st.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._bytes += size
+        self._evict()
+        if self._entries:
+            logger.info(f"TTS cache: {len(self._entries)} entries, {self._bytes / 1024 / 1024:.1f} MB")
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @staticmethod
+    def _name(text: str, lang: str, slow: bool, engine: TTSEngine) -> str:
+        return tts_key(text, lang, slow, engine.name) + engine.suffix
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, text: str, lang: str = 'th', slow: bool = False,
+               engine: Optional[TTSEngine] = None) -> Optional[str]:
+        """Path of the cached audio for (text, lang, slow), or None; never synthesizes"""
+        name = self._name(text, lang, slow, engine or self.engine)
+        if name not in self._entries:
+            return None
+        path = self.path(name)
+        try:
+            os.utime(path)  # บันทึกลำดับ LRU ลงดิสก์ด้วย
+        except OSError:
+            # ไฟล์ถูกลบจากภายนอก
+            self._bytes -= self._entries.pop(name)
+            return None
+        self._entries.move_to_end(name)
+        return path
+
+    async def get(self, text: str, lang: str = 'th', slow: bool = False,
+                  engine: Optional[TTSEngine] = None) -> str:
+        """
+        คืน path ของไฟล์เสียง สร้างใหม่ถ้ายังไม่มีใน cache
+
+        Raises whatever the engine raises (e.g. network errors from gTTS).
+        """
+        engine = engine or self.engine
+        path = self.lookup(text, lang, slow, engine)
+        if path is not None:
+            self.hits += 1
+            return path
+        self.misses += 1
+
+        name = self._name(text, lang, slow, engine)
+        future = self._inflight.get(name)
+        if future is None:
+            future = asyncio.ensure_future(self._fill(name, engine, text, lang, slow))
+            self._inflight[name] = future
+            future.add_done_callback(lambda _: self._inflight.pop(name, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(future)
+
+    async def _fill(self, name: str, engine: TTSEngine, text: str, lang: str, slow: bool) -> str:
+        loop = asyncio.get_running_loop()
+        size = await loop.run_in_executor(self._executor, self._write, name, engine, text, lang, slow)
+        self._bytes -= self._entries.pop(name, 0)
+        self._entries[name] = size
+        self._bytes += size
+        self._evict()
+        return self.path(name)
+
+    def _write(self, name: str, engine: TTSEngine, text: str, lang: str, slow: bool) -> int:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{name[:16]}.", suffix=TMP_SUFFIX)
+        os.close(fd)
+        try:
+            engine.synthesize(text, lang, slow, tmp_path)
+            size = os.path.getsize(tmp_path)
+            if size == 0:
+                raise ValueError("TTS engine produced an empty file")
+            os.replace(tmp_path, self.path(name))
+        except BaseException:
+            self._unlink(tmp_path)
+            raise
+        return size
+
+    def _evict(self):
+        # ไม่ลบไฟล์ล่าสุด แม้จะใหญ่กว่า max_bytes เอง เพราะกำลังจะถูกเล่น
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            # POSIX: ไฟล์ที่กำลังเล่นอยู่ยังอ่านต่อได้จนจบ
+            self._unlink(self.path(name))
+
+    @staticmethod
+    def _unlink(path: str):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+        }
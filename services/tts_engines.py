@@ -0,0 +1,175 @@
+import io
+import logging
+import os
+import shutil
+import subprocess
+import wave
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import discord
+import numpy as np
+from gtts import gTTS
+
+from services.metrics import track_source
+
+logger = logging.getLogger(__name__)
+
+# --- TTS engines ---
+# gtts: เรียก Google ผ่าน network ได้ไฟล์ mp3 ที่ต้องถอดรหัสด้วย ffmpeg ตอนเล่น
+# espeak: สร้างเสียงในเครื่องด้วย espeak-ng แปลงเป็น PCM 48 kHz stereo ไว้เลย เล่นได้โดยไม่ต้องเปิด ffmpeg
+
+DEFAULT_ENGINE = os.getenv("TTS_ENGINE", "gtts")
+ESPEAK_PATH = os.getenv("ESPEAK_PATH", "espeak-ng")
+ESPEAK_VOICE = os.getenv("ESPEAK_VOICE", "")  # ว่าง = ใช้รหัสภาษา เช่น th
+
+PCM_RATE = discord.opus.Encoder.SAMPLING_RATE
+PCM_CHANNELS = discord.opus.Encoder.CHANNELS
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+
+
+class TTSEngine(ABC):
+    """
+    Base class for text-to-speech backends
+
+    ``synthesize`` is blocking and runs in the TTS cache's executor. It writes
+    the audio for ``text`` to ``path``. ``suffix`` tells the cache and the
+    player what kind of file that is.
+    """
+    name = 'base'
+    suffix = '.audio'
+
+    def available(self) -> bool:
+        return True
+
+    @abstractmethod
+    def synthesize(self, text: str, lang: str, slow: bool, path: str):
+        ...
+
+
+class GTTSEngine(TTSEngine):
+    """Google Translate TTS (ต้องใช้ network ทุกครั้งที่ cache miss)"""
+    name = 'gtts'
+    suffix = '.mp3'
+
+    def synthesize(self, text: str, lang: str, slow: bool, path: str):
+        gTTS(text=text, lang=lang, slow=slow).save(path)
+
+
+class EspeakEngine(TTSEngine):
+    """
+    Offline TTS with espeak-ng, stored as raw 48 kHz stereo s16le PCM
+
+    Converting once at synthesis time means playback is a plain file read,
+    with no ffmpeg process per utterance.
+    """
+    name = 'espeak'
+    suffix = '.pcm'
+
+    def __init__(self, executable: str = ESPEAK_PATH, *, voice: str = ESPEAK_VOICE, speed: int = 160,
+                 slow_speed: int = 110, timeout: float = 30.0):
+        self.executable = executable
+        self.voice = voice
+        self.speed = speed
+        self.slow_speed = slow_speed
+        self.timeout = timeout
+
+    def available(self) -> bool:
+        return shutil.which(self.executable) is not None
+
+    def synthesize(self, text: str, lang: str, slow: bool, path: str):
+        # ส่งข้อความทาง stdin ข้อความที่ขึ้นต้นด้วย '-' จะได้ไม่ถูกตีความเป็น option
+        result = subprocess.run(
+            [self.executable, '--stdin', '--stdout', '-v', self.voice or lang, '-s', str(self.slow_speed if slow else self.speed)],
+            input=text.encode('utf-8'), capture_output=True, timeout=self.timeout, check=True,
+        )
+        with open(path, 'wb') as f:
+            f.write(wav_to_pcm(result.stdout))
+
+
+def wav_to_pcm(data: bytes) -> bytes:
+    """แปลง WAV (s16) เป็น PCM ที่ discord ใช้: 48 kHz, stereo, s16le"""
+    with wave.open(io.BytesIO(data)) as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"Unsupported sample width: {wav.getsampwidth()}")
+        channels = wav.getnchannels()
+        rate = wav.getframerate()
+        pcm = wav.readframes(wav.getnframes())
+    if channels not in (1, 2):
+        raise ValueError(f"Unsupported channel count: {channels}")
+    # ใช้ NumPy แทน audioop (ถูกถอดออกตั้งแต่ Python 3.13)
+    mono = np.frombuffer(pcm, dtype='<i2').reshape(-1, channels).mean(axis=1, dtype=np.float32)
+    if rate != PCM_RATE and len(mono):
+        # linear interpolation พอสำหรับเสียงพูด (เหมือน audioop.ratecv เดิม)
+        count = int(round(len(mono) * PCM_RATE / rate))
+        mono = np.interp(np.arange(count) * (rate / PCM_RATE), np.arange(len(mono)), mono)
+    samples = np.clip(np.rint(mono), -32768, 32767).astype('<i2')
+    return np.repeat(samples, 2).tobytes()
+
+
+class PCMFileSource(discord.AudioSource):
+    """เล่นไฟล์ PCM 48 kHz stereo ตรงๆ frame สุดท้ายที่ไม่ครบถูกเติมด้วยความเงียบ"""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+
+    def read(self) -> bytes:
+        data = self._file.read(FRAME_SIZE)
+        if not data:
+            return b''
+        if len(data) < FRAME_SIZE:
+            data += b'\0' * (FRAME_SIZE - len(data))
+        return data
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        self._file.close()
+
+
+def open_speech(path: str) -> discord.AudioSource:
+    """เปิดไฟล์เสียงจาก TTS cache เป็น AudioSource ตามชนิดไฟล์"""
+    if path.endswith(EspeakEngine.suffix):
+        return PCMFileSource(path)
+    return track_source(discord.FFmpegPCMAudio(path), 'tts')
+
+
+ENGINES: Dict[str, TTSEngine] = {engine.name: engine for engine in (GTTSEngine(), EspeakEngine())}
+
+
+def parse_guild_engines(value: str) -> Dict[int, str]:
+    """แปลง TTS_GUILD_ENGINES รูปแบบ "guild_id:engine,guild_id:engine" """
+    mapping = {}
+    for item in value.split(','):
+        guild_id, _, name = item.strip().partition(':')
+        if not guild_id:
+            continue
+        try:
+            mapping[int(guild_id)] = name.strip()
+        except ValueError:
+            logger.warning(f"Ignoring invalid TTS_GUILD_ENGINES entry: {item!r}")
+    return mapping
+
+
+GUILD_ENGINES = parse_guild_engines(os.getenv("TTS_GUILD_ENGINES", ""))
+
+
+_warned = set()
+
+
+def get_engine(name: Optional[str]) -> TTSEngine:
+    """คืน engine ตามชื่อ ถ้าไม่รู้จักหรือใช้ไม่ได้ (เช่นไม่ได้ติดตั้ง espeak-ng) จะใช้ gTTS แทน"""
+    name = name or DEFAULT_ENGINE
+    engine = ENGINES.get(name)
+    if engine is not None and engine.available():
+        return engine
+    if name not in _warned:
+        _warned.add(name)
+        reason = "is not available" if engine is not None else "is unknown"
+        logger.warning(f"TTS engine {name!r} {reason}, using gtts")
+    return ENGINES['gtts']
+
+
+def engine_for_guild(guild_id: int) -> TTSEngine:
+    return get_engine(GUILD_ENGINES.get(guild_id, DEFAULT_ENGINE))
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import re
+from concurrent.futures import Future
+from typing import Callable, List, Optional
+
+import discord
+
+from services.tts_cache import TTSCache
+from services.tts_engines import TTSEngine, open_speech
+
+logger = logging.getLogger(__name__)
+
+# --- Sentence-chunked TTS ---
+# ข้อความยาวถูกแบ่งเป็นประโยค สร้างเสียงพร้อมกันหลาย chunk แล้วเล่นตามลำดับทันทีที่ chunk แรกพร้อม
+# เวลาจนได้ยินเสียงแรกจึงเท่ากับเวลาสร้าง chunk เดียว ไม่ขึ้นกับความยาวข้อความ
+
+# gTTS ส่ง request ละไม่เกิน 100 ตัวอักษรอยู่แล้ว chunk ที่ใหญ่กว่านี้จะถูกยิงทีละ request ต่อกัน
+DEFAULT_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "100"))
+DEFAULT_PARALLEL = int(os.getenv("TTS_PARALLEL", "3"))
+
+SENTENCE_END_RE = re.compile(r'(?<=[.!?…。！？ฯ])\s+|\n+')
+SILENCE_FRAME = b'\0' * discord.opus.Encoder.FRAME_SIZE
+
+
+def _split_long(piece: str, max_chars: int) -> List[str]:
+    """แบ่งประโยคที่ยาวเกินตามช่องว่าง (ภาษาไทยเว้นวรรคระหว่างประโยค/วลี) ถ้าไม่มีค่อยตัดตรงๆ"""
+    parts = []
+    while len(piece) > max_chars:
+        cut = piece.rfind(' ', 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        parts.append(piece[:cut].strip())
+        piece = piece[cut:].strip()
+    if piece:
+        parts.append(piece)
+    return parts
+
+
+def split_sentences(text: str, max_chars: int = DEFAULT_CHUNK_CHARS) -> List[str]:
+    """
+    Split ``text`` into chunks of at most ``max_chars`` characters
+
+    Splits on sentence punctuation and newlines first, then on spaces. Short
+    neighbouring sentences are merged so a chatty message does not turn into
+    dozens of tiny requests.
+    """
+    pieces = []
+    for sentence in SENTENCE_END_RE.split(text):
+        sentence = ' '.join(sentence.split())
+        if sentence:
+            pieces.extend(_split_long(sentence, max_chars))
+
+    chunks: List[str] = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + 1 + len(piece) <= max_chars:
+            chunks[-1] = f"{chunks[-1]} {piece}"
+        else:
+            chunks.append(piece)
+    return chunks
+
+
+def synthesize_chunks(cache: TTSCache, chunks: List[str], *, lang: str = 'th', slow: bool = False,
+                      engine: Optional[TTSEngine] = None, parallel: int = DEFAULT_PARALLEL) -> List[Future]:
+    """
+    เริ่มสร้างเสียงทุก chunk โดยทำพร้อมกันไม่เกิน ``parallel`` chunk ตามลำดับ
+
+    Returns one thread-safe future per chunk (resolving to the audio path), so
+    the voice thread can poll them. Cancelling a future cancels its pending task.
+    Must be called from the event loop thread.
+    """
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(max(1, parallel))
+
+    async def synthesize(chunk: str) -> str:
+        async with slots:
+            return await cache.get(chunk, lang=lang, slow=slow, engine=engine)
+
+    # task ถูกสร้างตามลำดับ จึงได้ slot ตามลำดับ chunk แรกเสร็จก่อนเสมอ
+    return [asyncio.run_coroutine_threadsafe(synthesize(chunk), loop) for chunk in chunks]
+
+
+class SpeechStream(discord.AudioSource):
+    """
+    AudioSource ที่เล่นไฟล์เสียงของแต่ละ chunk ต่อกันตามลำดับ
+
+    ``read`` runs on the voice thread. When the next chunk is still being
+    synthesized it returns a silent frame instead of blocking, so the player
+    keeps its 20 ms timing. A chunk that failed is logged and skipped.
+    """
+
+    def __init__(self, chunks: List[Future],
+                 open_source: Callable[[str], discord.AudioSource] = open_speech):
+        self._chunks = chunks
+        self._open = open_source
+        self._index = 0
+        self._current: Optional[discord.AudioSource] = None
+        self.underruns = 0  # จำนวน frame เงียบที่ต้องเติมระหว่างรอ chunk ถัดไป
+        self.failed = 0
+
+    def read(self) -> bytes:
+        while True:
+            if self._current is None:
+                if self._index >= len(self._chunks):
+                    return b''
+                future = self._chunks[self._index]
+                if not future.done():
+                    self.underruns += 1
+                    return SILENCE_FRAME
+                self._index += 1
+                try:
+                    self._current = self._open(future.result())
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"TTS chunk {self._index} failed: {e}")
+                    continue
+
+            data = self._current.read()
+            if data:
+                return data
+            self._current.cleanup()
+            self._current = None
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self):
+        if self._current is not None:
+            self._current.cleanup()
+            self._current = None
+        # หยุดกลางคัน (/stop หรือออกจากห้อง) ไม่ต้องสร้าง chunk ที่เหลือ
+        for future in self._chunks[self._index:]:
+            future.cancel()
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# --- ดัชนีคนในห้องเสียง ---
+# เดิม on_voice_state_update สร้าง list สมาชิกที่ไม่ใช่บอทของห้องใหม่ทุก event ในทุก guild
+# และ web play ไล่หาห้องที่มีคนจาก guild.voice_channels ทีละห้อง
+# ตอนนี้นับคนต่อห้องจาก delta ของ voice state (before -> after) และจำว่าแต่ละคนอยู่ห้องไหน
+# ห้องที่บอทอยู่ว่างลงจะรอ VOICE_IDLE_GRACE_SECONDS ก่อนออก ถ้ามีคนกลับมาก็ใช้ voice connection เดิมต่อ
+
+VOICE_IDLE_GRACE_SECONDS = float(os.getenv("VOICE_IDLE_GRACE_SECONDS", "60"))
+
+
+class VoicePresence:
+    """
+    จำนวนสมาชิกที่ไม่ใช่บอทในแต่ละห้องเสียง และห้องที่สมาชิกแต่ละคนอยู่
+
+    ``rebuild`` seeds a guild from its channel member lists (on ready and on
+    guild join). After that ``update`` applies each voice state change in
+    O(1). The stored member location is used as the "before" side, so a
+    missed event corrects itself on that member's next update.
+    """
+
+    def __init__(self):
+        self._counts: Dict[int, Dict[int, int]] = {}  # guild_id -> channel_id -> จำนวนคน
+        self._members: Dict[Tuple[int, int], int] = {}  # (guild_id, member_id) -> channel_id
+
+    def rebuild(self, guild):
+        self.remove_guild(guild.id)
+        counts = self._counts[guild.id] = {}
+        for channel in guild.voice_channels:
+            for member in channel.members:
+                if not member.bot:
+                    self._members[(guild.id, member.id)] = channel.id
+                    counts[channel.id] = counts.get(channel.id, 0) + 1
+
+    def remove_guild(self, guild_id: int):
+        counts = self._counts.pop(guild_id, {})
+        if counts:
+            self._members = {key: channel_id for key, channel_id in self._members.items() if key[0] != guild_id}
+
+    def update(self, member, before, after) -> bool:
+        """ใช้ delta ของ voice state หนึ่งครั้ง คืน True ถ้าจำนวนคนในห้องใดเปลี่ยน"""
+        if member.bot:
+            return False
+        guild_id = member.guild.id
+        key = (guild_id, member.id)
+        old = self._members.get(key)
+        new = after.channel.id if after.channel is not None else None
+        if old == new:
+            return False
+        counts = self._counts.setdefault(guild_id, {})
+        if old is not None:
+            left = counts.get(old, 0) - 1
+            if left > 0:
+                counts[old] = left
+            else:
+                counts.pop(old, None)
+        if new is None:
+            self._members.pop(key, None)
+        else:
+            self._members[key] = new
+            counts[new] = counts.get(new, 0) + 1
+        return True
+
+    def humans(self, guild_id: int, channel_id: int) -> int:
+        return self._counts.get(guild_id, {}).get(channel_id, 0)
+
+    def channel_of(self, guild_id: int, member_id: int) -> Optional[int]:
+        return self._members.get((guild_id, member_id))
+
+    def busiest(self, guild_id: int) -> Optional[int]:
+        """ห้องที่มีคนมากที่สุดของ guild (เฉพาะห้องที่มีคนอยู่)"""
+        counts = self._counts.get(guild_id)
+        if not counts:
+            return None
+        return max(counts, key=counts.get)
+
+
+class IdleDisconnect:
+    """
+    เรียก ``on_idle(guild_id)`` เมื่อห้องของบอทว่างต่อเนื่องนาน ``grace`` วินาที
+
+    One pending timer per guild. ``schedule`` keeps an existing timer, so the
+    grace period counts from when the channel first became empty.
+    """
+
+    def __init__(self, on_idle: Callable[[int], Awaitable], grace: float = VOICE_IDLE_GRACE_SECONDS):
+        self.on_idle = on_idle
+        self.grace = grace
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def pending(self, guild_id: int) -> bool:
+        return guild_id in self._tasks
+
+    def schedule(self, guild_id: int) -> bool:
+        """เริ่มนับเวลา คืน True ถ้าเพิ่งเริ่มนับ"""
+        if guild_id in self._tasks:
+            return False
+        self._tasks[guild_id] = asyncio.ensure_future(self._run(guild_id))
+        return True
+
+    def cancel(self, guild_id: int) -> bool:
+        task = self._tasks.pop(guild_id, None)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    async def _run(self, guild_id: int):
+        try:
+            await asyncio.sleep(self.grace)
+            if self._tasks.get(guild_id) is asyncio.current_task():
+                del self._tasks[guild_id]
+            await self.on_idle(guild_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Idle disconnect failed for guild {guild_id}: {e}")
+        finally:
+            if self._tasks.get(guild_id) is asyncio.current_task():
+                del self._tasks[guild_id]
@@ -5,6 +5,11 @@ class DiscordMusicDashboard {
         this.isPlayerVisible = false;
         this.db = null;
         this.firestoreListener = null;
+        this.playerStream = null;
+        this.playerState = {};
+        this.clockOffset = 0;
+        this.progressTimer = null;
+        this.trackReloadTimer = null;
         this.init();
     }
 
@@ -51,13 +56,11 @@ class DiscordMusicDashboard {
             });
         }
 
-        // Popular song items
-        const songItems = document.querySelectorAll('.song-item');
-        songItems.forEach(item => {
-            const query = item.dataset.query;
-            
-            item.addEventListener('click', () => {
-                if (query) this.handleSearch(query);
+        // Popular / recent song items (สร้างใหม่ทุกครั้งที่โหลดรายการ จึงดักที่ grid)
+        document.querySelectorAll('.song-grid').forEach(grid => {
+            grid.addEventListener('click', (e) => {
+                const item = e.target.closest('.song-item');
+                if (item && item.dataset.query) this.handleSearch(item.dataset.query);
             });
         });
 
@@ -149,13 +152,245 @@ class DiscordMusicDashboard {
         if (guildId) {
             this.showMainContent();
             this.showPlayerControls();
+            this.connectPlayerStream(guildId);
+            this.loadGuildTracks(guildId);
             console.log(`Selected guild: ${guildId}`);
         } else {
+            this.disconnectPlayerStream();
             this.hideMainContent();
             this.hidePlayerControls();
         }
     }
 
+    // --- Popular / recent songs (track catalog ของบอท) ---
+    async loadGuildTracks(guildId) {
+        try {
+            const response = await fetch(`/api/guilds/${encodeURIComponent(guildId)}/tracks`);
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const data = await response.json();
+            if (guildId !== this.currentGuild) return;  // เปลี่ยนเซิร์ฟเวอร์ระหว่างรอ
+            this.renderSongGrid('popular-songs', data.popular || [], track => `เล่นแล้ว ${track.plays} ครั้ง`);
+            this.renderSongGrid('recent-songs', data.recent || [], track => this.formatTime(track.duration));
+        } catch (e) {
+            console.warn('Failed to load guild tracks:', e);
+        }
+    }
+
+    scheduleTrackReload(guildId) {
+        // บอทเขียน catalog เป็นชุดทุกไม่กี่วินาที รอให้เพลงที่เพิ่งเริ่มถูกบันทึกก่อน
+        clearTimeout(this.trackReloadTimer);
+        this.trackReloadTimer = setTimeout(() => this.loadGuildTracks(guildId), 5000);
+    }
+
+    renderSongGrid(id, tracks, describe) {
+        const grid = document.getElementById(id);
+        if (!grid) return;
+        grid.replaceChildren();
+
+        if (!tracks.length) {
+            const empty = document.createElement('div');
+            empty.className = 'song-empty';
+            empty.textContent = 'ยังไม่มีเพลงที่เล่นในเซิร์ฟเวอร์นี้';
+            grid.appendChild(empty);
+            return;
+        }
+
+        tracks.forEach(track => {
+            const item = document.createElement('div');
+            item.className = 'song-item';
+            item.dataset.query = `https://www.youtube.com/watch?v=${track.video_id}`;
+
+            const artwork = document.createElement('div');
+            artwork.className = 'song-artwork';
+            artwork.innerHTML = `
+                <i class="fas fa-music"></i>
+                <div class="play-overlay"><i class="fas fa-play"></i></div>`;
+
+            const info = document.createElement('div');
+            info.className = 'song-info';
+            const title = document.createElement('h5');
+            title.textContent = track.title;
+            title.title = track.title;
+            const detail = document.createElement('p');
+            detail.textContent = describe(track);
+            info.append(title, detail);
+
+            item.append(artwork, info);
+            grid.appendChild(item);
+        });
+    }
+
+    // --- Live player state (Server-Sent Events) ---
+    connectPlayerStream(guildId) {
+        this.disconnectPlayerStream();
+        if (typeof EventSource === 'undefined') return;
+
+        // EventSource ต่อใหม่เองอัตโนมัติ และได้ snapshot เต็มทุกครั้งที่ต่อใหม่
+        const stream = new EventSource(`/api/guilds/${encodeURIComponent(guildId)}/events`);
+        stream.addEventListener('snapshot', (e) => {
+            const data = JSON.parse(e.data);
+            this.syncClock(data.server_time);
+            this.playerState = data.state || {};
+            this.renderPlayerState();
+        });
+        stream.addEventListener('delta', (e) => {
+            const data = JSON.parse(e.data);
+            this.syncClock(data.server_time);
+            Object.assign(this.playerState, data.changes);
+            this.renderPlayerState();
+            if ('now_playing' in data.changes) this.scheduleTrackReload(guildId);
+        });
+        stream.addEventListener('removed', () => {
+            this.playerState = {};
+            this.renderPlayerState();
+        });
+        stream.addEventListener('status', (e) => {
+            if (!JSON.parse(e.data).connected) {
+                console.warn('Bot state stream disconnected');
+            }
+        });
+        this.playerStream = stream;
+        this.startProgressTimer();
+    }
+
+    disconnectPlayerStream() {
+        if (this.playerStream) {
+            this.playerStream.close();
+            this.playerStream = null;
+        }
+        if (this.progressTimer) {
+            clearInterval(this.progressTimer);
+            this.progressTimer = null;
+        }
+        this.playerState = {};
+    }
+
+    syncClock(serverTime) {
+        if (serverTime) {
+            this.clockOffset = serverTime * 1000 - Date.now();
+        }
+    }
+
+    currentPosition() {
+        const state = this.playerState;
+        if (state.paused_position !== null && state.paused_position !== undefined) {
+            return state.paused_position;
+        }
+        if (!state.started_at) return 0;
+        return Math.max(0, (Date.now() + this.clockOffset) / 1000 - state.started_at);
+    }
+
+    formatTime(seconds) {
+        seconds = Math.floor(seconds || 0);
+        const minutes = Math.floor(seconds / 60);
+        return `${minutes}:${String(seconds % 60).padStart(2, '0')}`;
+    }
+
+    startProgressTimer() {
+        // คำนวณตำแหน่งเพลงฝั่ง browser จาก started_at ไม่ต้องถามเซิร์ฟเวอร์
+        if (this.progressTimer) clearInterval(this.progressTimer);
+        this.progressTimer = setInterval(() => this.renderProgress(), 1000);
+    }
+
+    renderProgress() {
+        const track = this.playerState.now_playing;
+        const duration = track ? track.duration || 0 : 0;
+        const position = track ? Math.min(this.currentPosition(), duration || Infinity) : 0;
+
+        const currentTime = document.getElementById('current-time');
+        const totalTime = document.getElementById('total-time');
+        const progressFill = document.getElementById('progress-fill');
+        const progressHandle = document.getElementById('progress-handle');
+        const percent = duration ? (position / duration) * 100 : 0;
+
+        if (currentTime) currentTime.textContent = this.formatTime(position);
+        if (totalTime) totalTime.textContent = this.formatTime(duration);
+        if (progressFill) progressFill.style.width = `${percent}%`;
+        if (progressHandle) progressHandle.style.left = `${percent}%`;
+    }
+
+    renderPlayerState() {
+        const state = this.playerState;
+        const track = state.now_playing;
+
+        if (track) {
+            this.updatePlayerInfo(track.title);
+            const artist = track.requester ? `ขอโดย ${track.requester}` : 'กำลังเล่น...';
+            ['current-track-artist', 'controls-track-artist'].forEach(id => {
+                const el = document.getElementById(id);
+                if (el) el.textContent = state.paused ? `⏸️ ${artist}` : artist;
+            });
+        } else {
+            ['current-track-title', 'controls-track-title'].forEach(id => {
+                const el = document.getElementById(id);
+                if (el) el.textContent = 'No song playing';
+            });
+            ['current-track-artist', 'controls-track-artist'].forEach(id => {
+                const el = document.getElementById(id);
+                if (el) el.textContent = 'Select a song to start playing';
+            });
+        }
+
+        const playing = Boolean(track) && !state.paused;
+        ['play-pause-btn', 'main-play-btn'].forEach(id => {
+            const btn = document.getElementById(id);
+            const icon = btn ? btn.querySelector('i') : null;
+            if (!icon) return;
+            icon.classList.toggle('fa-pause', playing);
+            icon.classList.toggle('fa-play', !playing);
+        });
+
+        this.renderQueue(state.queue || [], state.queue_length || 0);
+        this.renderProgress();
+    }
+
+    renderQueue(entries, total) {
+        const queueList = document.getElementById('queue-list');
+        if (!queueList) return;
+        queueList.replaceChildren();
+
+        if (!entries.length) {
+            const empty = document.createElement('div');
+            empty.className = 'queue-item empty-state';
+            empty.innerHTML = `
+                <div class="empty-icon"><i class="fas fa-list-music"></i></div>
+                <div class="empty-text"><h4>Queue is empty</h4><p>Add some songs to get started</p></div>`;
+            queueList.appendChild(empty);
+            return;
+        }
+
+        entries.forEach((entry, index) => {
+            const item = document.createElement('div');
+            item.className = 'queue-item';
+
+            const position = document.createElement('span');
+            position.className = 'queue-position';
+            position.textContent = index + 1;
+
+            const info = document.createElement('div');
+            info.className = 'queue-info';
+            const title = document.createElement('h5');
+            title.textContent = entry.title;
+            const requester = document.createElement('p');
+            requester.textContent = entry.requester || '';
+            info.append(title, requester);
+
+            const duration = document.createElement('span');
+            duration.className = 'queue-duration';
+            duration.textContent = entry.duration ? this.formatTime(entry.duration) : '';
+
+            item.append(position, info, duration);
+            queueList.appendChild(item);
+        });
+
+        if (total > entries.length) {
+            const more = document.createElement('div');
+            more.className = 'queue-more';
+            more.textContent = `และอีก ${total - entries.length} เพลง`;
+            queueList.appendChild(more);
+        }
+    }
+
     handleSearch(query) {
         if (!this.currentGuild) {
             this.showNotification('กรุณาเลือกเซิร์ฟเวอร์ก่อน', 'warning');
@@ -0,0 +1,16 @@
+import pytest
+
+
+class FakeClock:
+    """นาฬิกาที่ test เลื่อนเวลาเอง (``clock.now += 5``) แทน time.time / time.monotonic"""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,88 @@
+import json
+import os
+import stat
+import sys
+
+import discord
+
+from services.audio_cache import AudioCache
+
+
+def fake_ffmpeg(tmp_path, frames=5):
+    """ffmpeg ปลอม: เขียน 'เสียงต้นฉบับ' ลงไฟล์ matroska ที่ได้รับ และส่ง PCM ออก stdout"""
+    script = tmp_path / 'ffmpeg'
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "args = sys.argv[1:]\n"
+        "if 'matroska' in args:\n"
+        "    assert args[0] == '-y' and args.index('-i') < args.index('matroska')\n"
+        "    open(args[args.index('matroska') + 1], 'wb').write(b'audio' * 100)\n"
+        f"sys.stdout.buffer.write(b'\\0' * 3840 * {frames})\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+
+def track(video_id='abcdefghijk', **extra):
+    return {'id': video_id, 'url': 'https://example.invalid/audio', 'duration': 60, 'title': 'เพลง', **extra}
+
+
+def play(source, frames=None):
+    count = 0
+    while (frames is None or count < frames) and source.read():
+        count += 1
+    source.cleanup()
+    return count
+
+
+def test_second_play_tees_and_third_plays_from_disk(tmp_path):
+    ffmpeg = fake_ffmpeg(tmp_path)
+    cache = AudioCache(str(tmp_path / 'cache'), admit_after=2)
+
+    assert play(cache.open(track(), executable=ffmpeg)) == 5
+    assert len(cache) == 0  # เล่นครั้งแรกยังไม่ถึงเกณฑ์
+
+    assert play(cache.open(track(), executable=ffmpeg)) == 5
+    assert len(cache) == 1 and cache.stats()['bytes_written'] == 500
+
+    source = cache.open(track(), executable=ffmpeg)
+    assert isinstance(source, discord.FFmpegPCMAudio)
+    play(source)
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['bytes_saved'] == 500 and stats['hit_rate'] == 1 / 3
+
+    info = cache.info('abcdefghijk')
+    assert info['title'] == 'เพลง' and info['url'] == cache.path('abcdefghijk')
+
+
+def test_skipped_tee_is_discarded(tmp_path):
+    cache = AudioCache(str(tmp_path / 'cache'), admit_after=1)
+    play(cache.open(track(), executable=fake_ffmpeg(tmp_path, frames=50)), frames=2)
+    assert len(cache) == 0 and cache.stats()['aborted'] == 1
+    assert os.listdir(cache.directory) == []
+
+
+def test_lru_eviction_by_bytes_and_restart(tmp_path):
+    ffmpeg = fake_ffmpeg(tmp_path)
+    directory = str(tmp_path / 'cache')
+    cache = AudioCache(directory, max_bytes=1200, admit_after=1)
+    for video_id in ('aaaaaaaaaaa', 'bbbbbbbbbbb'):
+        play(cache.open(track(video_id), executable=ffmpeg))
+        os.utime(cache.path(video_id), ns=(len(cache), len(cache)))  # ให้ลำดับ mtime ชัดเจน
+    assert cache.info('aaaaaaaaaaa')  # a ถูกใช้ล่าสุด
+    play(cache.open(track('ccccccccccc'), executable=ffmpeg))
+
+    assert cache.info('bbbbbbbbbbb') is None and cache.stats()['evictions'] == 1
+    assert sorted(AudioCache(directory).entries) == ['aaaaaaaaaaa', 'ccccccccccc']
+    with open(os.path.join(directory, 'ccccccccccc.json'), encoding='utf-8') as f:
+        assert 'url' not in json.load(f)
+
+
+def test_live_long_and_non_youtube_tracks_are_not_admitted(tmp_path):
+    cache = AudioCache(str(tmp_path / 'cache'), admit_after=1, max_track_seconds=600)
+    assert not cache._admit(track(is_live=True))
+    assert not cache._admit(track(duration=0))
+    assert not cache._admit(track(duration=3600))
+    assert not cache._admit(track('../../etc'))
+    assert cache._admit(track())
@@ -44,3 +44,98 @@ async def test_reload_cog(bot, cog_name):
     await bot.reload_extension(cog_path)
     assert cog_path in bot.cogs
 
+
+@pytest.mark.asyncio
+async def test_setup_hook_registers_cog_commands(monkeypatch):
+    # on_ready ของ bot.py แค่ sync คำสั่ง cog ต้องถูกโหลดใน setup_hook ก่อนแล้ว
+    monkeypatch.setenv("DISCORD_TOKEN", "test-token")
+    import bot as bot_module
+
+    client = bot_module.bot
+    await client._async_setup_hook()
+    await client.setup_hook()
+    try:
+        commands = {command.name: command for command in client.tree.get_commands()}
+        assert {'play', 'remove', 'move', 'shuffle', 'speak', 'sync'} <= set(commands)
+        assert commands['play']._params['query'].autocomplete is not None
+    finally:
+        for name in list(client.extensions):
+            await client.unload_extension(name)
+
+
+@pytest.mark.asyncio
+async def test_slash_play_shows_up_in_player_state(monkeypatch):
+    # /play ใช้ player ชุดเดียวกับ web dashboard: เพลงที่เริ่มจาก cog ต้องอยู่ใน snapshot และถูก publish
+    import cogs.music
+    import services.music_player as music_player_module
+    from services.music_player import MusicPlayer, YTDLSource
+
+    player = MusicPlayer()
+    monkeypatch.setattr(cogs.music, 'music_player', player)
+    monkeypatch.setattr(music_player_module, 'track_catalog', MagicMock())
+    played = []
+    monkeypatch.setattr(music_player_module, 'play_music', lambda voice_client, source, **kwargs: played.append(source))
+
+    async def resolve(cls, url, *, stream=True, guild_id=None):
+        return {'id': 'abcdefghijk', 'title': 'Lofi', 'duration': 120,
+                'webpage_url': 'https://www.youtube.com/watch?v=abcdefghijk'}
+
+    monkeypatch.setattr(YTDLSource, 'resolve', classmethod(resolve))
+    monkeypatch.setattr(YTDLSource, 'from_data', classmethod(lambda cls, data, **kwargs: MagicMock()))
+
+    voice_client = MagicMock()
+    voice_client.guild.id = 7
+    voice_client.channel.name = 'music'
+    voice_client.is_paused.return_value = False
+    guild = MagicMock(id=7, voice_client=voice_client)
+    bot = MagicMock(voice_clients=[voice_client])
+    bot.get_guild.return_value = guild
+    interaction = MagicMock(guild=guild, response=AsyncMock(), followup=AsyncMock(), channel=AsyncMock())
+    interaction.user.voice.channel = voice_client.channel
+
+    cog = cogs.music.Music(bot)
+    subscription = player.state.subscribe()
+    assert (await subscription.get())['type'] == 'reset'
+    try:
+        await cog.play.callback(cog, interaction, 'lofi')
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert len(played) == 1
+
+        state = player.snapshot(7)
+        assert state['now_playing']['title'] == 'Lofi'
+        assert state['started_at'] is not None and state['connected']
+        events = []
+        while not subscription.queue.empty():
+            events.append(subscription.queue.get_nowait())
+        assert events[0]['reset'] and events[0]['changes']['now_playing'] is None  # ยังไม่มีเพลงตอน subscribe
+        assert 'Lofi' in [(e['changes'].get('now_playing') or {}).get('title') for e in events[1:]]
+    finally:
+        player.state.unsubscribe(subscription)
+        player.close()
+
+
+def test_list_page_rerenders_after_entry_is_resolved(monkeypatch):
+    import cogs.music
+    from services.music_player import MusicPlayer
+    from services.playback import QueueEntry
+
+    player = MusicPlayer()
+    monkeypatch.setattr(cogs.music, 'music_player', player)
+    cog = cogs.music.Music(MagicMock())
+    now_playing = QueueEntry(query='first song')
+    queued = QueueEntry(query='lofi')
+    player.current_tracks[7] = now_playing
+    player.queue(7).append(queued)
+
+    page = cog.build_queue_page(7, 1)
+    assert cog.build_queue_page(7, 1) is page  # คิวไม่เปลี่ยน ใช้ embed เดิม
+    assert page.fields[1].value == "1. lofi"
+
+    # resolve เติมชื่อจริงในที่ (คิวไม่ถูก touch)
+    queued.update({'id': 'abcdefghijk', 'title': 'Lofi Beats', 'duration': 120})
+    assert cog.build_queue_page(7, 1).fields[1].value == "1. Lofi Beats"
+    now_playing.update({'id': 'bbbbbbbbbbb', 'title': 'First Song'})
+    assert cog.build_queue_page(7, 1).fields[0].value == "First Song"
+    now_playing.update({'id': 'bbbbbbbbbbb', 'title': 'First Song'})  # ไม่มีอะไรเปลี่ยน
+    assert now_playing.revision == 1
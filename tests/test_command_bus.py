@@ -0,0 +1,169 @@
+import asyncio
+import os
+import stat
+
+import pytest
+
+from services.command_bus import (
+    CommandBus,
+    CommandBusUnavailable,
+    FallbackCommandBus,
+    FirestoreCommandBus,
+    LocalCommandBus,
+    LocalCommandServer,
+    MemoryCommandBus,
+    create_command_bus,
+)
+
+
+class DownBus(CommandBus):
+    name = "down"
+
+    def __init__(self):
+        self.calls = 0
+
+    def send(self, guild_id, command):
+        self.calls += 1
+        raise CommandBusUnavailable("down")
+
+
+def test_memory_bus_calls_handler():
+    received = []
+    bus = MemoryCommandBus(lambda guild_id, command: received.append((guild_id, command.to_dict())))
+    command_id = bus.send(123, {'action': 'skip'})
+    assert received == [('123', {'action': 'skip'})]
+    assert bus.sent[0][1].id == command_id
+    assert bus.sent[0][1].reference is None
+
+
+def test_fallback_skips_primary_during_cooldown(clock):
+    primary, fallback = DownBus(), MemoryCommandBus()
+    bus = FallbackCommandBus(primary, fallback, cooldown=10, clock=clock)
+
+    bus.send('1', {'action': 'skip'})
+    bus.send('1', {'action': 'stop'})
+    assert primary.calls == 1
+    assert len(fallback.sent) == 2
+
+    clock.now = 11
+    bus.send('1', {'action': 'pause'})
+    assert primary.calls == 2
+    assert bus.fallbacks == 3
+
+
+def test_create_command_bus_modes():
+    assert create_command_bus(None, mode='firestore') is None
+    assert isinstance(create_command_bus(None, mode='auto'), LocalCommandBus)
+    assert isinstance(create_command_bus(object(), mode='auto'), FallbackCommandBus)
+    assert isinstance(create_command_bus(None, mode='memory'), MemoryCommandBus)
+
+
+def test_local_bus_unavailable_without_server(tmp_path):
+    bus = LocalCommandBus(f"unix:{tmp_path / 'missing.sock'}", secret='s')
+    with pytest.raises(CommandBusUnavailable):
+        bus.send('1', {'action': 'skip'})
+
+
+@pytest.mark.asyncio
+async def test_local_server_round_trip(tmp_path):
+    address = f"unix:{tmp_path / 'bot.sock'}"
+    received = asyncio.Queue()
+    server = LocalCommandServer(lambda guild_id, command: received.put_nowait((guild_id, command)),
+                                address, secret='s')
+    await server.start()
+    loop = asyncio.get_event_loop()
+    try:
+        bus = LocalCommandBus(address, secret='s')
+        command_id = await loop.run_in_executor(
+            None, bus.send, '42', {'action': 'play', 'payload': {'query': 'lofi'}})
+        guild_id, command = await asyncio.wait_for(received.get(), 1)
+        assert guild_id == '42'
+        assert command.id == command_id
+        assert command.to_dict() == {'action': 'play', 'payload': {'query': 'lofi'}}
+
+        # reuses the keep-alive connection
+        await loop.run_in_executor(None, bus.send, '42', {'action': 'skip'})
+        assert (await received.get())[1].to_dict()['action'] == 'skip'
+
+        with pytest.raises(ValueError):
+            await loop.run_in_executor(None, LocalCommandBus(address, secret='wrong').send, '42', {'action': 'skip'})
+        bus.close()
+    finally:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_local_server_socket_is_private_and_requires_secret(tmp_path):
+    address = f"unix:{tmp_path / 'bot.sock'}"
+    server = LocalCommandServer(lambda guild_id, command: None, address, secret='s')
+    await server.start()
+    loop = asyncio.get_event_loop()
+    try:
+        assert stat.S_IMODE(os.stat(tmp_path / 'bot.sock').st_mode) == 0o600
+
+        def post(headers):
+            conn = LocalCommandBus(address, secret='s').open_connection()
+            try:
+                conn.request("POST", "/commands", body=b'{"guild_id": "1", "action": "skip"}', headers=headers)
+                return conn.getresponse().status
+            finally:
+                conn.close()
+
+        assert await loop.run_in_executor(None, post, {}) == 403  # ไม่มี header
+        assert await loop.run_in_executor(None, post, {'X-Command-Secret': 'x'}) == 403
+        assert await loop.run_in_executor(None, post, {'X-Command-Secret': 's'}) == 202
+    finally:
+        await server.stop()
+
+
+class SlowDoc:
+    def __init__(self, store, release):
+        self.id = f"doc{len(store)}"
+        self.store = store
+        self.release = release
+
+    def set(self, data):
+        self.release.wait(1)
+        self.store.append(data)
+
+
+class FakeFirestore:
+    def __init__(self):
+        import threading
+        self.store = []
+        self.release = threading.Event()
+
+    def collection(self, name):
+        return self
+
+    def document(self, *args):
+        return SlowDoc(self.store, self.release) if not args else self
+
+
+def test_firestore_bus_background_returns_before_write():
+    db = FakeFirestore()
+    bus = FirestoreCommandBus(db, background=True, max_pending=1)
+    command_id = bus.send('1', {'action': 'skip'})
+    assert command_id == 'doc0'
+    assert db.store == []
+    with pytest.raises(CommandBusUnavailable):
+        bus.send('1', {'action': 'stop'})  # write ค้างเกิน max_pending
+    db.release.set()
+    bus.close()
+    assert db.store[0]['action'] == 'skip' and db.store[0]['status'] == 'pending'
+
+
+def test_firestore_bus_releases_slot_when_submit_fails():
+    db = FakeFirestore()
+    db.release.set()
+    bus = FirestoreCommandBus(db, background=True, max_pending=1)
+    bus.close()
+    for _ in range(3):
+        with pytest.raises(CommandBusUnavailable):
+            bus.send('1', {'action': 'skip'})
+    assert bus._slots.acquire(blocking=False)  # slot ไม่รั่ว
+
+
+def test_command_bus_requires_send():
+    with pytest.raises(TypeError):
+        CommandBus()
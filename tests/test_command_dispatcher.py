@@ -0,0 +1,48 @@
+import pytest
+import asyncio
+
+from services.command_dispatcher import GuildDispatcher
+
+
+@pytest.mark.asyncio
+async def test_ordered_per_guild_and_bounded_overall():
+    log = []
+    running = 0
+    peak = 0
+
+    async def handler(guild_id, item):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.002)
+        log.append((guild_id, item))
+        running -= 1
+
+    dispatcher = GuildDispatcher(handler, max_concurrency=3, key=lambda item: item)
+    for guild in range(200):
+        for n in range(3):
+            dispatcher.submit(str(guild), f'{guild}-{n}')
+    await asyncio.wait_for(dispatcher.join(), timeout=5)
+
+    assert len(log) == 600
+    assert peak == 3
+    for guild in range(200):
+        assert [item for g, item in log if g == str(guild)] == [f'{guild}-{n}' for n in range(3)]
+    assert dispatcher.active_guilds == 0
+
+
+@pytest.mark.asyncio
+async def test_duplicate_items_are_ignored_until_done():
+    seen = []
+
+    async def handler(guild_id, item):
+        await asyncio.sleep(0.01)
+        seen.append(item)
+
+    dispatcher = GuildDispatcher(handler, key=lambda item: item)
+    assert dispatcher.submit('1', 'doc-a')
+    assert not dispatcher.submit('1', 'doc-a')
+    await dispatcher.join()
+    assert dispatcher.submit('1', 'doc-a')
+    await dispatcher.join()
+    assert seen == ['doc-a', 'doc-a']
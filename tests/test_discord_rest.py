@@ -0,0 +1,103 @@
+import pytest
+
+from services.discord_rest import DiscordRESTClient, DiscordRateLimited
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, data=None, headers=None):
+        self.status_code = status_code
+        self._data = data
+        self.headers = headers or {}
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls.append((url, headers['Authorization']))
+        return self.responses.pop(0)
+
+
+def make_client(responses, clock, **kwargs):
+    clock.now = 1000.0
+    session = FakeSession(responses)
+    client = DiscordRESTClient(api_endpoint="https://api.test", session=session, clock=clock, **kwargs)
+    return client, session, clock
+
+
+def test_cache_hit_skips_request(clock):
+    client, session, _ = make_client([FakeResponse(data={'id': '1'})], clock)
+    assert client.get("/users/@me", "Bearer a") == {'id': '1'}
+    assert client.get("/users/@me", "Bearer a") == {'id': '1'}
+    assert len(session.calls) == 1
+    assert client.stats()['hits'] == 1
+
+
+def test_cache_is_per_token(clock):
+    client, session, _ = make_client([FakeResponse(data={'id': '1'}), FakeResponse(data={'id': '2'})], clock)
+    assert client.get("/users/@me", "Bearer a") == {'id': '1'}
+    assert client.get("/users/@me", "Bearer b") == {'id': '2'}
+    assert len(session.calls) == 2
+
+
+def test_expired_entry_is_refetched_and_invalidate_drops_it(clock):
+    client, session, _ = make_client(
+        [FakeResponse(data=[1]), FakeResponse(data=[2]), FakeResponse(data=[3])], clock, ttl=10)
+    client.get("/users/@me/guilds", "Bearer a")
+    clock.now += 11
+    assert client.get("/users/@me/guilds", "Bearer a") == [2]
+    client.invalidate("Bearer a")
+    assert client.get("/users/@me/guilds", "Bearer a") == [3]
+    assert len(session.calls) == 3
+
+
+def test_exhausted_bucket_serves_stale_data(clock):
+    limits = {'X-RateLimit-Bucket': 'b1', 'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-After': '30'}
+    client, session, _ = make_client([FakeResponse(data=[1], headers=limits)], clock, ttl=5)
+    client.get("/users/@me/guilds", "Bearer a")
+    clock.now += 6
+    assert client.get("/users/@me/guilds", "Bearer a") == [1]
+    assert len(session.calls) == 1
+
+
+def test_exhausted_bucket_is_per_token(clock):
+    limits = {'X-RateLimit-Bucket': 'b1', 'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset-After': '30'}
+    client, session, _ = make_client([FakeResponse(data=[1], headers=limits), FakeResponse(data=[2])], clock)
+    client.get("/users/@me/guilds", "Bearer a")
+    # bucket ของ a หมด แต่ Discord จำกัด route นี้แยกตาม token จึงยังเรียกให้ b ได้
+    assert client.get("/users/@me/guilds", "Bearer b") == [2]
+    client.invalidate("Bearer a")
+    with pytest.raises(DiscordRateLimited):
+        client.get("/users/@me/guilds", "Bearer a")
+    assert len(session.calls) == 2
+
+
+def test_cache_evicts_least_recently_used_beyond_max_entries(clock):
+    client, session, _ = make_client([FakeResponse(data=[i]) for i in range(4)], clock, max_entries=2)
+    client.get("/users/@me", "Bearer a")
+    client.get("/users/@me", "Bearer b")
+    client.get("/users/@me", "Bearer a")  # a ถูกใช้ล่าสุด
+    client.get("/users/@me", "Bearer c")
+    assert client.stats()['cached'] == 2
+    assert client.get("/users/@me", "Bearer a") == [0]
+    assert client.get("/users/@me", "Bearer b") == [3]  # b ถูกทิ้งไป ต้องเรียกใหม่
+    assert len(session.calls) == 4
+
+
+def test_429_is_retried_once(clock):
+    client, session, _ = make_client([
+        FakeResponse(429, {'retry_after': 0.01}, {'Retry-After': '0.01', 'X-RateLimit-Bucket': 'b1'}),
+        FakeResponse(data={'id': '1'}),
+    ], clock)
+    assert client.get("/users/@me", "Bearer a") == {'id': '1'}
+    assert len(session.calls) == 2
+    assert client.stats()['rate_limited'] == 1
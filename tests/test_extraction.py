@@ -0,0 +1,47 @@
+import pytest
+import asyncio
+
+from services import extraction
+from services.extraction import ExtractionPool, _picklable_options
+
+
+def test_picklable_options_drops_callables():
+    options = {'quiet': True, 'retry_sleep_functions': {'http': lambda n: n}}
+    assert _picklable_options(options) == {'quiet': True}
+
+
+@pytest.mark.asyncio
+async def test_round_robin_between_guilds(monkeypatch):
+    order = []
+
+    def fake_extract(target, download):
+        order.append(target)
+        return {'id': target}
+
+    monkeypatch.setattr(extraction, '_worker_extract', fake_extract)
+    pool = ExtractionPool({'quiet': True}, workers=1)
+    try:
+        jobs = [pool.extract(f'a{i}', guild_id=1) for i in range(5)]
+        jobs += [pool.extract(f'b{i}', guild_id=2) for i in range(2)]
+        results = await asyncio.gather(*jobs)
+    finally:
+        await pool.shutdown()
+
+    assert [r['id'] for r in results] == ['a0', 'a1', 'a2', 'a3', 'a4', 'b0', 'b1']
+    assert order == ['a0', 'b0', 'a1', 'b1', 'a2', 'a3', 'a4']
+    assert pool.completed == 7
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate(monkeypatch):
+    def fake_extract(target, download):
+        raise RuntimeError("Video unavailable")
+
+    monkeypatch.setattr(extraction, '_worker_extract', fake_extract)
+    pool = ExtractionPool({'quiet': True}, workers=2)
+    try:
+        with pytest.raises(RuntimeError):
+            await pool.extract('x', guild_id=1)
+    finally:
+        await pool.shutdown()
+    assert pool.failed == 1
@@ -0,0 +1,82 @@
+import pytest
+import asyncio
+import threading
+from types import SimpleNamespace
+
+from services.firestore_listener import SnapshotListener
+
+
+class FakeWatch:
+    def __init__(self):
+        self.is_active = True
+        self.unsubscribed = False
+
+    def unsubscribe(self):
+        self.unsubscribed = True
+        self.is_active = False
+
+
+class FakeQuery:
+    def __init__(self):
+        self.callbacks = []
+        self.watches = []
+
+    def on_snapshot(self, callback):
+        self.callbacks.append(callback)
+        self.watches.append(FakeWatch())
+        return self.watches[-1]
+
+    def push(self, *changes):
+        # เรียก callback จาก thread อื่นเหมือน Firestore SDK
+        thread = threading.Thread(target=self.callbacks[-1], args=([], list(changes), None))
+        thread.start()
+        thread.join()
+
+
+def change(kind, doc_id):
+    return SimpleNamespace(type=SimpleNamespace(name=kind), document=SimpleNamespace(id=doc_id))
+
+
+@pytest.mark.asyncio
+async def test_delivers_added_documents_once():
+    handled = []
+
+    async def handler(key, document):
+        handled.append((key, document.id))
+
+    listener = SnapshotListener(handler)
+    query = FakeQuery()
+    listener.watch('123', query)
+    listener.start()
+    try:
+        query.push(change('ADDED', 'a'), change('ADDED', 'b'))
+        query.push(change('MODIFIED', 'a'))
+        await asyncio.sleep(0.05)
+        assert handled == [('123', 'a'), ('123', 'b')]
+
+        # หลัง REMOVED เอกสาร id เดิมที่กลับมา pending จะถูกส่งอีกครั้ง
+        query.push(change('REMOVED', 'a'))
+        query.push(change('ADDED', 'a'))
+        await asyncio.sleep(0.05)
+        assert handled[-1] == ('123', 'a')
+    finally:
+        await listener.stop()
+    assert query.watches[-1].unsubscribed
+
+
+@pytest.mark.asyncio
+async def test_reconnects_inactive_watch():
+    async def handler(key, document):
+        pass
+
+    listener = SnapshotListener(handler, check_interval=0.01)
+    query = FakeQuery()
+    listener.watch('1', query)
+    listener.start()
+    try:
+        query.watches[0].is_active = False
+        await asyncio.sleep(0.05)
+        assert len(query.watches) >= 2
+        assert listener.reconnects >= 1
+    finally:
+        await listener.stop()
@@ -0,0 +1,36 @@
+import json
+
+from services.guild_index import GuildIndex
+
+
+def test_missing_index_returns_none(tmp_path):
+    assert GuildIndex(str(tmp_path / "guilds.json")).ids() is None
+
+
+def test_publish_and_incremental_updates(tmp_path):
+    path = str(tmp_path / "guilds.json")
+    writer = GuildIndex(path)
+    reader = GuildIndex(path)
+
+    writer.publish([1, 2, 3])
+    assert reader.ids() == {'1', '2', '3'}
+
+    writer.add(4)
+    writer.remove(2)
+    assert reader.ids() == {'1', '3', '4'}
+    assert '4' in reader and 2 not in reader
+    with open(path) as f:
+        assert json.load(f)['guilds'] == ['1', '3', '4']
+
+
+def test_reader_skips_reload_when_unchanged(tmp_path, monkeypatch):
+    path = str(tmp_path / "guilds.json")
+    GuildIndex(path).publish([1])
+    reader = GuildIndex(path)
+    first = reader.ids()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("index should not be re-read")
+
+    monkeypatch.setattr("builtins.open", fail)
+    assert reader.ids() is first
@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import discord
+import numpy as np
+import pytest
+
+from services.loudness import (GainLimiter, LoudnessStore, NormalizedVolume, limiter_table, loudness_gain,
+                               parse_ebur128)
+
+FRAME = 1920  # samples ต่อ frame (960 x 2 ช่อง)
+
+
+def tone(value):
+    samples = np.empty(FRAME, dtype=np.int16)
+    samples[0::2] = value
+    samples[1::2] = -value
+    return samples.tobytes()
+
+
+def test_parse_ebur128_summary():
+    output = ("[Parsed_ebur128_0] t: 1.0 M: -20.0 S: -120.7 I: -19.0 LUFS LRA: 0.0 LU\n"
+              "  Integrated loudness:\n    I:         -21.8 LUFS\n    Threshold: -31.8 LUFS\n")
+    assert parse_ebur128(output) == -21.8
+    assert parse_ebur128("I: -inf LUFS") is None
+    assert parse_ebur128("no summary") is None
+
+
+def test_gain_targets_loudness_and_caps_boost():
+    assert loudness_gain(-14, target=-14) == 1.0
+    assert abs(loudness_gain(-8, target=-14) - 0.501) < 0.001
+    assert loudness_gain(-60, target=-14, max_gain_db=12) == pytest.approx(10 ** (12 / 20))
+    assert loudness_gain(None) == 1.0 and loudness_gain(-120) == 1.0
+
+
+def test_limiter_table_is_linear_below_knee_and_never_clips():
+    table = limiter_table(4.0).astype(np.int32)
+    samples = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32)
+    quiet = np.abs(samples) * 4 <= 0.8 * 32767
+    assert np.array_equal(table[quiet], samples[quiet] * 4)
+    assert np.abs(table).max() < 32767
+    loud = np.argsort(samples)
+    assert np.all(np.diff(table[loud]) >= 0)  # ลำดับความดังไม่สลับกัน
+
+
+def test_limiter_crossfades_when_gain_changes():
+    limiter = GainLimiter(0.5)
+    assert set(np.frombuffer(limiter.process(tone(1000)), dtype=np.int16)) == {500, -500}
+    limiter.gain = 1.0
+    changing = np.frombuffer(limiter.process(tone(1000)), dtype=np.int16)
+    assert changing[0] == 500 and 500 < changing[-2] < 1000
+    assert set(np.frombuffer(limiter.process(tone(1000)), dtype=np.int16)) == {1000, -1000}
+    assert limiter.table_builds == 2
+    assert limiter.process(np.full(FRAME, -32768, dtype=np.int16).tobytes())
+
+
+def test_normalized_volume_multiplies_volume_and_track_gain():
+    class Source(discord.AudioSource):
+        def read(self):
+            return tone(1000)
+
+    source = NormalizedVolume(Source(), 0.5, track_gain=2.0)
+    assert set(np.frombuffer(source.read(), dtype=np.int16)) == {1000, -1000}
+    source.track_gain = 0.5  # ผลวัดมาถึงระหว่างเล่น
+    source.read()  # crossfade
+    assert set(np.frombuffer(source.read(), dtype=np.int16)) == {250, -250}
+
+
+@pytest.mark.asyncio
+async def test_store_measures_once_and_persists(tmp_path):
+    calls = []
+
+    async def measure(url, before_options=''):
+        calls.append(url)
+        await asyncio.sleep(0.01)
+        return -8.0
+
+    path = tmp_path / 'loudness.json'
+    store = LoudnessStore(str(path), measure=measure)
+    futures = [store.analyze('abc', 'http://stream') for _ in range(3)]
+    assert futures[0] is futures[1] is futures[2]
+    assert await futures[0] == pytest.approx(loudness_gain(-8.0))
+    assert calls == ['http://stream'] and store.analyze('abc', 'http://stream') is None
+    await store._save_task
+    assert json.loads(path.read_text()) == {'abc': -8.0}
+
+    restarted = LoudnessStore(str(path), measure=measure)
+    assert restarted.gain('abc') == pytest.approx(loudness_gain(-8.0))
+    assert restarted.gain('other') is None
+
+
+@pytest.mark.asyncio
+async def test_failed_measurement_is_retried_later(tmp_path):
+    async def broken(url, before_options=''):
+        raise RuntimeError("ffmpeg exited with 1")
+
+    store = LoudnessStore(None, measure=broken)
+    assert await store.analyze('abc', 'http://stream') == 1.0
+    assert store.gain('abc') is None and store.stats()['failures'] == 1
+    assert store.analyze('abc', 'http://stream') is not None
+
+
+@pytest.mark.asyncio
+async def test_default_config_copies_opus_and_normalizes_the_rest(monkeypatch):
+    from services import audio_source, loudness
+
+    # ค่าเริ่มต้นทั้งสองฟีเจอร์เปิดพร้อมกัน
+    assert (audio_source.PLAYBACK_MODE, audio_source.PLAYBACK_VOLUME, loudness.LOUDNESS_NORMALIZE) == ('auto', 1.0, True)
+    monkeypatch.setattr(discord.opus, 'is_loaded', lambda: True)
+    measured = []
+
+    async def measure(url, before_options=''):
+        measured.append(url)
+        return -8.0
+
+    store = LoudnessStore(None, measure=measure)
+    store.entries['loud'] = -8.0  # gain ~0.5 ที่วัดไว้ก่อนแล้ว
+    monkeypatch.setattr(loudness, 'loudness_store', store)
+
+    # Opus: copy packet ได้แม้รู้ gain แล้ว และไม่เสีย ffmpeg ไปวัดเพลงใหม่
+    assert audio_source.can_passthrough({'id': 'loud', 'acodec': 'opus'})
+    loudness.prepare({'id': 'fresh', 'acodec': 'opus', 'url': 'http://opus'})
+
+    # codec อื่นใช้ทาง PCM และถูก normalize ตามปกติ
+    aac = {'id': 'aac', 'acodec': 'mp4a.40.2', 'url': 'http://aac'}
+    assert not audio_source.can_passthrough(aac)
+    loudness.prepare(aac)
+    await asyncio.sleep(0)
+    assert measured == ['http://aac']
+    source = loudness.normalize(NormalizedVolume(discord.AudioSource()), {'id': 'loud'})
+    assert source.track_gain == pytest.approx(loudness_gain(-8.0))
@@ -0,0 +1,84 @@
+import subprocess
+import sys
+
+import aiohttp
+import pytest
+
+from services import metrics
+from services.metrics import MetricsServer, PlayTimer, Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram('play_seconds', 'Play phases', ('phase',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, phase='extract')
+
+    lines = registry.render().splitlines()
+    assert '# TYPE play_seconds histogram' in lines
+    assert 'play_seconds_bucket{phase="extract",le="0.1"} 1' in lines
+    assert 'play_seconds_bucket{phase="extract",le="1"} 3' in lines
+    assert 'play_seconds_bucket{phase="extract",le="+Inf"} 4' in lines
+    assert 'play_seconds_sum{phase="extract"} 4.05' in lines
+    assert 'play_seconds_count{phase="extract"} 4' in lines
+    with pytest.raises(ValueError):
+        histogram.observe(1)  # ขาด label
+
+
+def test_counters_gauges_and_stats():
+    registry = Registry()
+    counter = registry.counter('ops_total', 'Ops', ('op',))
+    counter.inc(op='query')
+    counter.inc(2, op='query')
+    registry.gauge('live', 'Live', function=lambda: 3)
+    registry.stats('cache', 'Cache', lambda: {'hits': 5, 'hit_rate': 0.5, 'path': '/tmp'})
+
+    lines = registry.render().splitlines()
+    assert 'ops_total{op="query"} 3' in lines
+    assert 'live 3' in lines
+    assert 'cache_hits 5' in lines and 'cache_hit_rate 0.5' in lines
+    assert not any(line.startswith('cache_path') for line in lines)
+    with pytest.raises(ValueError):
+        registry.counter('ops_total', 'Again')
+
+
+def test_play_timer_records_phases_and_first_audio_once(monkeypatch):
+    clock = iter([0.0, 0.2, 1.5, 1.6])
+    monkeypatch.setattr(metrics.time, 'perf_counter', lambda: next(clock))
+    before = metrics.FIRST_AUDIO_SECONDS.count(path='test')
+
+    timer = PlayTimer('test')
+    timer.phase('defer')
+    timer.phase('extract')
+    timer.first_audio()
+    timer.first_audio()
+    assert metrics.FIRST_AUDIO_SECONDS.count(path='test') == before + 1
+    assert metrics.PLAY_PHASE_SECONDS.count(path='test', phase='first_packet') >= 1
+
+
+def test_active_processes_counts_running_ffmpeg():
+    before = metrics.active_processes()
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(5)'])
+    try:
+        metrics.track_process(process, 'test')
+        assert metrics.active_processes() == before + 1
+    finally:
+        process.kill()
+        process.wait()
+    assert metrics.active_processes() == before
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(tmp_path):
+    registry = Registry()
+    registry.counter('requests_total', 'Requests').inc()
+    server = MetricsServer(f"unix:{tmp_path / 'metrics.sock'}", registry)
+    await server.start()
+    try:
+        async with aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=str(tmp_path / 'metrics.sock'))) as session:
+            async with session.get('http://localhost/metrics') as response:
+                assert response.status == 200
+                assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+                assert 'requests_total 1' in (await response.text()).splitlines()
+    finally:
+        await server.stop()
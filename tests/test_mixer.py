@@ -0,0 +1,237 @@
+import discord
+import numpy as np
+
+from services import mixer as mixer_module
+from services.mixer import (FRAME_SIZE, SILENCE, GapMeter, Mixer, music_playing, play_music, play_speech,
+                            queue_next, stop_music)
+
+
+class ToneSource:
+    """ส่ง frame ที่ทุก sample มีค่า ``value`` จำนวน ``frames`` frame"""
+
+    def __init__(self, value, frames):
+        self.frame = np.full(FRAME_SIZE // 2, value, dtype=np.int16).tobytes()
+        self.frames = frames
+        self.cleaned = False
+
+    def read(self):
+        if self.frames <= 0:
+            return b''
+        self.frames -= 1
+        return self.frame
+
+    def cleanup(self):
+        self.cleaned = True
+
+    def is_opus(self):
+        return False
+
+
+class PacketSource(ToneSource):
+    """ส่ง Opus packet ปลอม (ไม่ใช่ PCM ขนาด frame)"""
+
+    def __init__(self, frames):
+        super().__init__(0, frames)
+        self.frame = b'opus-packet'
+
+    def is_opus(self):
+        return True
+
+
+class FakeDecoder:
+    def decode(self, data):
+        return np.full(FRAME_SIZE // 2, 1000, dtype=np.int16).tobytes()
+
+
+def samples(data):
+    return np.frombuffer(data, dtype=np.int16)
+
+
+def test_single_source_passes_through_and_after_runs_once():
+    calls = []
+    source = ToneSource(1000, 2)
+    mixer = Mixer()
+    mixer.play_music(source, after=calls.append)
+
+    assert mixer.read() is source.frame
+    assert mixer.read() is source.frame
+    assert mixer.read() == SILENCE  # source จบใน frame นี้
+    assert mixer.read() == b'' and mixer.closed
+    assert calls == [None] and source.cleaned
+    assert mixer.mixed_frames == 0
+    assert not mixer.play_speech(ToneSource(1, 1))
+
+
+def test_music_ducks_under_speech_and_recovers():
+    mixer = Mixer(duck_gain=0.5, duck_ramp=0.04)  # ramp 2 frame
+    mixer.play_music(ToneSource(1000, 100))
+    mixer.play_speech(ToneSource(100, 4))
+
+    first = samples(mixer.read())
+    assert first[0] == 1100 and 600 < first[-1] < 1100  # กำลังลดเสียง
+    mixer.read()
+    assert set(samples(mixer.read())) == {600}  # ducked เต็มที่: 1000 * 0.5 + 100
+    mixer.read()
+    mixer.read()  # TTS จบ
+    assert mixer.speaking is False
+    mixer.read()
+    mixer.read()
+    assert set(samples(mixer.read())) == {1000}
+
+
+def test_crossfade_and_on_ending():
+    ended = []
+    endings = []
+    mixer = Mixer(crossfade=0.1)  # 5 frame
+    old = ToneSource(1000, 20)
+    mixer.play_music(old, after=ended.append, duration=0.2, on_ending=lambda: endings.append('old'))
+
+    for _ in range(5):
+        mixer.read()
+    assert endings == ['old']  # เหลือ 5 frame = เวลา crossfade
+
+    new = ToneSource(2000, 100)
+    mixer.play_music(new)
+    assert mixer.music_playing
+    levels = [samples(mixer.read()) for _ in range(5)]
+    assert levels[0][0] == 1000 and abs(int(levels[-1][-1]) - 2000) < 20
+    assert ended == [None] and old.cleaned
+    assert mixer.read() is new.frame
+
+
+def test_mix_clips_instead_of_wrapping():
+    mixer = Mixer(duck_gain=1.0)
+    mixer.play_music(ToneSource(30000, 1))
+    mixer.play_speech(ToneSource(30000, 1))
+    assert set(samples(mixer.read())) == {32767}
+
+
+def test_opus_packets_pass_through_and_decode_only_when_mixing():
+    mixer = Mixer(duck_gain=0.5, duck_ramp=0)
+    music = PacketSource(10)
+    mixer.play_music(music)
+
+    assert mixer.read() is music.frame and mixer.is_opus()
+    assert mixer.opus_frames == 1
+
+    mixer.play_speech(ToneSource(100, 1))
+    mixer._music[0].decoder = FakeDecoder()  # ไม่มี libopus ในเครื่องทดสอบ
+    assert set(samples(mixer.read())) == {600} and not mixer.is_opus()
+    mixer.read()  # TTS จบใน frame นี้
+    assert mixer.read() is music.frame and mixer.is_opus()
+
+
+def test_passthrough_only_for_opus_at_unity_volume(monkeypatch):
+    from services.audio_source import OpusTrack, can_passthrough
+
+    monkeypatch.setattr(discord.opus, 'is_loaded', lambda: True)
+    opus = {'acodec': 'opus'}
+    assert can_passthrough(opus, 1.0, 'auto')
+    assert not can_passthrough(opus, 0.5, 'auto')
+    assert not can_passthrough(opus, 1.0, 'pcm')
+    assert not can_passthrough({'acodec': 'mp4a.40.2'}, 1.0, 'auto')
+
+    def fake_init(self, source, *, executable='ffmpeg', args, **kwargs):
+        self.args = args  # ไม่ spawn ffmpeg จริง
+        self._stdout = None
+
+    monkeypatch.setattr(discord.FFmpegAudio, '__init__', fake_init)
+    monkeypatch.setattr(discord.player.OggStream, '__init__', lambda self, stdout: None)
+    monkeypatch.setattr(discord.player.OggStream, 'iter_packets', lambda self: iter(()))
+    track = OpusTrack('u', data=opus)
+    assert track.args[track.args.index('-c:a') + 1] == 'copy' and track.is_opus()
+
+
+class FakeGuild:
+    id = 1
+
+
+class FakeVoiceClient:
+    def __init__(self):
+        self.guild = FakeGuild()
+        self.source = None
+        self.plays = 0
+
+    def is_playing(self):
+        return self.source is not None
+
+    def is_paused(self):
+        return False
+
+    def play(self, source, after=None):
+        self.source = source
+        self.plays += 1
+
+    def stop(self):
+        self.source = None
+
+
+def test_one_mixer_per_guild_restarts_after_close(monkeypatch):
+    monkeypatch.setattr(mixer_module, '_mixers', {})
+    voice_client = FakeVoiceClient()
+    calls = []
+
+    play_music(voice_client, ToneSource(1, 1), after=calls.append)
+    play_speech(voice_client, ToneSource(2, 1))
+    assert voice_client.plays == 1 and music_playing(voice_client)
+    assert stop_music(voice_client) and calls == [None]
+    assert not music_playing(voice_client)
+
+    mixer = voice_client.source
+    while mixer.read():
+        pass
+    play_music(voice_client, ToneSource(1, 1))
+    assert voice_client.plays == 2 and voice_client.source is not mixer
+
+
+def test_prerolled_next_track_starts_in_the_same_frame(monkeypatch):
+    meter = GapMeter()
+    monkeypatch.setattr(mixer_module, 'gap_meter', meter)
+    events = []
+    current, following = ToneSource(1000, 2), ToneSource(2000, 2)
+    mixer = Mixer()
+    mixer.play_music(current, after=lambda e: events.append('after'))
+    mixer.read()
+    assert mixer.set_next(following, on_start=lambda: events.append('start'))
+
+    assert mixer.read() is current.frame
+    assert mixer.read() is following.frame  # current จบใน frame นี้ ไม่มี SILENCE คั่น
+    assert events == ['start', 'after'] and current.cleaned
+    assert mixer.handoffs == 1 and mixer.music_playing
+    assert meter.stats()['count'] == 1 and meter.stats()['gapless'] == 1
+
+
+def test_stop_and_replace_release_the_prerolled_track(monkeypatch):
+    monkeypatch.setattr(mixer_module, '_mixers', {})
+    voice_client = FakeVoiceClient()
+    calls = []
+    assert not queue_next(voice_client, ToneSource(1, 1))  # ไม่มีเพลงเล่นอยู่
+
+    play_music(voice_client, ToneSource(1, 10))
+    first, second = ToneSource(2, 10), ToneSource(3, 10)
+    assert queue_next(voice_client, first, after=calls.append)
+    assert queue_next(voice_client, second, after=calls.append)
+    assert first.cleaned and calls == [None]
+    stop_music(voice_client)
+    assert second.cleaned and calls == [None, None]
+
+
+def test_gap_is_measured_across_mixers(monkeypatch):
+    meter = GapMeter()
+    monkeypatch.setattr(mixer_module, 'gap_meter', meter)
+    monkeypatch.setattr(mixer_module, '_mixers', {})
+    clock = iter([10.0, 10.5])
+    monkeypatch.setattr(mixer_module.time, 'perf_counter', lambda: next(clock))
+    voice_client = FakeVoiceClient()
+
+    play_music(voice_client, ToneSource(1, 1))
+    mixer = voice_client.source
+    while mixer.read():
+        pass
+    play_music(voice_client, ToneSource(2, 1), follows=True)
+    voice_client.source.read()
+    assert meter.stats()['count'] == 1 and meter.stats()['last_ms'] == 500.0
+
+    play_music(voice_client, ToneSource(3, 1))  # เพลงที่ผู้ใช้สั่งเอง ไม่นับเป็นช่วงเงียบ
+    voice_client.source.read()
+    assert meter.stats()['count'] == 1
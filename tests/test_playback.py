@@ -0,0 +1,37 @@
+import pytest
+import asyncio
+
+from services.playback import Prefetcher, QueueEntry
+
+
+def test_queue_entry_target_and_update():
+    entry = QueueEntry(query='lofi beats', requester='alice')
+    assert entry.title == 'lofi beats'
+    assert entry.target == 'lofi beats'
+    assert not entry.resolved
+
+    entry.update({'id': 'abcdefghijk', 'title': 'Lofi', 'duration': 120,
+                  'webpage_url': 'https://www.youtube.com/watch?v=abcdefghijk'})
+    assert entry.resolved
+    assert entry.title == 'Lofi'
+    assert entry.target == 'https://www.youtube.com/watch?v=abcdefghijk'
+
+    assert QueueEntry(query='https://youtu.be/abcdefghijk').video_id == 'abcdefghijk'
+
+
+@pytest.mark.asyncio
+async def test_prefetcher_runs_before_track_end_and_cancels():
+    prefetcher = Prefetcher(lead_seconds=10)
+    fetched = []
+
+    async def fetch():
+        fetched.append(True)
+
+    prefetcher.schedule(1, 5, fetch)
+    await asyncio.sleep(0.01)
+    assert fetched == [True]
+
+    prefetcher.schedule(2, 60, fetch)
+    prefetcher.cancel(2)
+    await asyncio.sleep(0.01)
+    assert fetched == [True]
@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from services.command_bus import LocalCommandServer
+from services.player_state import PlaybackClock, PlayerStateHub, StateRelay, diff_state
+
+
+def test_diff_state_only_changed_fields():
+    old = {'paused': False, 'queue': [1, 2], 'now_playing': {'title': 'a'}}
+    new = {'paused': True, 'queue': [1, 2], 'now_playing': {'title': 'a'}}
+    assert diff_state(old, new) == {'paused': True}
+    assert diff_state(None, new) == new
+
+
+def test_playback_clock_excludes_pauses(clock):
+    clock.now = 100.0
+    playback = PlaybackClock(clock)
+    playback.start()
+    clock.now += 10
+    playback.pause()
+    clock.now += 5
+    assert playback.position() == 10
+    assert playback.as_state() == {'started_at': 100.0, 'paused_position': 10.0}
+    playback.resume()
+    clock.now += 1
+    assert playback.position() == 11
+    assert playback.as_state()['paused_position'] is None
+
+
+@pytest.mark.asyncio
+async def test_hub_publishes_reset_then_deltas():
+    states = {1: {'paused': False, 'queue_length': 2}}
+    hub = PlayerStateHub(lambda guild_id: states.get(guild_id), lambda: list(states), sweep_interval=60)
+    subscription = hub.subscribe()
+    assert (await subscription.get())['type'] == 'reset'
+    first = await subscription.get()
+    assert first['reset'] and first['changes'] == {'paused': False, 'queue_length': 2}
+
+    states[1] = {'paused': True, 'queue_length': 2}
+    hub.notify(1)
+    hub.notify(1)  # coalesced
+    await asyncio.sleep(0)
+    delta = await subscription.get()
+    assert delta['changes'] == {'paused': True}
+    assert subscription.queue.empty()
+
+    del states[1]
+    hub.notify(1)
+    await asyncio.sleep(0)
+    assert (await subscription.get())['type'] == 'removed'
+    hub.close()
+    assert await subscription.get() is None
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_is_dropped():
+    states = {1: {'n': 0}}
+    hub = PlayerStateHub(lambda guild_id: states.get(guild_id), lambda: list(states),
+                         sweep_interval=60, max_pending=4)
+    subscription = hub.subscribe()
+    for n in range(1, 10):
+        states[1] = {'n': n}
+        hub.notify(1)
+        await asyncio.sleep(0)
+    assert subscription.closed
+    assert hub.stats()['subscribers'] == 0
+
+
+def test_relay_fans_out_to_guild_listeners():
+    relay = StateRelay("unix:/nonexistent.sock", secret='s')
+    relay._thread = object()  # ไม่ต้องต่อบอทจริงในเทสนี้
+    first, second, other = relay.subscribe('1'), relay.subscribe('1'), relay.subscribe('2')
+    relay.apply({'type': 'reset'})
+    relay.apply({'type': 'state', 'guild_id': '1', 'reset': True, 'changes': {'paused': False, 'queue_length': 0}})
+    relay.apply({'type': 'state', 'guild_id': '1', 'reset': False, 'changes': {'paused': True}})
+
+    for listener in (first, second):
+        assert listener.queue.get_nowait()[0] == 'snapshot'
+        name, data = listener.queue.get_nowait()
+        assert (name, data['changes']) == ('delta', {'paused': True})
+    assert other.queue.empty()
+    assert relay.snapshot('1')['state'] == {'paused': True, 'queue_length': 0}
+
+
+@pytest.mark.asyncio
+async def test_state_stream_over_local_channel(tmp_path):
+    states = {7: {'paused': False}}
+    hub = PlayerStateHub(lambda guild_id: states.get(guild_id), lambda: list(states), sweep_interval=60)
+    address = f"unix:{tmp_path / 'bot.sock'}"
+    server = LocalCommandServer(lambda guild_id, command: None, address, secret='s', state_hub=hub)
+    await server.start()
+    loop = asyncio.get_event_loop()
+    relay = StateRelay(address, secret='s', retry_interval=0.05)
+    try:
+        listener = relay.subscribe('7')
+        name, data = await loop.run_in_executor(None, listener.queue.get, True, 2)
+        assert name == 'status' and data == {'connected': True}
+        name, data = await loop.run_in_executor(None, listener.queue.get, True, 2)
+        assert name == 'snapshot' and data['state'] == {'paused': False}
+
+        states[7] = {'paused': True}
+        hub.notify(7)
+        name, data = await loop.run_in_executor(None, listener.queue.get, True, 2)
+        assert (name, data['changes']) == ('delta', {'paused': True})
+    finally:
+        relay.close()
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_relay_async_listener_receives_on_loop():
+    relay = StateRelay("unix:/nonexistent.sock", secret='s', max_pending=2)
+    relay._thread = object()
+    listener = relay.subscribe('1', loop=asyncio.get_event_loop())
+    relay.apply({'type': 'state', 'guild_id': '1', 'reset': True, 'changes': {'paused': False}})
+    name, data = await asyncio.wait_for(listener.queue.get(), 1)
+    assert name == 'snapshot' and data['state'] == {'paused': False}
+
+    for n in range(4):
+        relay.apply({'type': 'state', 'guild_id': '1', 'reset': False, 'changes': {'n': n}})
+    await asyncio.sleep(0)
+    assert listener.stale
+    snapshot = relay.resync('1', listener)
+    assert snapshot['state'] == {'paused': False, 'n': 3}
+    assert listener.queue.empty() and not listener.stale
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from services import extraction, playlist
+from services.extraction import ExtractionPool
+from services.playlist import entry_kwargs, is_playlist_url, iter_playlist
+
+
+class FakeYoutubeDL:
+    produced = 0
+
+    def __init__(self, options):
+        self.options = options  # worker ของ pool ก็สร้าง instance ด้วย options ปกติ
+
+    def extract_info(self, url, download=False, process=True):
+        assert self.options['extract_flat'] == 'in_playlist'
+        assert process is False
+
+        def entries():
+            for i in range(1000):
+                FakeYoutubeDL.produced += 1
+                yield {'id': f'vid{i:08d}', 'title': f'Song {i}', 'duration': 100,
+                       'url': f'https://www.youtube.com/watch?v=vid{i:08d}', 'formats': [{}] * 20}
+
+        return {'_type': 'playlist', 'entries': entries()}
+
+
+def test_is_playlist_url():
+    assert is_playlist_url('https://www.youtube.com/playlist?list=PL123')
+    assert not is_playlist_url('https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123')
+    assert not is_playlist_url('lofi playlist')
+
+
+@pytest.mark.asyncio
+async def test_streams_flat_entries_with_bounded_buffer(monkeypatch):
+    monkeypatch.setattr(playlist.yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    FakeYoutubeDL.produced = 0
+    pool = ExtractionPool({}, workers=1)
+
+    items = []
+    try:
+        async for item in iter_playlist('https://www.youtube.com/playlist?list=PL1', {}, pool=pool, guild_id=1,
+                                        max_entries=500, buffer=5):
+            items.append(item)
+            if len(items) == 3:
+                # ผู้บริโภคช้า: producer ต้องหยุดรอเมื่อ buffer เต็ม
+                assert FakeYoutubeDL.produced <= 3 + 5 + 1
+        await asyncio.sleep(0.05)  # ให้ dispatcher บันทึกว่างานจบ
+    finally:
+        await pool.shutdown()
+    assert len(items) == 500
+    assert set(items[0]) == {'id', 'title', 'duration', 'url'}
+    assert entry_kwargs(items[0])['video_id'] == 'vid00000000'
+    assert pool.completed == 1  # ทั้งเพลย์ลิสต์เป็นงานเดียวใน pool
+
+
+@pytest.mark.asyncio
+async def test_closing_early_stops_producer_and_frees_worker(monkeypatch):
+    monkeypatch.setattr(playlist.yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    monkeypatch.setattr(extraction, '_worker_extract', lambda target, download: {'id': target})
+    FakeYoutubeDL.produced = 0
+    pool = ExtractionPool({}, workers=1)
+
+    try:
+        stream = iter_playlist('https://www.youtube.com/playlist?list=PL1', {}, pool=pool, guild_id=1, buffer=2)
+        await stream.__anext__()
+        await stream.aclose()
+        # worker เดียวถูกคืนให้ /play ของ guild อื่น
+        assert await asyncio.wait_for(pool.extract('x', guild_id=2), timeout=2) == {'id': 'x'}
+    finally:
+        await pool.shutdown()
+    assert FakeYoutubeDL.produced < 10
+
+
+@pytest.mark.asyncio
+async def test_playlist_waits_its_turn_in_the_pool(monkeypatch):
+    monkeypatch.setattr(playlist.yt_dlp, 'YoutubeDL', FakeYoutubeDL)
+    order = []
+
+    def fake_extract(target, download):
+        order.append(target)
+        return {'id': target}
+
+    monkeypatch.setattr(extraction, '_worker_extract', fake_extract)
+    pool = ExtractionPool({}, workers=1, max_pending_per_guild=2)
+
+    async def ingest():
+        async for _ in iter_playlist('https://www.youtube.com/playlist?list=PL1', {}, pool=pool, guild_id=1,
+                                     max_entries=3):
+            order.append('playlist')
+
+    try:
+        await asyncio.gather(pool.extract('a', guild_id=2), pool.extract('b', guild_id=2), ingest())
+    finally:
+        await pool.shutdown()
+    assert order == ['a', 'b', 'playlist', 'playlist', 'playlist']
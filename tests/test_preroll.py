@@ -0,0 +1,52 @@
+import threading
+
+import discord
+
+from services.preroll import PrerolledSource
+
+
+class CountingSource(discord.AudioSource):
+    """ส่ง frame ที่มีเลขลำดับ ``frames`` frame และจำว่า thread ไหนอ่าน"""
+
+    def __init__(self, frames, gate=None):
+        self.frames = frames
+        self.sent = 0
+        self.gate = gate
+        self.readers = set()
+        self.cleaned = False
+
+    def read(self):
+        if self.gate is not None:
+            self.gate.wait()
+        self.readers.add(threading.current_thread().name)
+        if self.sent >= self.frames:
+            return b''
+        self.sent += 1
+        return str(self.sent).encode()
+
+    def cleanup(self):
+        self.cleaned = True
+
+
+def test_buffers_up_to_capacity_then_reads_through():
+    original = CountingSource(100)
+    source = PrerolledSource(original, seconds=0.1)  # 5 frame
+    source._thread.join(timeout=2)
+    assert source.buffered == 5 and original.sent == 5 and source.ready_at is not None
+
+    frames = [source.read() for _ in range(7)]
+    assert frames == [str(i).encode() for i in range(1, 8)]
+    assert threading.current_thread().name in original.readers
+
+
+def test_short_source_ends_and_read_waits_for_first_frame():
+    gate = threading.Event()
+    original = CountingSource(2, gate)
+    source = PrerolledSource(original, seconds=1)
+    threading.Timer(0.05, gate.set).start()
+
+    assert source.read() == b'1'  # รอ frame แรกจาก filler
+    assert source.read() == b'2'
+    assert source.read() == b''
+    source.cleanup()
+    assert original.cleaned and source.buffered == 0
@@ -0,0 +1,78 @@
+import pytest
+import asyncio
+
+from services.status_writer import StatusWriter
+
+
+class FakeRef:
+    def __init__(self, path, store):
+        self.path = path
+        self.store = store
+
+    def update(self, data):
+        if self.path.endswith('missing'):
+            raise RuntimeError("404 No document to update")
+        self.store.setdefault(self.path, {}).update(data)
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.ops = []
+
+    def update(self, ref, data):
+        self.ops.append((ref, data))
+
+    def commit(self):
+        self.db.commits += 1
+        if any(ref.path.endswith('missing') for ref, _ in self.ops):
+            raise RuntimeError("404 No document to update")
+        for ref, data in self.ops:
+            ref.update(data)
+
+
+class FakeDB:
+    def __init__(self):
+        self.commits = 0
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+@pytest.mark.asyncio
+async def test_groups_updates_and_flushes_on_close():
+    db, store = FakeDB(), {}
+    writer = StatusWriter(db, max_batch=100, flush_interval=10)
+    for i in range(20):
+        writer.update(FakeRef(f'guilds/1/commands/{i}', store), {'status': 'completed'})
+    writer.update(FakeRef('guilds/1/commands/0', store), {'error': None})
+    assert writer.is_pending('guilds/1/commands/3')
+
+    await writer.close()
+    assert db.commits == 1
+    assert len(store) == 20
+    assert store['guilds/1/commands/0'] == {'status': 'completed', 'error': None}
+    assert writer.stats()['round_trips_saved'] == 19
+    assert not writer.is_pending('guilds/1/commands/3')
+
+
+@pytest.mark.asyncio
+async def test_flushes_on_size_and_time():
+    db, store = FakeDB(), {}
+    writer = StatusWriter(db, max_batch=5, flush_interval=0.01)
+    for i in range(7):
+        writer.update(FakeRef(f'c/{i}', store), {'status': 'completed'})
+    await asyncio.sleep(0.05)
+    assert db.commits == 2
+    assert len(store) == 7
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_falls_back_to_single_writes():
+    db, store = FakeDB(), {}
+    writer = StatusWriter(db)
+    writer.update(FakeRef('c/ok', store), {'status': 'completed'})
+    writer.update(FakeRef('c/missing', store), {'status': 'completed'})
+    await writer.flush()
+    assert 'c/ok' in store
+    assert writer.stats()['failed'] == 1
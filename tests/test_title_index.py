@@ -0,0 +1,45 @@
+from services.title_index import CHOICE_NAME_LIMIT, TitleIndex, normalize_title
+
+
+def make_index():
+    index = TitleIndex()
+    index.add('aaaaaaaaaaa', 'Beyoncé - Halo (Official Video)', 261)
+    index.add('bbbbbbbbbbb', 'ลาลาลอย - The TOYS', 245)
+    index.add('ccccccccccc', 'Halo Theme (Halo 3)', 180)
+    index.add('ddddddddddd', 'Adele - Hello', 300)
+    return index
+
+
+def ids(choices):
+    return [url[-11:] for _, url in choices]
+
+
+def test_normalize_title_strips_accents_but_keeps_thai_marks():
+    assert normalize_title('Beyoncé - HALO!!') == 'beyonce halo'
+    assert normalize_title('ลาลาลอย - The TOYS') == 'ลาลาลอย the toys'
+
+
+def test_prefix_substring_and_typo_queries():
+    index = make_index()
+    assert ids(index.suggest('ha'))[0] == 'ccccccccccc'  # ชื่อขึ้นต้นด้วยคำค้นมาก่อน
+    assert ids(index.suggest('beyonce'))[0] == 'aaaaaaaaaaa'
+    assert ids(index.suggest('ลาลา'))[0] == 'bbbbbbbbbbb'
+    assert ids(index.suggest('hlao offcial'))[0] == 'aaaaaaaaaaa'
+    assert ids(index.suggest('adel helo'))[0] == 'ddddddddddd'
+    assert index.suggest('zzzzzz') == []
+    # ว่าง = เพลงที่เพิ่มล่าสุดก่อน
+    assert ids(index.suggest('', limit=2)) == ['ddddddddddd', 'ccccccccccc']
+
+
+def test_choices_fit_discord_limits_and_titles_update():
+    index = make_index()
+    name, url = index.suggest('hello')[0]
+    assert name == 'Adele - Hello (5:00)' and url == 'https://www.youtube.com/watch?v=ddddddddddd'
+    assert index.title_for(url) == 'Adele - Hello'
+
+    assert index.add('ddddddddddd', 'Adele - Hello (Live) ' + 'x' * 200, 300)
+    assert not index.add('ddddddddddd', 'Adele - Hello (Live) ' + 'x' * 200)
+    assert not index.add('eeeeeeeeeee', 'eeeeeeeeeee')  # ยังไม่รู้ชื่อจริง
+    name, _ = index.suggest('adele live')[0]
+    assert len(name) <= CHOICE_NAME_LIMIT and name.endswith('… (5:00)')
+    assert len(index) == 4
@@ -0,0 +1,75 @@
+import pytest
+import asyncio
+
+from services.track_cache import TrackCache, normalize_query, stream_expiry
+
+
+def make_info(video_id='dQw4w9WgXcQ', expire=None, duration=200):
+    url = 'https://rr1.googlevideo.com/videoplayback?itag=251'
+    if expire is not None:
+        url += f'&expire={expire}'
+    return {'id': video_id, 'title': 'Song', 'url': url, 'duration': duration, 'formats': [{}] * 50}
+
+
+def test_normalize_query():
+    assert normalize_query('  Hello   World ') == 'q:hello world'
+    assert normalize_query('https://youtu.be/dQw4w9WgXcQ') == 'id:dQw4w9WgXcQ'
+    assert normalize_query('https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=10') == 'id:dQw4w9WgXcQ'
+    assert normalize_query('https://soundcloud.com/a/b') == 'url:https://soundcloud.com/a/b'
+
+
+def test_stream_expiry_uses_expire_param():
+    now = 1_000_000.0
+    assert stream_expiry(make_info(expire=now + 6 * 3600, duration=200), now) == now + 6 * 3600 - 60 - 200
+    assert stream_expiry(make_info(), now) > now
+
+
+def test_hit_miss_and_expiry(clock):
+    clock.now = 1_000_000.0
+    cache = TrackCache(clock=clock)
+    cache.put('song', make_info(expire=clock.now + 3600))
+
+    info = cache.get('SONG ')
+    assert info['title'] == 'Song'
+    assert 'formats' not in info
+    assert cache.get('https://youtu.be/dQw4w9WgXcQ') is not None
+
+    clock.now += 3600
+    assert cache.get('song') is None
+    assert cache.stats()['hits'] == 2
+    assert cache.stats()['misses'] == 1
+
+
+def test_lru_bound(clock):
+    clock.now = 1_000_000.0
+    cache = TrackCache(max_tracks=2, clock=clock)
+    for i in range(3):
+        cache.put(f'q{i}', make_info(video_id=f'video{i:06d}'))
+    assert len(cache) == 2
+    assert cache.get('q0') is None
+    assert cache.get('q2') is not None
+
+
+@pytest.mark.asyncio
+async def test_single_flight_and_refresh_by_id(clock):
+    clock.now = 1_000_000.0
+    cache = TrackCache(clock=clock)
+    targets = []
+
+    async def extract(target):
+        targets.append(target)
+        await asyncio.sleep(0.01)
+        return make_info(expire=clock.now + 3600)
+
+    results = await asyncio.gather(*(cache.resolve('same song', extract) for _ in range(5)))
+    assert len(targets) == 1
+    assert all(r['id'] == 'dQw4w9WgXcQ' for r in results)
+    assert cache.stats()['coalesced'] == 4
+
+    await cache.resolve('same song', extract)
+    assert len(targets) == 1
+
+    # stream URL หมดอายุ: ใช้ video id ที่รู้แล้วแทนการค้นหาใหม่
+    clock.now += 3600
+    await cache.resolve('same song', extract)
+    assert targets[-1] == 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
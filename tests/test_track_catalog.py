@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+
+from services.track_catalog import TrackCatalog
+
+FUTURE = int(time.time()) + 6 * 3600
+
+
+def info(video_id, title, duration=200, expire=FUTURE):
+    return {
+        'id': video_id, 'title': title, 'duration': duration, 'acodec': 'opus', 'formats': ['large'],
+        'url': f"https://rr1.googlevideo.com/videoplayback?expire={expire}&id={video_id}",
+    }
+
+
+@pytest.mark.asyncio
+async def test_batched_writes_are_read_per_guild(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    reader = TrackCatalog(path)
+    assert reader.popular(1) == []  # บอทยังไม่ได้สร้างไฟล์
+
+    writer = TrackCatalog(path, flush_interval=0.01)
+    writer.record_track(info('aaaaaaaaaaa', 'Song A'))
+    writer.record_track(info('bbbbbbbbbbb', 'Song B'))
+    for _ in range(3):
+        writer.record_play(1, 'aaaaaaaaaaa')
+    writer.record_play(1, 'bbbbbbbbbbb')
+    writer.record_play(2, 'bbbbbbbbbbb')
+    assert writer.stats()['buffered'] == 5
+    await asyncio.sleep(0.1)
+    assert writer.stats()['commits'] == 1  # ทั้งหมดใน transaction เดียว
+
+    assert [t['video_id'] for t in reader.popular(1)] == ['aaaaaaaaaaa', 'bbbbbbbbbbb']
+    assert reader.popular(1)[0]['plays'] == 3
+    assert [t['title'] for t in reader.recent(1)] == ['Song B', 'Song A']
+    assert [t['video_id'] for t in reader.popular(2)] == ['bbbbbbbbbbb']
+
+    writer.record_play(1, 'bbbbbbbbbbb')
+    writer.record_play(1, 'bbbbbbbbbbb')
+    await writer.close()
+    assert reader.popular(1)[0] == {
+        'video_id': 'bbbbbbbbbbb', 'title': 'Song B', 'duration': 200,
+        'plays': 3, 'last_played': reader.popular(1)[0]['last_played'],
+    }
+
+
+@pytest.mark.asyncio
+async def test_load_keeps_valid_formats_for_warm_start(tmp_path):
+    path = str(tmp_path / "catalog.db")
+    writer = TrackCatalog(path)
+    writer.record_track(info('aaaaaaaaaaa', 'Fresh'))
+    writer.record_track(info('bbbbbbbbbbb', 'Expired', expire=int(time.time()) - 10))
+    await writer.close()
+    # รายการเพลย์ลิสต์ (ไม่มี format) ไม่ลบ format ที่ resolve ไว้แล้ว และความยาว 0 ไม่ทับ
+    writer.record_track({'video_id': 'aaaaaaaaaaa', 'title': 'Fresh (renamed)', 'duration': 0})
+    writer.record_play(1, 'ccccccccccc', 'Only played', 90)
+    await writer.close()
+
+    items = {item['id']: item for item in TrackCatalog(path).load()}
+    fresh = items['aaaaaaaaaaa']
+    assert fresh['title'] == 'Fresh (renamed)' and fresh['duration'] == 200
+    assert fresh['url'].startswith('https://') and fresh['acodec'] == 'opus'
+    assert 'formats' not in fresh  # เก็บเฉพาะฟิลด์ที่ใช้เล่น ไม่ใช่ info dict ทั้งก้อน
+    assert 'url' not in items['bbbbbbbbbbb']
+    assert items['ccccccccccc'] == {'id': 'ccccccccccc', 'title': 'Only played', 'duration': 90}
+    assert list(items)[-1] == 'ccccccccccc'  # เก่าไปใหม่
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from services.track_queue import TrackQueue
+
+
+def test_matches_list_semantics():
+    rng = random.Random(1)
+    queue = TrackQueue(range(50), rng=random.Random(2))
+    reference = list(range(50))
+
+    for step in range(500):
+        op = rng.choice(['append', 'popleft', 'pop', 'move', 'insert'])
+        if op == 'append':
+            queue.append(1000 + step)
+            reference.append(1000 + step)
+        elif not reference:
+            continue
+        elif op == 'popleft':
+            assert queue.popleft() == reference.pop(0)
+        elif op == 'pop':
+            i = rng.randrange(len(reference))
+            assert queue.pop(i) == reference.pop(i)
+        elif op == 'move':
+            src, dst = rng.randrange(len(reference)), rng.randrange(len(reference))
+            queue.move(src, dst)
+            reference.insert(dst, reference.pop(src))
+        elif op == 'insert':
+            i = rng.randrange(len(reference) + 1)
+            queue.insert(i, -step)
+            reference.insert(i, -step)
+        assert len(queue) == len(reference)
+
+    assert list(queue) == reference
+    assert [queue[i] for i in range(len(reference))] == reference
+    assert queue.slice(5, 15) == reference[5:15]
+    assert queue.slice(len(reference) - 3, len(reference) + 10) == reference[-3:]
+
+
+def test_shuffle_keeps_items_and_bumps_version():
+    queue = TrackQueue(range(1000))
+    version = queue.version
+    queue.shuffle()
+    assert queue.version > version
+    assert sorted(queue) == list(range(1000))
+    assert list(queue) != list(range(1000))
+
+
+def test_index_errors_and_clear():
+    queue = TrackQueue()
+    assert not queue
+    with pytest.raises(IndexError):
+        queue.popleft()
+    queue.extend(['a', 'b'])
+    assert queue[-1] == 'b'
+    queue.clear()
+    assert len(queue) == 0
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+from services.tts_cache import TTSCache, tts_key
+from services.tts_engines import TTSEngine
+
+
+class FunctionEngine(TTSEngine):
+    name = 'fake'
+    suffix = '.mp3'
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def synthesize(self, text, lang, slow, path):
+        return self.fn(text, lang, slow, path)
+
+
+class FakeSynthesizer(TTSEngine):
+    name = 'fake'
+    suffix = '.mp3'
+
+    def __init__(self, size=100, delay=0.0):
+        self.size = size
+        self.delay = delay
+        self.calls = []
+        self.threads = set()
+
+    def synthesize(self, text, lang, slow, path):
+        self.calls.append((text, lang, slow))
+        self.threads.add(threading.get_ident())
+        if self.delay:
+            threading.Event().wait(self.delay)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * self.size)
+
+
+def test_key_depends_on_engine_text_lang_and_slow():
+    assert tts_key('สวัสดี', 'th', False) == tts_key('สวัสดี', 'th', 0)
+    keys = {tts_key('a', 'th', False), tts_key('a', 'en', False), tts_key('a', 'th', True),
+            tts_key('a', 'th', False, 'espeak')}
+    assert len(keys) == 4
+
+
+@pytest.mark.asyncio
+async def test_miss_synthesizes_off_loop_and_coalesces(tmp_path):
+    synth = FakeSynthesizer(delay=0.05)
+    cache = TTSCache(str(tmp_path), engine=synth)
+
+    paths = await asyncio.gather(*(cache.get('สวัสดี') for _ in range(5)))
+    assert len(set(paths)) == 1 and os.path.getsize(paths[0]) == 100
+    assert len(synth.calls) == 1
+    assert threading.get_ident() not in synth.threads
+    assert cache.stats()['coalesced'] == 4
+
+    # hit ไม่เรียก synthesizer อีก
+    assert await cache.get('สวัสดี') == paths[0]
+    assert len(synth.calls) == 1
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_survives_restart(tmp_path):
+    synth = FakeSynthesizer(size=100)
+    cache = TTSCache(str(tmp_path), max_bytes=250, engine=synth)
+    first = await cache.get('one')
+    os.utime(first, ns=(1, 1))  # ให้ลำดับ mtime ชัดเจนแม้ filesystem ละเอียดไม่พอ
+    second = await cache.get('two')
+    os.utime(second, ns=(2, 2))
+    assert cache.lookup('one') == first  # one ถูกใช้ล่าสุด
+    await cache.get('three')
+
+    assert os.path.exists(first) and not os.path.exists(second)
+    assert cache.stats()['evictions'] == 1
+    cache.close()
+
+    def offline(*args):
+        raise AssertionError("cached entries must not be synthesized again")
+
+    restarted = TTSCache(str(tmp_path), max_bytes=250, engine=FunctionEngine(offline))
+    assert len(restarted) == 2
+    assert await restarted.get('one') == first
+    restarted.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_synthesis_leaves_no_entry(tmp_path):
+    def broken(text, lang, slow, path):
+        with open(path, 'wb') as f:
+            f.write(b'partial')
+        raise ConnectionError("gTTS unreachable")
+
+    cache = TTSCache(str(tmp_path), engine=FunctionEngine(broken))
+    with pytest.raises(ConnectionError):
+        await cache.get('hello')
+    assert len(cache) == 0 and os.listdir(tmp_path) == []
+    cache.close()
@@ -0,0 +1,71 @@
+import io
+import os
+import stat
+import sys
+import wave
+from array import array
+
+from services.tts_engines import (FRAME_SIZE, EspeakEngine, PCMFileSource, get_engine,
+                                  parse_guild_engines, wav_to_pcm)
+
+
+def make_wav(rate=22050, channels=1, seconds=0.5):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b'\x10\x00' * channels * int(rate * seconds))
+    return buffer.getvalue()
+
+
+def test_wav_to_pcm_resamples_to_48k_stereo():
+    pcm = wav_to_pcm(make_wav(rate=22050, channels=1, seconds=0.5))
+    frames = len(pcm) // 4  # s16 stereo
+    assert abs(frames - 24000) <= 2
+
+
+def test_wav_to_pcm_downmixes_stereo_and_duplicates_channels():
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(48000)
+        wav.writeframes(array('h', [1000, 3000, -2000, -4000]).tobytes())
+    assert array('h', wav_to_pcm(buffer.getvalue())).tolist() == [2000, 2000, -3000, -3000]
+
+
+def test_pcm_file_source_pads_last_frame(tmp_path):
+    path = tmp_path / 'speech.pcm'
+    path.write_bytes(b'\1' * (FRAME_SIZE + 10))
+    source = PCMFileSource(str(path))
+    assert source.read() == b'\1' * FRAME_SIZE
+    last = source.read()
+    assert len(last) == FRAME_SIZE and last.endswith(b'\0')
+    assert source.read() == b''
+    source.cleanup()
+
+
+def test_espeak_engine_writes_pcm(tmp_path):
+    # espeak-ng ปลอม: ตรวจ argument แล้วส่ง WAV ออกทาง stdout
+    script = tmp_path / 'espeak-ng'
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "assert sys.argv[1:5] == ['--stdin', '--stdout', '-v', 'th']\n"
+        "assert sys.stdin.read() == '-สวัสดี'\n"
+        f"sys.stdout.buffer.write({make_wav()!r})\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+
+    engine = EspeakEngine(str(script))
+    assert engine.available()
+    out = tmp_path / 'out.pcm'
+    engine.synthesize('-สวัสดี', 'th', False, str(out))
+    assert abs(os.path.getsize(out) // 4 - 24000) <= 2
+
+
+def test_engine_selection_falls_back_to_gtts():
+    assert get_engine('gtts').name == 'gtts'
+    assert get_engine('nope').name == 'gtts'
+    assert parse_guild_engines("1:espeak, 2:gtts,bad:x,") == {1: 'espeak', 2: 'gtts'}
@@ -0,0 +1,96 @@
+import asyncio
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from services.tts_cache import TTSCache
+from services.tts_engines import TTSEngine
+from services.tts_stream import SILENCE_FRAME, SpeechStream, split_sentences, synthesize_chunks
+
+
+class FakeSource:
+    """เล่นไฟล์ละ 2 frame โดย frame คือชื่อไฟล์"""
+
+    def __init__(self, path):
+        self.frames = [path.encode(), path.encode()]
+        self.cleaned = False
+
+    def read(self):
+        return self.frames.pop(0) if self.frames else b''
+
+    def cleanup(self):
+        self.cleaned = True
+
+
+def done(value=None, error=None):
+    future = Future()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(value)
+    return future
+
+
+def test_split_sentences():
+    text = "สวัสดีครับ. วันนี้อากาศดี!\nHow are you?"
+    assert split_sentences(text, max_chars=14) == ['สวัสดีครับ.', 'วันนี้อากาศดี!', 'How are you?']
+    assert split_sentences(text, max_chars=100) == ["สวัสดีครับ. วันนี้อากาศดี! How are you?"]
+    assert split_sentences("one two three four", max_chars=9) == ['one two', 'three', 'four']
+    assert [len(c) for c in split_sentences('ก' * 250, max_chars=100)] == [100, 100, 50]
+    assert split_sentences("  \n ") == []
+
+
+def test_stream_plays_in_order_and_pads_with_silence():
+    pending = Future()
+    stream = SpeechStream([done('a'), pending, done(error=ConnectionError()), done('c')], open_source=FakeSource)
+
+    assert [stream.read(), stream.read()] == [b'a', b'a']
+    assert stream.read() == SILENCE_FRAME  # chunk ที่สองยังไม่เสร็จ
+    pending.set_result('b')
+    frames = []
+    while True:
+        frame = stream.read()
+        if not frame:
+            break
+        frames.append(frame)
+    assert frames == [b'b', b'b', b'c', b'c']
+    assert stream.underruns == 1 and stream.failed == 1
+
+
+def test_cleanup_cancels_remaining_chunks():
+    pending = Future()
+    stream = SpeechStream([done('a'), pending], open_source=FakeSource)
+    stream.read()
+    stream.cleanup()
+    assert pending.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_synthesize_chunks_is_bounded_and_ordered(tmp_path):
+    active = []
+    peak = []
+    order = []
+
+    def synth(text, lang, slow, path):
+        active.append(text)
+        peak.append(len(active))
+        time.sleep(0.02)
+        order.append(text)
+        active.remove(text)
+        with open(path, 'wb') as f:
+            f.write(text.encode())
+
+    class SlowEngine(TTSEngine):
+        def synthesize(self, text, lang, slow, path):
+            synth(text, lang, slow, path)
+
+    engine = SlowEngine()
+    cache = TTSCache(str(tmp_path), engine=engine, workers=8)
+    chunks = synthesize_chunks(cache, [f"chunk {n}" for n in range(6)], parallel=2)
+    paths = await asyncio.gather(*(asyncio.wrap_future(chunk) for chunk in chunks))
+
+    assert max(peak) <= 2
+    assert order[0] in ('chunk 0', 'chunk 1')
+    assert [open(path).read() for path in paths] == [f"chunk {n}" for n in range(6)]
+    cache.close()
@@ -0,0 +1,64 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services.voice_presence import IdleDisconnect, VoicePresence
+
+GUILD = SimpleNamespace(id=1)
+
+
+def member(member_id, bot=False):
+    return SimpleNamespace(id=member_id, bot=bot, guild=GUILD)
+
+
+def state(channel_id=None):
+    return SimpleNamespace(channel=SimpleNamespace(id=channel_id) if channel_id else None)
+
+
+def test_rebuild_then_apply_deltas():
+    presence = VoicePresence()
+    guild = SimpleNamespace(id=1, voice_channels=[
+        SimpleNamespace(id=10, members=[member(1), member(99, bot=True)]),
+        SimpleNamespace(id=20, members=[]),
+    ])
+    presence.rebuild(guild)
+    assert presence.humans(1, 10) == 1 and presence.channel_of(1, 1) == 10
+
+    assert presence.update(member(2), state(), state(20))
+    assert presence.update(member(1), state(10), state(20))
+    assert presence.humans(1, 10) == 0 and presence.humans(1, 20) == 2
+    assert presence.busiest(1) == 20
+    assert not presence.update(member(2), state(20), state(20))  # mute/deafen ไม่เปลี่ยนห้อง
+    assert not presence.update(member(99, bot=True), state(10), state())
+
+    presence.update(member(1), state(20), state())
+    presence.update(member(2), state(20), state())
+    assert presence.busiest(1) is None and presence.channel_of(1, 1) is None
+
+
+def test_missed_event_is_corrected_by_stored_location():
+    presence = VoicePresence()
+    presence.update(member(1), state(), state(10))
+    # event ที่ย้ายไปห้อง 20 หายไป: before ของ event ถัดไปไม่ตรงกับที่จำไว้
+    presence.update(member(1), state(20), state(30))
+    assert presence.humans(1, 10) == 0 and presence.humans(1, 30) == 1
+
+
+@pytest.mark.asyncio
+async def test_idle_disconnect_waits_for_grace_and_can_be_cancelled():
+    fired = []
+
+    async def on_idle(guild_id):
+        fired.append(guild_id)
+
+    idle = IdleDisconnect(on_idle, grace=0.05)
+    assert idle.schedule(1)
+    assert not idle.schedule(1)  # นับต่อจากครั้งแรก
+    assert idle.cancel(1) and not idle.pending(1)
+    await asyncio.sleep(0.08)
+    assert fired == []
+
+    idle.schedule(1)
+    await asyncio.sleep(0.08)
+    assert fired == [1] and not idle.pending(1)
@@ -2,17 +2,27 @@
 import os
 import sys
 import re
-from flask import Flask, render_template, redirect, url_for, session, request, jsonify
+import asyncio
+import json
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from flask import Flask, Response, render_template, redirect, url_for, session, request, jsonify
 from dotenv import load_dotenv
 import firebase_admin
 from firebase_admin import credentials, firestore
 import logging
-import requests
 from functools import wraps
 from typing import Optional, Dict, List
 import bleach
 from urllib.parse import urlparse
 
+from services.command_bus import DEFAULT_ADDRESS, CommandBusUnavailable, create_command_bus
+from services.discord_rest import DiscordRESTClient
+from services.guild_index import GuildIndex
+from services.player_state import StateRelay
+from services.track_catalog import TrackCatalog
+
 # --- การตั้งค่าเริ่มต้น ---
 load_dotenv()
 
@@ -122,9 +132,36 @@ except Exception as e:
     print(f"❌ Firebase connection failed: {e}")
     db = None
 
+# ช่องทางส่งคำสั่งไปบอท (COMMAND_BUS): ส่งตรงถ้าบอทอยู่เครื่องเดียวกัน ไม่งั้นใช้ Firestore
+command_bus = create_command_bus(db)
+
+# สถานะ player แบบ real-time: ต่อเข้าบอท connection เดียว แล้วกระจายให้ทุกแท็บผ่าน SSE
+state_relay = StateRelay(os.getenv("COMMAND_BUS_ADDRESS", DEFAULT_ADDRESS))
+SSE_KEEPALIVE = 15.0
+
 # --- Discord OAuth2 Implementation ---
 DISCORD_API_ENDPOINT = "https://discord.com/api/v10"
 
+# HTTP client ร่วม: connection pool + TTL cache ต่อ token + เคารพ rate limit bucket
+discord_api = DiscordRESTClient(
+    api_endpoint=DISCORD_API_ENDPOINT,
+    ttl=float(os.getenv("DISCORD_CACHE_TTL", "60")),
+)
+BOT_GUILDS_TTL = float(os.getenv("DISCORD_BOT_GUILDS_TTL", "300"))
+
+# รายชื่อ guild ที่บอทเขียนไว้ (ดู bot.py) ใช้แทน get_bot_guilds() เมื่อมีไฟล์แล้ว
+guild_index = GuildIndex()
+
+# เพลงยอดนิยม/ล่าสุดต่อ guild จาก catalog ที่บอทเขียน (ไม่ต้องถาม Firestore หรือ YouTube)
+track_catalog = TrackCatalog()
+TRACK_LIST_LIMIT = int(os.getenv("DASHBOARD_TRACK_LIST_LIMIT", "8"))
+
+# เรียก Discord API หลายตัวพร้อมกันแทนการรอทีละตัว
+upstream_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("WEB_UPSTREAM_WORKERS", "16")),
+    thread_name_prefix='upstream',
+)
+
 def requires_discord_auth(f):
     """Decorator to require Discord authentication"""
     @wraps(f)
@@ -137,10 +174,7 @@ def requires_discord_auth(f):
 def get_discord_user(access_token: str) -> Optional[Dict]:
     """Get Discord user info from access token"""
     try:
-        headers = {"Authorization": f"Bearer {access_token}"}
-        response = requests.get(f"{DISCORD_API_ENDPOINT}/users/@me", headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return discord_api.get("/users/@me", f"Bearer {access_token}")
     except Exception as e:
         logger.error(f"Failed to get Discord user: {e}")
         return None
@@ -148,21 +182,20 @@ def get_discord_user(access_token: str) -> Optional[Dict]:
 def get_discord_guilds(access_token: str) -> List[Dict]:
     """Get Discord user's guilds"""
     try:
-        headers = {"Authorization": f"Bearer {access_token}"}
-        response = requests.get(f"{DISCORD_API_ENDPOINT}/users/@me/guilds", headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return discord_api.get("/users/@me/guilds", f"Bearer {access_token}")
     except Exception as e:
         logger.error(f"Failed to get Discord guilds: {e}")
         return []
 
 def get_bot_guilds() -> List[Dict]:
-    """Get bot's guilds"""
+    """Get bot's guilds (cached globally, shared by every dashboard user)"""
     try:
-        headers = {"Authorization": f"Bot {app.config['DISCORD_BOT_TOKEN']}"}
-        response = requests.get(f"{DISCORD_API_ENDPOINT}/users/@me/guilds", headers=headers)
-        response.raise_for_status()
-        return response.json()
+        return discord_api.get(
+            "/users/@me/guilds",
+            f"Bot {app.config['DISCORD_BOT_TOKEN']}",
+            ttl=BOT_GUILDS_TTL,
+            cache_key="bot",
+        )
     except Exception as e:
         logger.error(f"Failed to get bot guilds: {e}")
         return []
@@ -184,19 +217,23 @@ def index():
         access_token = session.get('discord_token')
         user = session.get('discord_user')
         
-        if not user:
-            # ดึงข้อมูล user ใหม่หากไม่มีใน session
-            user = get_discord_user(access_token)
+        # ยิง request ไป Discord พร้อมกัน: user (ถ้ายังไม่มีใน session), guilds ของ user, guilds ของบอท
+        user_future = upstream_pool.submit(get_discord_user, access_token) if not user else None
+        guilds_future = upstream_pool.submit(get_discord_guilds, access_token)
+        bot_guild_ids = guild_index.ids()
+        # บอทยังไม่เคยเขียน index (เช่นรันแยกเครื่อง) ใช้ Discord API แทน
+        bot_future = upstream_pool.submit(get_bot_guilds) if bot_guild_ids is None else None
+        
+        if user_future is not None:
+            user = user_future.result()
             if not user:
                 return redirect(url_for('logout'))
             session['discord_user'] = user
         
-        # ดึงข้อมูล guilds
-        user_guilds = get_discord_guilds(access_token)
-        bot_guilds = get_bot_guilds()
-        
         # หา guilds ที่ทั้ง user และ bot อยู่ด้วยกัน
-        bot_guild_ids = {g['id'] for g in bot_guilds}
+        user_guilds = guilds_future.result()
+        if bot_future is not None:
+            bot_guild_ids = {g['id'] for g in bot_future.result()}
         shared_guilds = [g for g in user_guilds if g['id'] in bot_guild_ids]
         
         # สร้าง avatar URL
@@ -265,10 +302,11 @@ def callback():
         }
         
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        token_response = requests.post(
+        token_response = discord_api.session.post(
             f"{DISCORD_API_ENDPOINT}/oauth2/token",
             data=token_data,
-            headers=headers
+            headers=headers,
+            timeout=discord_api.timeout
         )
         token_response.raise_for_status()
         token_json = token_response.json()
@@ -299,6 +337,8 @@ def logout():
     try:
         user = session.get('discord_user', {})
         username = user.get('username', 'Unknown')
+        if session.get('discord_token'):
+            discord_api.invalidate(f"Bearer {session['discord_token']}")
         session.clear()
         logger.info(f"User {username} logged out")
         return redirect(url_for('index'))
@@ -312,7 +352,7 @@ def logout():
 @requires_discord_auth
 def command():
     try:
-        if not db:
+        if command_bus is None:
             return jsonify({
                 "status": "error", 
                 "message": "Database not available"
@@ -370,24 +410,27 @@ def command():
                 "message": "User session not found"
             }), 401
 
-        # ส่งคำสั่งไปที่ Firestore เพื่อให้บอทรับไปทำงานต่อ
+        # ส่งคำสั่งไปให้บอทผ่าน command bus (local channel หรือ Firestore)
         command_data = {
             'action': action,
             'payload': payload,
             'requester_id': str(user['id']),
             'requester_username': user['username'],
-            'timestamp': firestore.SERVER_TIMESTAMP,
-            'status': 'pending'
         }
+        try:
+            command_id = command_bus.send(str(guild_id), command_data)
+        except CommandBusUnavailable as e:
+            logger.warning(f"Command {action} for guild {guild_id} rejected: {e}")
+            return jsonify({
+                "status": "error", 
+                "message": "ระบบไม่ว่าง กรุณาลองใหม่อีกครั้ง"
+            }), 503
         
-        command_ref = db.collection('guilds').document(guild_id).collection('commands')
-        doc_ref = command_ref.add(command_data)
-        
-        logger.info(f"Command {action} sent to guild {guild_id} by user {user['username']}")
+        logger.info(f"Command {action} sent to guild {guild_id} by user {user['username']} via {command_bus.name}")
         
         return jsonify({
             "status": "success",
-            "command_id": doc_ref[1].id,
+            "command_id": command_id,
             "message": f"ส่งคำสั่ง {action} เรียบร้อยแล้ว"
         })
         
@@ -398,6 +441,58 @@ def command():
             "message": "เกิดข้อผิดพลาดภายในเซิร์ฟเวอร์"
         }), 500
 
+def sse_event(name: str, data: Dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def can_view_guild(access_token: str, guild_id: str) -> bool:
+    """ผู้ใช้ต้องอยู่ใน guild นั้นถึงจะดูสถานะ player ได้"""
+    return any(g['id'] == guild_id for g in get_discord_guilds(access_token))
+
+@app.route("/api/guilds/<guild_id>/events")
+@requires_discord_auth
+def player_events(guild_id):
+    """Server-Sent Events: snapshot ของ player ตอนเชื่อมต่อ แล้วตามด้วย delta เมื่อมีการเปลี่ยนแปลง"""
+    if not validate_guild_id(guild_id):
+        return jsonify({"status": "error", "message": "Guild ID format ไม่ถูกต้อง"}), 400
+    if not can_view_guild(session['discord_token'], guild_id):
+        return jsonify({"status": "error", "message": "ไม่ได้รับอนุญาต"}), 403
+
+    def stream():
+        listener = state_relay.subscribe(guild_id)
+        try:
+            yield "retry: 3000\n\n"
+            yield sse_event('snapshot', state_relay.snapshot(guild_id))
+            while True:
+                try:
+                    name, data = listener.queue.get(timeout=SSE_KEEPALIVE)
+                except queue.Empty:
+                    yield ": keepalive\n\n"  # ให้รู้ตัวเมื่อ browser ปิดแท็บไปแล้ว
+                    continue
+                if listener.stale:
+                    # แท็บนี้รับไม่ทัน ส่ง snapshot ใหม่แทน delta ที่หายไป
+                    yield sse_event('snapshot', state_relay.resync(guild_id, listener))
+                    continue
+                yield sse_event(name, data)
+        finally:
+            state_relay.unsubscribe(guild_id, listener)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route("/api/guilds/<guild_id>/tracks")
+@requires_discord_auth
+def guild_tracks(guild_id):
+    """เพลงที่ guild นี้เล่นบ่อยที่สุดและเล่นล่าสุด สำหรับการ์ด Popular Songs"""
+    if not validate_guild_id(guild_id):
+        return jsonify({"status": "error", "message": "Guild ID format ไม่ถูกต้อง"}), 400
+    if not can_view_guild(session['discord_token'], guild_id):
+        return jsonify({"status": "error", "message": "ไม่ได้รับอนุญาต"}), 403
+    return jsonify({
+        "status": "success",
+        "popular": track_catalog.popular(guild_id, TRACK_LIST_LIMIT),
+        "recent": track_catalog.recent(guild_id, TRACK_LIST_LIMIT),
+    })
+
 # --- Error Handlers ---
 @app.errorhandler(404)
 def not_found(error):
@@ -409,12 +504,109 @@ def internal_error(error):
     return render_template('login.html', error="เกิดข้อผิดพลาดของเซิร์ฟเวอร์"), 500
 
 # --- Main Execution ---
+# --- ASGI serving mode (WEB_SERVER=asgi) ---
+# route ปกติของ Flask รันใน thread pool ผ่าน a2wsgi ส่วน SSE รันบน event loop โดยตรง
+# แท็บที่เปิด dashboard ค้างไว้จึงไม่กิน worker thread คนละหนึ่งตัว
+WEB_SERVER = os.getenv("WEB_SERVER", "dev" if os.getenv("FLASK_ENV") == "development" else "asgi")
+WEB_THREADS = int(os.getenv("WEB_THREADS", "32"))
+EVENTS_PATH = re.compile(r'^/api/guilds/(\d{17,19})/events$')
+
+def session_from_headers(headers) -> Dict:
+    """อ่าน Flask session cookie จาก ASGI headers (ใช้ serializer ตัวเดียวกับ Flask)"""
+    cookie = SimpleCookie()
+    for name, value in headers:
+        if name == b'cookie':
+            cookie.load(value.decode('latin1'))
+    morsel = cookie.get(app.config['SESSION_COOKIE_NAME'])
+    serializer = app.session_interface.get_signing_serializer(app)
+    if morsel is None or serializer is None:
+        return {}
+    try:
+        return serializer.loads(morsel.value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return {}
+
+class DashboardASGI:
+    """ASGI entry point: SSE natively on the event loop, every other route through Flask"""
+
+    def __init__(self, flask_app, workers: int = WEB_THREADS):
+        from a2wsgi import WSGIMiddleware
+        self.wsgi = WSGIMiddleware(flask_app, workers=workers)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            match = EVENTS_PATH.match(scope['path'])
+            if match:
+                await self.player_events(match.group(1), scope, receive, send)
+                return
+        await self.wsgi(scope, receive, send)
+
+    @staticmethod
+    async def _json(send, status: int, data: Dict):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def player_events(self, guild_id, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        token = session_from_headers(scope.get('headers', [])).get('discord_token')
+        if not token:
+            await self._json(send, 401, {"status": "error", "message": "ไม่ได้รับอนุญาต"})
+            return
+        if not await loop.run_in_executor(upstream_pool, can_view_guild, token, guild_id):
+            await self._json(send, 403, {"status": "error", "message": "ไม่ได้รับอนุญาต"})
+            return
+
+        async def wait_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        async def write(text: str):
+            await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
+
+        listener = state_relay.subscribe(guild_id, loop=loop)
+        disconnected = asyncio.ensure_future(wait_disconnect())
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ]})
+            await write("retry: 3000\n\n" + sse_event('snapshot', state_relay.snapshot(guild_id)))
+            while True:
+                next_event = asyncio.ensure_future(listener.queue.get())
+                done, _ = await asyncio.wait({next_event, disconnected}, timeout=SSE_KEEPALIVE,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if next_event not in done:
+                    next_event.cancel()
+                    if disconnected.done():
+                        break
+                    await write(": keepalive\n\n")
+                    continue
+                if listener.stale:
+                    await write(sse_event('snapshot', state_relay.resync(guild_id, listener)))
+                    continue
+                await write(sse_event(*next_event.result()))
+        finally:
+            disconnected.cancel()
+            state_relay.unsubscribe(guild_id, listener)
+
+asgi_app = DashboardASGI(app)
+
+def serve_asgi(host: str, port: int):
+    import uvicorn
+    uvicorn.run(asgi_app, host=host, port=port, lifespan='off', log_level='info')
+
 if __name__ == "__main__":
     try:
-        logger.info("Starting Flask web application")
+        logger.info(f"Starting Flask web application ({WEB_SERVER} server)")
         print("[WEB] Starting Discord Bot Dashboard...")
         print("[WEB] Access at: http://localhost:5001")
-        app.run(debug=True, port=5001, host='0.0.0.0')
+        if WEB_SERVER == 'asgi':
+            serve_asgi('0.0.0.0', 5001)
+        else:
+            app.run(debug=True, port=5001, host='0.0.0.0')
     except Exception as e:
         logger.error(f"Failed to start web application: {e}")
         print(f"[ERROR] Failed to start web application: {e}")